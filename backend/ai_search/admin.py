@@ -27,8 +27,8 @@ class ProductTagAdmin(admin.ModelAdmin):
 
 @admin.register(ProductTagAssociation)
 class ProductTagAssociationAdmin(admin.ModelAdmin):
-    list_display = ['product', 'tag', 'confidence', 'created_at']
-    list_filter = ['confidence', 'created_at', 'tag']
+    list_display = ['product', 'tag', 'source', 'confidence', 'created_at']
+    list_filter = ['source', 'confidence', 'created_at', 'tag']
     search_fields = ['product__name', 'tag__name']
     readonly_fields = ['created_at']
     raw_id_fields = ['product']  # Better for large datasets
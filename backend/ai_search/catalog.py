@@ -0,0 +1,171 @@
+"""
+Shared in-memory catalog snapshot for the AI search services.
+
+Both services score the whole in-stock catalog on every search. They used to
+load it through the ORM with one ProductTagAssociation query per product.
+The snapshot is built with two bulk queries into compact slotted records.
+Tag names (product and AI tags, see ai_search.tags) are interned once per
+process and stored on products as arrays of tag ids.
+
+A snapshot is never modified. Product and tag edits made by any process are
+read from the shared change log (search.changes) on every access and
+applied with one bulk fetch into a new snapshot that shares the unchanged
+records. Structural changes (a renamed tag or category), large batches and
+AI_CATALOG_REBUILD_INTERVAL trigger a full rebuild instead.
+"""
+import logging
+import sys
+import threading
+import time
+from array import array
+from django.conf import settings
+
+from search.changes import ChangeCursor
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = (
+    'id', 'name', 'description', 'brand', 'price', 'old_price', 'rating', 'is_hot',
+    'stock', 'thumbnail', 'category__name', 'vendor__store_name',
+)
+# More changed products than this (or 5% of the catalog) are cheaper to rebuild
+INCREMENTAL_MAX_PRODUCTS = 500
+
+
+def thumbnail_url(name):
+    from vendors.models import VendorProduct
+    return VendorProduct._meta.get_field('thumbnail').storage.url(name) if name else None
+
+
+class TagInterner:
+    """Append-only tag name <-> id table shared by all snapshots of a process"""
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self._lock = threading.Lock()
+
+    def intern(self, name):
+        tag_id = self.ids.get(name)
+        if tag_id is None:
+            with self._lock:
+                tag_id = self.ids.get(name)
+                if tag_id is None:
+                    tag_id = len(self.names)
+                    self.names.append(sys.intern(name))
+                    self.ids[name] = tag_id
+        return tag_id
+
+
+class CatalogProduct:
+    __slots__ = (
+        'id', 'name', 'description', 'brand', 'price', 'old_price', 'rating', 'is_hot',
+        'stock', 'thumbnail', 'category', 'vendor', 'tag_ids',
+    )
+
+    def __init__(self, row, tag_ids):
+        (self.id, self.name, self.description, self.brand, self.price, self.old_price, self.rating,
+         self.is_hot, self.stock, self.thumbnail, self.category, self.vendor) = row
+        if self.category is not None:
+            self.category = sys.intern(self.category)
+        self.tag_ids = tag_ids
+
+
+class CatalogSnapshot:
+    """In-stock products in catalog order"""
+
+    def __init__(self, products, interner):
+        self.products = products  # product id -> CatalogProduct, in listing order
+        self.interner = interner
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_ids=None):
+        """Products in catalog order, optionally restricted to the given ids"""
+        if product_ids is None:
+            return list(self.products.values())
+        wanted = set(product_ids)
+        return [product for product_id, product in self.products.items() if product_id in wanted]
+
+    def tags_of(self, product):
+        """Product tags and AI tags of a product, deduplicated"""
+        names = self.interner.names
+        return list({names[tag_id] for tag_id in product.tag_ids})
+
+    def is_stale(self):
+        interval = getattr(settings, 'AI_CATALOG_REBUILD_INTERVAL', 900)
+        return time.monotonic() - self.built_at > interval
+
+
+def _load_products(interner, product_ids=None):
+    """In-stock products among product_ids (all when None) with their tags, in two queries"""
+    from vendors.models import VendorProduct
+    from .models import ProductTagAssociation
+
+    products = VendorProduct.objects.filter(stock__gt=0)
+    associations = ProductTagAssociation.objects.filter(product__stock__gt=0)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        associations = associations.filter(product_id__in=product_ids)
+
+    product_tags = {}
+    for product_id, tag_name in associations.order_by().values_list('product_id', 'tag__name').iterator(chunk_size=5000):
+        product_tags.setdefault(product_id, []).append(tag_name)
+
+    loaded = {}
+    for row in products.values_list(*PRODUCT_FIELDS).iterator(chunk_size=2000):
+        tag_ids = {interner.intern(tag) for tag in product_tags.get(row[0], ())}
+        loaded[row[0]] = CatalogProduct(row, array('I', sorted(tag_ids)))
+    return loaded
+
+
+def build_catalog_snapshot(interner=None):
+    interner = interner or TagInterner()
+    snapshot = CatalogSnapshot(_load_products(interner), interner)
+    logger.info(f"AI search catalog snapshot built: {len(snapshot)} products, {len(interner.names)} tags")
+    return snapshot
+
+
+def apply_changes(snapshot, product_ids):
+    """New snapshot with the given products reloaded"""
+    changed = _load_products(snapshot.interner, product_ids)
+    products = dict(snapshot.products)
+    for product_id in product_ids:
+        if product_id in changed:
+            products[product_id] = changed[product_id]
+        else:
+            # Deleted or out of stock
+            products.pop(product_id, None)
+    updated = CatalogSnapshot(products, snapshot.interner)
+    # Incremental updates do not postpone the periodic full rebuild
+    updated.built_at = snapshot.built_at
+    return updated
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_changes = ChangeCursor()
+
+
+def get_catalog_snapshot():
+    """The process-wide snapshot, with the product changes logged by any process applied"""
+    global _snapshot
+    with _snapshot_lock:
+        product_ids, rebuild = _changes.read()
+        if (
+            _snapshot is None or rebuild or _snapshot.is_stale()
+            or len(product_ids) > max(INCREMENTAL_MAX_PRODUCTS, len(_snapshot) // 20)
+        ):
+            _changes.start()
+            # Keep the interner so tag ids stay stable across rebuilds
+            _snapshot = build_catalog_snapshot(_snapshot.interner if _snapshot else None)
+        elif product_ids:
+            try:
+                _snapshot = apply_changes(_snapshot, product_ids)
+            except Exception:
+                # The cursor has moved past these changes; rebuild on the next read
+                _changes.reset()
+                raise
+        return _snapshot
@@ -1,4 +1,3 @@
-import requests
 import json
 import hashlib
 import logging
@@ -11,17 +10,26 @@ from django.db.models import Q, Count
 from django.core.cache import cache
 
 from vendors.models import VendorProduct
+from search.logsink import log_search
 from .models import SearchLog, ProductTag, ProductTagAssociation, SearchResult
+from .catalog import get_catalog_snapshot
+from .llm_cache import cached_llm_call
+from .tags import get_vocabulary_version, tag_vocabulary
+from .llm_client import LLMUnavailable, get_llm_client
 
 logger = logging.getLogger(__name__)
 
+LLM_BACKEND = 'gpt4o'
+SEARCH_METHOD_SEMANTIC = 'semantic'
+
 class GPTAISearchService:
     """AI-powered product search using GPT-4o via GitHub Copilot API"""
     
     def __init__(self):
         # GitHub Copilot API settings
-        self.api_url = "https://api.github.com/copilot_internal/v2/token"
-        self.chat_url = "https://copilot-proxy.githubusercontent.com/v1/chat/completions"
+        self.api_url = getattr(settings, 'COPILOT_TOKEN_URL', "https://api.github.com/copilot_internal/v2/token")
+        self.chat_url = getattr(settings, 'COPILOT_CHAT_URL', "https://copilot-proxy.githubusercontent.com/v1/chat/completions")
+        self.client = get_llm_client()
         
         # Get GitHub token from settings
         self.github_token = getattr(settings, 'GITHUB_TOKEN', None)
@@ -51,25 +59,35 @@ class GPTAISearchService:
             headers = {
                 'Authorization': f'token {self.github_token}',
                 'Accept': 'application/vnd.github.v3+json',
-                'User-Agent': 'Django-AI-Search/1.0'
             }
             
-            response = requests.post(self.api_url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                self._copilot_token = data.get('token')
-                # Set expiry to 50 minutes (tokens usually last 1 hour)
-                self._token_expires_at = datetime.now() + timedelta(minutes=50)
-                return self._copilot_token
-            else:
-                logger.error(f"Failed to get Copilot token: {response.status_code} - {response.text}")
-                return None
+            data = self.client.post_json(LLM_BACKEND, self.api_url, headers=headers, timeout=10)
+            self._copilot_token = data.get('token')
+            # Set expiry to 50 minutes (tokens usually last 1 hour)
+            self._token_expires_at = datetime.now() + timedelta(minutes=50)
+            return self._copilot_token
                 
-        except Exception as e:
-            logger.error(f"Error getting Copilot token: {str(e)}")
+        except LLMUnavailable as e:
+            logger.error(f"Failed to get Copilot token: {str(e)}")
             return None
     
+    def gpt4o_payload(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "model": "gpt-4o",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert e-commerce product search assistant. Extract relevant product tags and keywords from user queries to help find products in an online marketplace."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 200,
+            "temperature": 0.3
+        }
+    
     def query_gpt4o(self, prompt: str) -> Optional[str]:
         """Query GPT-4o via GitHub Copilot API"""
         copilot_token = self.get_copilot_token()
@@ -78,69 +96,24 @@ class GPTAISearchService:
             return None
         
         try:
-            headers = {
-                'Authorization': f'Bearer {copilot_token}',
-                'Content-Type': 'application/json',
-                'User-Agent': 'Django-AI-Search/1.0'
-            }
-            
-            payload = {
-                "model": "gpt-4o",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are an expert e-commerce product search assistant. Extract relevant product tags and keywords from user queries to help find products in an online marketplace."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": 200,
-                "temperature": 0.3
-            }
-            
-            response = requests.post(self.chat_url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'choices' in data and len(data['choices']) > 0:
-                    return data['choices'][0]['message']['content'].strip()
-                else:
-                    logger.error("No choices in GPT-4o response")
-                    return None
-            else:
-                logger.error(f"GPT-4o API error: {response.status_code} - {response.text}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"GPT-4o connection error: {str(e)}")
-            return None
-        except Exception as e:
+            headers = {'Authorization': f'Bearer {copilot_token}'}
+            data = self.client.post_json(LLM_BACKEND, self.chat_url, self.gpt4o_payload(prompt), headers)
+        except LLMUnavailable as e:
             logger.error(f"GPT-4o query error: {str(e)}")
             return None
+        
+        if 'choices' in data and len(data['choices']) > 0:
+            return data['choices'][0]['message']['content'].strip()
+        logger.error("No choices in GPT-4o response")
+        return None
+    
+    def is_available(self) -> bool:
+        """False without a token or while the GPT-4o circuit is open"""
+        return bool(self.github_token) and self.client.available(LLM_BACKEND)
     
     def get_all_product_tags(self) -> List[str]:
-        """Get all available product tags from various sources"""
-        tags = set()
-        
-        # Get tags from VendorProduct.tags field (comma-separated)
-        products_with_tags = VendorProduct.objects.exclude(tags='').values_list('tags', flat=True)
-        for tag_string in products_with_tags:
-            if tag_string:
-                product_tags = [tag.strip() for tag in tag_string.split(',') if tag.strip()]
-                tags.update(product_tags)
-        
-        # Get tags from ProductTag model
-        ai_tags = ProductTag.objects.values_list('name', flat=True)
-        tags.update(ai_tags)
-        
-        # Get category names as potential tags
-        from categories.models import Category
-        categories = Category.objects.values_list('name', flat=True)
-        tags.update(categories)
-        
-        return sorted(list(tags))
+        """Get all available product tags: product tags, AI tags and category names"""
+        return tag_vocabulary()
     
     def select_relevant_tags_manual(self, user_query: str, all_tags: List[str]) -> List[str]:
         """
@@ -189,8 +162,18 @@ class GPTAISearchService:
         return list(set(relevant_tags))[:10]
     
     def select_relevant_tags_ai(self, user_query: str, all_tags: List[str]) -> List[str]:
-        """Use GPT-4o to select relevant tags from the query"""
-        
+        """Use GPT-4o to select relevant tags from the query (cached, one call per query at a time)"""
+        if not self.github_token:
+            return []
+        tags = cached_llm_call(
+            'gpt4o_tags', user_query,
+            lambda: self.select_relevant_tags_uncached(user_query, all_tags),
+            version=get_vocabulary_version()
+        )
+        return list(tags or [])
+    
+    def select_relevant_tags_uncached(self, user_query: str, all_tags: List[str]) -> List[str]:
+        """Ask GPT-4o for the relevant tags, bypassing the LLM cache"""
         # Create a sample of tags to avoid token limits
         tag_sample = all_tags[:100] if len(all_tags) > 100 else all_tags
         
@@ -230,27 +213,15 @@ Your response:"""
         
         return []
     
-    def get_products_with_tags(self) -> List[Dict[str, Any]]:
-        """Get all products with their associated tags for scoring"""
-        products = VendorProduct.objects.filter(stock__gt=0).select_related('category', 'vendor')
-        
+    def get_products_with_tags(self, product_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Get all products (or the given ones) with their associated tags for scoring"""
+        snapshot = get_catalog_snapshot()
         product_list = []
-        for product in products:
-            # Combine all tags from different sources
-            all_tags = []
-            
-            # Product tags field
-            if product.tags:
-                all_tags.extend([tag.strip() for tag in product.tags.split(',') if tag.strip()])
-            
-            # Category name
-            if product.category:
-                all_tags.append(product.category.name)
-            
-            # AI tags from ProductTag model
-            ai_tags = ProductTagAssociation.objects.filter(product=product).select_related('tag')
-            for association in ai_tags:
-                all_tags.append(association.tag.name)
+        for product in snapshot.get(product_ids):
+            # Product tags and AI tags, plus the category name
+            all_tags = snapshot.tags_of(product)
+            if product.category and product.category not in all_tags:
+                all_tags.append(product.category)
             
             product_data = {
                 'id': product.id,
@@ -258,11 +229,11 @@ Your response:"""
                 'description': product.description,
                 'brand': product.brand,
                 'price': float(product.price),
-                'tags': list(set(all_tags)),  # Remove duplicates
+                'tags': all_tags,
                 'rating': product.rating,
                 'is_hot': product.is_hot,
-                'category': product.category.name if product.category else '',
-                'vendor': product.vendor.store_name if product.vendor else '',
+                'category': product.category or '',
+                'vendor': product.vendor or '',
                 'stock': product.stock
             }
             product_list.append(product_data)
@@ -322,46 +293,121 @@ Your response:"""
         scored_products.sort(key=lambda x: x['match_score'], reverse=True)
         return scored_products
     
-    def search_products(self, query: str, user_ip: str = None, user_agent: str = '') -> Dict[str, Any]:
-        """Main search method using GPT-4o for tag analysis"""
+    def rank_products(self, relevant_tags: List[str], query: str, limit: int = 20) -> List[Dict]:
+        """
+        Top scored products, same scoring as score_products but computed on the
+        product term matrix; only the returned products are loaded
+        """
+        from search.matrix import get_product_matrix, np
+        matrix = get_product_matrix()
+        if matrix is None:
+            return self.score_products(self.get_products_with_tags(), relevant_tags, query)[:limit]
+        
+        query_words = query.lower().split()
+        scores = np.zeros(matrix.size, dtype=np.float32)
+        
+        # Tag matching (highest weight)
+        tag_masks = [(tag, matrix.tag_mask(tag) | matrix.category_mask(tag)) for tag in relevant_tags]
+        for tag, mask in tag_masks:
+            scores += 15 * mask
+        
+        # Direct text matching, plus any-word matches on name, brand and category
+        field_hits = {field: np.zeros(matrix.size, dtype=bool) for field in ('name', 'brand', 'category')}
+        for word in query_words:
+            name_mask = matrix.text_mask('name', word)
+            brand_mask = matrix.text_mask('brand', word)
+            scores += 5 * (name_mask | brand_mask | matrix.text_mask('description', word))
+            field_hits['name'] |= name_mask
+            field_hits['brand'] |= brand_mask
+            field_hits['category'] |= matrix.text_mask('category', word)
+        scores += 20 * field_hits['name'] + 10 * field_hits['brand'] + 8 * field_hits['category']
+        
+        # Boost for quality indicators
+        scores += 3 * (matrix.rating > 4.0) + 5 * matrix.is_hot + 1 * (matrix.stock > 10)
+        
+        top = matrix.top(scores, limit)
+        products = {product['id']: product for product in self.get_products_with_tags([product_id for row, product_id, score in top])}
+        results = []
+        for row, product_id, score in top:
+            product = products.get(product_id)
+            if product is None:
+                continue
+            product['match_score'] = score
+            product['matched_tags'] = [tag for tag, mask in tag_masks if mask[row]]
+            results.append(product)
+        return results
+    
+    def tag_search(self, query: str):
+        """(results, relevant tags, search method) of the GPT-4o tag pipeline and its fallbacks"""
+        # Get all available tags
+        all_tags = self.get_all_product_tags()
+        self.debug_log(f"Found {len(all_tags)} available tags")
+        
+        # Try AI tag selection first
+        relevant_tags = self.select_relevant_tags_ai(query, all_tags)
+        search_method = 'gpt4o'
+        
+        # Fallback to manual if AI fails
+        circuit_open = not relevant_tags and self.github_token and not self.is_available()
+        if circuit_open:
+            self.debug_log("GPT-4o circuit open, skipping to keyword fallback")
+        elif not relevant_tags:
+            self.debug_log("GPT-4o tag selection failed, using manual fallback")
+            relevant_tags = self.select_relevant_tags_manual(query, all_tags)
+            search_method = 'manual'
+        
+        self.debug_log(f"Selected relevant tags: {relevant_tags}")
+        
+        if relevant_tags:
+            # Score products and keep the top 20
+            results = self.rank_products(relevant_tags, query, limit=20)
+        else:
+            # Final fallback: keyword search
+            self.debug_log("No relevant tags found, using keyword fallback")
+            results = self.keyword_search_fallback(query)
+            search_method = 'keyword'
+        
+        return results, relevant_tags, search_method
+    
+    def semantic_search(self, query: str, limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+        """Products nearest to the query in the local semantic index; None when no index is built"""
+        from .semantic import get_semantic_index
+        index = get_semantic_index()
+        if index is None:
+            return None
+        # Over-fetch, as hits that went out of stock since the build are dropped
+        hits = index.search(query, limit * 2)
+        products = {product['id']: product for product in self.get_products_with_tags([product_id for product_id, score in hits])}
+        results = []
+        for product_id, score in hits:
+            product = products.get(product_id)
+            if product is not None:
+                product['match_score'] = round(score, 4)
+                product['matched_tags'] = []
+                results.append(product)
+        return results[:limit]
+    
+    def search_products(self, query: str, user_ip: str = None, user_agent: str = '', method: str = None) -> Dict[str, Any]:
+        """Main search method using GPT-4o for tag analysis, or the local semantic index with method='semantic'"""
         start_time = time.time()
         
         try:
             self.debug_log(f"Starting AI search for query: '{query}'")
             
-            # Get all available tags
-            all_tags = self.get_all_product_tags()
-            self.debug_log(f"Found {len(all_tags)} available tags")
-            
-            # Try AI tag selection first
-            relevant_tags = self.select_relevant_tags_ai(query, all_tags)
-            search_method = 'gpt4o'
-            
-            # Fallback to manual if AI fails
-            if not relevant_tags:
-                self.debug_log("GPT-4o tag selection failed, using manual fallback")
-                relevant_tags = self.select_relevant_tags_manual(query, all_tags)
-                search_method = 'manual'
-            
-            self.debug_log(f"Selected relevant tags: {relevant_tags}")
-            
-            if relevant_tags:
-                # Get products and score them
-                products = self.get_products_with_tags()
-                scored_products = self.score_products(products, relevant_tags, query)
-                
-                # Limit results
-                results = scored_products[:20]
+            if method == SEARCH_METHOD_SEMANTIC:
+                relevant_tags = []
+                results, search_method = self.semantic_search(query), SEARCH_METHOD_SEMANTIC
+                if results is None:
+                    self.debug_log("No semantic index built, using keyword fallback")
+                    results, search_method = self.keyword_search_fallback(query), 'keyword'
             else:
-                # Final fallback: keyword search
-                self.debug_log("No relevant tags found, using keyword fallback")
-                results = self.keyword_search_fallback(query)
-                search_method = 'keyword'
+                results, relevant_tags, search_method = self.tag_search(query)
             
             response_time = round((time.time() - start_time) * 1000)
             
-            # Log the search
-            SearchLog.objects.create(
+            # Log the search (buffered, written in bulk off the request path)
+            log_search(
+                SearchLog,
                 search_query=query,
                 results_count=len(results),
                 user_ip=user_ip,
@@ -392,16 +438,16 @@ Your response:"""
     
     def keyword_search_fallback(self, query: str) -> List[Dict[str, Any]]:
         """Fallback keyword search when AI methods fail"""
-        products = VendorProduct.objects.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(tags__icontains=query),
-            stock__gt=0
-        ).select_related('category', 'vendor')[:20]
+        from search.backends import get_search_backend
+        in_stock = VendorProduct.objects.filter(stock__gt=0).select_related('category', 'vendor')
+        ranked, _ = get_search_backend().rank(in_stock, query, limit=20, with_total=False)
+        products = in_stock.in_bulk([product_id for product_id, score in ranked])
         
         results = []
-        for product in products:
+        for product_id, relevance_score in ranked:
+            product = products.get(product_id)
+            if product is None:
+                continue
             results.append({
                 'id': product.id,
                 'name': product.name,
@@ -413,7 +459,7 @@ Your response:"""
                 'category': product.category.name if product.category else '',
                 'vendor': product.vendor.store_name if product.vendor else '',
                 'stock': product.stock,
-                'match_score': 1.0,  # Basic relevance score
+                'match_score': round(relevance_score, 3),
                 'matched_tags': []
             })
         
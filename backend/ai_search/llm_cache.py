@@ -0,0 +1,184 @@
+"""
+Two-tier cache with request coalescing for LLM tag extraction.
+
+Extracting tags from a query costs an LLM round-trip of up to 30 seconds.
+Results are cached under the normalized query plus the tag vocabulary
+version (ai_search.tags.get_vocabulary_version, a shared counter bumped
+when tags or categories change), so adding or renaming tags starts a new
+key without hashing the vocabulary on every request. Lookups go through two tiers:
+
+1. a per-process LRU with a short lifetime;
+2. the ai_search.SearchResult table, which is shared by all processes and
+   survives restarts.
+
+On a miss only one thread per key calls the model. Concurrent requests for
+the same key wait for that call and share its result.
+
+Empty results are shared with the waiting requests but never stored, so a
+backend outage is not cached.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+class _Flight:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries=None, local_timeout=None, timeout=None, wait_timeout=None):
+        self.max_entries = max_entries or getattr(settings, 'LLM_CACHE_LOCAL_SIZE', 1024)
+        self.local_timeout = local_timeout or getattr(settings, 'LLM_CACHE_LOCAL_TIMEOUT', 300)
+        self.timeout = timeout or getattr(settings, 'LLM_CACHE_TIMEOUT', 86400)
+        self.wait_timeout = wait_timeout or getattr(settings, 'LLM_CACHE_WAIT_TIMEOUT', 45)
+
+        self._lock = threading.Lock()
+        self._local = OrderedDict()  # key -> (expires at, result), least recently used first
+        self._flights = {}           # key -> _Flight of the call in progress
+
+        self.local_hits = 0
+        self.db_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def key(self, namespace, query, version=''):
+        raw = f'{namespace}\x1f{version}\x1f{normalize_query(query)}'
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get_or_call(self, namespace, query, call, version=''):
+        """
+        Cached result of call() for this query, calling it at most once at a
+        time per key; call() must return a JSON-serializable value
+        """
+        key = self.key(namespace, query, version)
+        result = self._get_local(key)
+        if result is not None:
+            return result
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                logger.warning(f"Timed out waiting for in-flight LLM call ({namespace})")
+            return flight.result
+
+        try:
+            result = self._get_stored(key)
+            if result is not None:
+                self.db_hits += 1
+            else:
+                self.misses += 1
+                result = call()
+                if result:
+                    self._store(key, query, result)
+            if result:
+                self._set_local(key, result)
+            flight.result = result
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'local_entries': len(self._local),
+                'local_hits': self.local_hits,
+                'db_hits': self.db_hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'in_flight': len(self._flights),
+            }
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            self.local_hits += 1
+            return result
+
+    def _set_local(self, key, result):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_timeout, result)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _get_stored(self, key):
+        from .models import SearchResult
+        try:
+            row = SearchResult.objects.filter(query_hash=key, expires_at__gt=timezone.now()).values_list(
+                'results_json', flat=True
+            ).first()
+        except Exception as e:
+            logger.error(f"LLM cache lookup failed: {str(e)}")
+            return None
+        return row['result'] if isinstance(row, dict) else None
+
+    def _store(self, key, query, result):
+        from .models import SearchResult
+        now = timezone.now()
+        try:
+            SearchResult.objects.update_or_create(
+                query_hash=key,
+                defaults={
+                    'original_query': query,
+                    'results_json': {'result': result},
+                    'created_at': now,
+                    'expires_at': now + timedelta(seconds=self.timeout),
+                }
+            )
+        except Exception as e:
+            # The local tier still has it; the next process will just call again
+            logger.error(f"Failed to store LLM cache entry: {str(e)}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """The process-wide LLM response cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache()
+    return _cache
+
+
+def cached_llm_call(namespace, query, call, version=''):
+    return get_llm_cache().get_or_call(namespace, query, call, version)
@@ -0,0 +1,268 @@
+"""
+Shared HTTP client for the LLM backends (Ollama and GPT-4o).
+
+All calls go through one pooled requests.Session per process, so
+connections to a backend are reused instead of opening a new TCP/TLS
+connection for every query.
+
+Each backend has a circuit breaker. After LLM_CIRCUIT_FAILURES consecutive
+failures, calls to that backend fail at once for LLM_CIRCUIT_RESET seconds
+instead of waiting for timeouts. After that, one trial call decides whether
+the circuit closes again.
+
+hedged() races a list of calls. The next call starts when the previous one
+has not succeeded within the hedge delay, or as soon as it fails. It gives up
+once the last call has had the full request timeout to answer.
+
+The async variants run the blocking calls on the client's thread pool, so
+async views can await them without blocking the event loop. Tasks handed to
+submit() run on a second pool: they may call hedged(), which waits for calls
+on the first pool, and sharing one bounded pool would let a burst of such
+tasks occupy every worker while their hedged calls queue behind them.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """The backend failed, timed out or returned an error status"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """The backend's circuit is open, the call was not attempted"""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """Whether a call may be attempted now; claims the single trial call when half open"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def available(self):
+        """Whether a call would be attempted, without claiming the trial call"""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"LLM backend '{self.name}' failing, circuit opened")
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {'state': self.state, 'consecutive_failures': self.failures}
+
+
+class LLMClient:
+    def __init__(self, pool_size=None, timeout=None, connect_timeout=None,
+                 failure_threshold=None, reset_timeout=None, max_workers=None):
+        self.pool_size = pool_size or getattr(settings, 'LLM_POOL_SIZE', 20)
+        self.timeout = timeout or getattr(settings, 'LLM_TIMEOUT', 30)
+        self.connect_timeout = connect_timeout or getattr(settings, 'LLM_CONNECT_TIMEOUT', 3)
+        self.failure_threshold = failure_threshold or getattr(settings, 'LLM_CIRCUIT_FAILURES', 5)
+        self.reset_timeout = reset_timeout or getattr(settings, 'LLM_CIRCUIT_RESET', 30)
+        self.max_workers = max_workers or getattr(settings, 'LLM_MAX_WORKERS', 16)
+
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._session = None
+        self._executor = None
+        self._request_executor = None
+        self._pid = None
+
+    def breaker(self, backend):
+        breaker = self._breakers.get(backend)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    backend, CircuitBreaker(backend, self.failure_threshold, self.reset_timeout)
+                )
+        return breaker
+
+    def available(self, backend):
+        """False while the backend's circuit is open"""
+        return self.breaker(backend).available()
+
+    def post_json(self, backend, url, payload=None, headers=None, timeout=None):
+        """POST to a backend and return the decoded JSON body; raises LLMUnavailable"""
+        breaker = self.breaker(backend)
+        if not breaker.allow():
+            raise CircuitOpen(f"{backend} circuit open")
+        try:
+            response = self._get_session().post(
+                url, json=payload, headers=headers,
+                timeout=(self.connect_timeout, timeout or self.timeout)
+            )
+            if response.status_code != 200:
+                raise LLMUnavailable(f"{backend} returned {response.status_code}: {response.text[:200]}")
+            data = response.json()
+        except LLMUnavailable:
+            breaker.record_failure()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            raise LLMUnavailable(f"{backend} request failed: {str(e)}") from e
+        breaker.record_success()
+        return data
+
+    async def apost_json(self, backend, url, payload=None, headers=None, timeout=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), lambda: self.post_json(backend, url, payload, headers, timeout)
+        )
+
+    def hedged(self, calls, delay, timeout=None):
+        """
+        First truthy result of calls (callables), starting each one after the
+        previous has failed or not succeeded within delay seconds; None if all
+        fail or none answers within timeout seconds of the last one starting
+        """
+        timeout = timeout or self.connect_timeout + self.timeout
+        remaining = list(calls)
+        pending = set()
+        executor = self._get_executor()
+        deadline = None
+        while remaining or pending:
+            if remaining:
+                pending.add(executor.submit(remaining.pop(0)))
+                if not remaining:
+                    deadline = time.monotonic() + timeout
+            wait_for = delay if remaining else deadline - time.monotonic()
+            done, pending = wait(pending, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                result = self._hedge_result(future)
+                if result:
+                    return result
+            if not done and not remaining:
+                logger.warning(f"Hedged LLM calls gave no answer within {timeout}s")
+                return None
+        return None
+
+    async def ahedged(self, calls, delay, timeout=None):
+        timeout = timeout or self.connect_timeout + self.timeout
+        loop = asyncio.get_running_loop()
+        remaining = list(calls)
+        pending = set()
+        executor = self._get_executor()
+        deadline = None
+        while remaining or pending:
+            if remaining:
+                pending.add(loop.run_in_executor(executor, remaining.pop(0)))
+                if not remaining:
+                    deadline = time.monotonic() + timeout
+            wait_for = delay if remaining else deadline - time.monotonic()
+            done, pending = await asyncio.wait(
+                pending, timeout=max(wait_for, 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                result = self._hedge_result(future)
+                if result:
+                    return result
+            if not done and not remaining:
+                logger.warning(f"Hedged LLM calls gave no answer within {timeout}s")
+                return None
+        return None
+
+    def submit(self, fn, *args, **kwargs):
+        """Run a request-level task (which may call hedged()) on the client's request pool, returns a Future"""
+        return self._get_executor(request_pool=True).submit(fn, *args, **kwargs)
+
+    def stats(self):
+        return {backend: breaker.stats() for backend, breaker in list(self._breakers.items())}
+
+    def _hedge_result(self, future):
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning(f"Hedged LLM call failed: {str(e)}")
+            return None
+
+    def _check_process(self):
+        # A forked worker must not share the parent's sockets or threads
+        pid = os.getpid()
+        if self._pid != pid:
+            self._session = None
+            self._executor = None
+            self._request_executor = None
+            self._pid = pid
+
+    def _get_session(self):
+        with self._lock:
+            self._check_process()
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = 'Django-AI-Search/1.0'
+                self._session = session
+            return self._session
+
+    def _get_executor(self, request_pool=False):
+        with self._lock:
+            self._check_process()
+            if request_pool:
+                if self._request_executor is None:
+                    self._request_executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='llm-request'
+                    )
+                return self._request_executor
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='llm-client')
+            return self._executor
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """The process-wide LLM client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
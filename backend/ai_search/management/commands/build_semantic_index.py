@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from ai_search.semantic import DEFAULT_BUCKETS, DEFAULT_COMPONENTS, build_semantic_index, index_dir
+
+
+class Command(BaseCommand):
+    help = 'Compute local semantic vectors for all in-stock products into the memory-mapped index (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Index directory (default: SEMANTIC_INDEX_DIR)'
+        )
+        parser.add_argument(
+            '--buckets',
+            type=int,
+            default=DEFAULT_BUCKETS,
+            help=f'Hashed n-gram feature buckets (default: {DEFAULT_BUCKETS})'
+        )
+        parser.add_argument(
+            '--components',
+            type=int,
+            default=DEFAULT_COMPONENTS,
+            help=f'Vector dimensions kept by the SVD (default: {DEFAULT_COMPONENTS})'
+        )
+        parser.add_argument(
+            '--lists',
+            type=int,
+            default=None,
+            help='IVF clusters; 0 for brute-force search (default: sqrt of the product count for large catalogs)'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or index_dir()
+        self.stdout.write(f'Building semantic index in {output}...')
+        try:
+            meta = build_semantic_index(
+                output=output,
+                buckets=options['buckets'],
+                components=options['components'],
+                lists=options['lists'],
+                stdout=self.stdout
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Semantic index built in {meta['build_seconds']}s"))
@@ -0,0 +1,94 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ai_search.llm_client import LLMUnavailable
+from ai_search.tagging import TAGGERS, BatchTagger, Checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Tag every product with an LLM once, offline, storing AI tags with confidences (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            choices=sorted(TAGGERS),
+            default='gpt4o',
+            help='LLM backend to tag with (default: gpt4o)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent LLM calls (default: 4)'
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=2.0,
+            help='Maximum LLM calls per second across all workers, 0 for unlimited (default: 2)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Products read, tagged and written per checkpoint (default: 100)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after this many products'
+        )
+        parser.add_argument(
+            '--only-untagged',
+            action='store_true',
+            help='Skip products that already have AI tags'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, 'ai_tagging.checkpoint.json'),
+            help='Progress file used to resume an interrupted run'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and start from the first product'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be at least 1')
+
+        checkpoint = Checkpoint(options['checkpoint'])
+        if not options['restart'] and checkpoint.load():
+            self.stdout.write(
+                f'Resuming after product {checkpoint.last_id} '
+                f'({len(checkpoint.failed)} failed products to retry)'
+            )
+
+        batch = BatchTagger(
+            TAGGERS[options['backend']](),
+            checkpoint,
+            workers=options['workers'],
+            rate=options['rate'],
+            chunk_size=options['chunk_size'],
+            only_untagged=options['only_untagged'],
+            limit=options['limit'],
+            stdout=self.stdout
+        )
+        try:
+            processed = batch.run()
+        except LLMUnavailable as e:
+            raise CommandError(str(e))
+
+        summary = f'Processed {processed} products, {checkpoint.tagged} AI tags written'
+        if checkpoint.failed:
+            self.stdout.write(self.style.WARNING(
+                f'{summary}; {len(checkpoint.failed)} products failed, rerun to retry them'
+            ))
+        elif options['limit'] is None:
+            checkpoint.remove()
+            self.stdout.write(self.style.SUCCESS(f'{summary}; catalog fully tagged'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
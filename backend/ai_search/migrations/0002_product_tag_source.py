@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0010_vendorproduct_tags'),
+        ('ai_search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='producttagassociation',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='producttagassociation',
+            name='source',
+            field=models.CharField(choices=[('product', 'Product tags field'), ('ai', 'AI tagging')], default='ai', max_length=10),
+        ),
+        migrations.AlterUniqueTogether(
+            name='producttagassociation',
+            unique_together={('product', 'tag', 'source')},
+        ),
+    ]
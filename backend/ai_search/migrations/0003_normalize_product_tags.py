@@ -0,0 +1,62 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+LOOKUP_BATCH_SIZE = 500
+MAX_TAG_LENGTH = 50
+
+
+def split_tag_names(tag_string):
+    names = []
+    for name in (tag_string or '').split(','):
+        name = ' '.join(name.split())[:MAX_TAG_LENGTH].strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def normalize_product_tags(apps, schema_editor):
+    """Mirror every product's comma-separated tags into ProductTag associations"""
+    VendorProduct = apps.get_model('vendors', 'VendorProduct')
+    ProductTag = apps.get_model('ai_search', 'ProductTag')
+    ProductTagAssociation = apps.get_model('ai_search', 'ProductTagAssociation')
+
+    product_tags = {}
+    for product_id, tags in VendorProduct.objects.exclude(tags='').values_list('id', 'tags').iterator(chunk_size=2000):
+        names = split_tag_names(tags)
+        if names:
+            product_tags[product_id] = names
+
+    all_names = sorted({name for names in product_tags.values() for name in names})
+    ProductTag.objects.bulk_create(
+        [ProductTag(name=name) for name in all_names], batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    tag_ids = {}
+    for start in range(0, len(all_names), LOOKUP_BATCH_SIZE):  # Stay under the SQL parameter limit
+        names = all_names[start:start + LOOKUP_BATCH_SIZE]
+        tag_ids.update(ProductTag.objects.filter(name__in=names).values_list('name', 'id'))
+
+    ProductTagAssociation.objects.bulk_create(
+        [
+            ProductTagAssociation(product_id=product_id, tag_id=tag_ids[name], source='product')
+            for product_id, names in product_tags.items()
+            for name in names
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def remove_product_tag_associations(apps, schema_editor):
+    ProductTagAssociation = apps.get_model('ai_search', 'ProductTagAssociation')
+    ProductTagAssociation.objects.filter(source='product').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_search', '0002_product_tag_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_product_tags, remove_product_tag_associations),
+    ]
@@ -31,14 +31,22 @@ class ProductTag(models.Model):
         return self.name
 
 class ProductTagAssociation(models.Model):
-    """Many-to-many relationship between products and AI tags"""
+    """Many-to-many relationship between products and tags (vendor-entered or AI-assigned)"""
+    SOURCE_PRODUCT = 'product'
+    SOURCE_AI = 'ai'
+    SOURCE_CHOICES = [
+        (SOURCE_PRODUCT, 'Product tags field'),
+        (SOURCE_AI, 'AI tagging'),
+    ]
+    
     product = models.ForeignKey(VendorProduct, on_delete=models.CASCADE, related_name='ai_tags')
     tag = models.ForeignKey(ProductTag, on_delete=models.CASCADE, related_name='products')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_AI)
     confidence = models.FloatField(default=1.0)  # AI confidence in this tag assignment
     created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
-        unique_together = ['product', 'tag']
+        unique_together = ['product', 'tag', 'source']
         ordering = ['-confidence']
     
     def __str__(self):
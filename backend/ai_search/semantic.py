@@ -0,0 +1,295 @@
+"""
+Offline semantic product search over locally computed vectors.
+
+The build_semantic_index command turns every in-stock product into a dense
+vector without any network call:
+
+1. Name, brand, category, tags and description are split into words and
+   character trigrams. Each feature is hashed into a fixed number of
+   buckets (crc32, so every process hashes alike) with TF-IDF weights.
+2. A truncated SVD of those vectors (latent semantic analysis) projects them
+   to a few components, so products that share vocabulary end up close
+   together.
+3. The L2-normalized vectors are written to a float32 file that queries
+   open with np.memmap. Every worker shares the pages through the OS page
+   cache instead of holding a private copy. An ids sidecar maps rows back
+   to products.
+
+Queries are vectorized the same way and ranked by cosine similarity. Small
+catalogs are searched by brute force. Larger ones use an IVF index: rows
+are clustered by spherical k-means and stored grouped by cluster, so a
+query scores the closest clusters as contiguous slices of the memmap.
+
+The index is a snapshot. Products added after a build are found from the
+next build on, and products that are gone or out of stock are filtered
+from results by the caller.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zlib
+from django.conf import settings
+
+from search.indexing import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+VECTORS_FILE = 'vectors.f32'
+IDS_FILE = 'ids.npy'
+MODEL_FILE = 'model.npz'
+META_FILE = 'meta.json'
+
+FIELD_WEIGHTS = (('name', 3.0), ('brand', 2.0), ('category', 2.0), ('tags', 2.0), ('description', 1.0))
+DEFAULT_BUCKETS = 8192
+CHUNK_ROWS = 1024
+DEFAULT_COMPONENTS = 128
+IVF_MIN_ROWS = 20000  # Brute force below this many products unless lists are requested
+RELOAD_CHECK_INTERVAL = 30
+
+
+def index_dir():
+    return str(getattr(settings, 'SEMANTIC_INDEX_DIR', os.path.join(settings.BASE_DIR, 'semantic_index')))
+
+
+def text_features(fields, buckets):
+    """Hashed feature counts {bucket: signed weight} of a product or query"""
+    features = {}
+    for field, weight in fields:
+        for word in tokenize(field):
+            grams = [word] + [f'#{word}#'[i:i + 3] for i in range(len(word))]
+            for gram in grams:
+                code = zlib.crc32(gram.encode())
+                bucket = code % buckets
+                # One hash bit picks the sign, so bucket collisions tend to cancel out
+                sign = 1.0 if code & 0x80000000 else -1.0
+                features[bucket] = features.get(bucket, 0.0) + sign * weight
+    return features
+
+
+def product_fields(name, brand, category, tags, description):
+    values = {'name': name, 'brand': brand, 'category': category, 'tags': tags, 'description': description}
+    return [(values[field] or '', weight) for field, weight in FIELD_WEIGHTS]
+
+
+def _tfidf_rows(features, idf, buckets):
+    rows = np.zeros((len(features), buckets), dtype=np.float32)
+    for row, counts in enumerate(features):
+        if counts:
+            columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            # Sublinear term frequency keeps long descriptions from dominating
+            rows[row, columns] = np.sign(values) * np.log1p(np.abs(values)) * idf[columns]
+    return rows
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _randomized_projection(chunks, buckets, components, oversampling=10, seed=0):
+    """
+    Top right singular vectors (buckets x components) of the matrix whose
+    rows chunks() yields, by a randomized range finder with one power
+    iteration; only ever holds one chunk of rows
+    """
+    rng = np.random.default_rng(seed)
+    width = min(buckets, components + oversampling)
+    omega = rng.standard_normal((buckets, width)).astype(np.float32)
+    sample = np.zeros((buckets, width), dtype=np.float32)
+    for start, rows in chunks():
+        sample += rows.T @ (rows @ omega)
+    basis, _ = np.linalg.qr(sample)
+    scatter = np.zeros((basis.shape[1], basis.shape[1]), dtype=np.float64)
+    for start, rows in chunks():
+        projected = rows @ basis
+        scatter += projected.T.astype(np.float64) @ projected
+    eigenvalues, eigenvectors = np.linalg.eigh(scatter)
+    return (basis @ eigenvectors[:, ::-1][:, :components]).astype(np.float32)
+
+
+def _spherical_kmeans(vectors, lists, iterations=10, seed=0):
+    """Unit-length centroids and each row's cluster"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 8192):
+            assignments[start:start + 8192] = np.argmax(vectors[start:start + 8192] @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        # Reseed empty clusters from random rows
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids, assignments
+
+
+def build_semantic_index(output=None, buckets=DEFAULT_BUCKETS, components=DEFAULT_COMPONENTS,
+                         lists=None, stdout=None):
+    """Vectorize every in-stock product and write a new index directory, returns its metadata"""
+    from .catalog import get_catalog_snapshot
+
+    if np is None:
+        raise RuntimeError("NumPy is required to build the semantic index")
+    output = output or index_dir()
+    started = time.time()
+
+    snapshot = get_catalog_snapshot()
+    products = sorted(snapshot.get(), key=lambda product: product.id)
+    ids = np.fromiter((product.id for product in products), dtype=np.int64, count=len(products))
+    features = [
+        text_features(product_fields(
+            product.name, product.brand, product.category, ' '.join(snapshot.tags_of(product)), product.description
+        ), buckets)
+        for product in products
+    ]
+
+    document_frequency = np.zeros(buckets, dtype=np.float32)
+    for counts in features:
+        document_frequency[list(counts)] += 1
+    idf = np.log((1 + len(features)) / (1 + document_frequency)).astype(np.float32) + 1
+
+    def chunks():
+        for start in range(0, len(features), CHUNK_ROWS):
+            yield start, _tfidf_rows(features[start:start + CHUNK_ROWS], idf, buckets)
+
+    components = max(1, min(components, buckets, len(features) or 1))
+    projection = _randomized_projection(chunks, buckets, components)
+    vectors = np.zeros((len(features), components), dtype=np.float32)
+    for start, rows in chunks():
+        vectors[start:start + len(rows)] = _normalize(rows @ projection)
+
+    if lists is None:
+        lists = int(np.sqrt(len(vectors))) if len(vectors) >= IVF_MIN_ROWS else 0
+    lists = min(lists, len(vectors))
+    if lists > 1:
+        centroids, assignments = _spherical_kmeans(vectors, lists)
+        order = np.argsort(assignments, kind='stable')
+        vectors, ids = vectors[order], ids[order]
+        list_offsets = np.zeros(lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=lists), out=list_offsets[1:])
+    else:
+        centroids = np.zeros((0, components), dtype=np.float32)
+        list_offsets = np.zeros(1, dtype=np.int64)
+
+    # Write next to the live index and swap directories, so readers never see a partial build
+    staging = f'{output}.building-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    vectors.tofile(os.path.join(staging, VECTORS_FILE))
+    np.save(os.path.join(staging, IDS_FILE), ids)
+    np.savez(os.path.join(staging, MODEL_FILE), idf=idf, projection=projection,
+             centroids=centroids, list_offsets=list_offsets)
+    meta = {
+        'version': INDEX_VERSION,
+        'build_id': f'{int(started)}-{os.getpid()}',
+        'built_at': started,
+        'count': int(len(ids)),
+        'buckets': buckets,
+        'components': int(components),
+        'lists': int(len(centroids)),
+        'build_seconds': round(time.time() - started, 2),
+    }
+    with open(os.path.join(staging, META_FILE), 'w') as handle:
+        json.dump(meta, handle)
+
+    previous = f'{output}.previous'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(output):
+        os.rename(output, previous)
+    os.rename(staging, output)
+    shutil.rmtree(previous, ignore_errors=True)
+    if stdout:
+        stdout.write(f"Indexed {meta['count']} products ({meta['components']} dimensions, {meta['lists']} lists)")
+    logger.info(f"Semantic index built: {meta}")
+    return meta
+
+
+class SemanticIndex:
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE)) as handle:
+            self.meta = json.load(handle)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported semantic index version {self.meta.get('version')}")
+        model = np.load(os.path.join(path, MODEL_FILE))
+        self.idf = model['idf']
+        self.projection = model['projection']
+        self.centroids = model['centroids']
+        self.list_offsets = model['list_offsets']
+        self.ids = np.load(os.path.join(path, IDS_FILE), mmap_mode='r')
+        count, components = self.meta['count'], self.meta['components']
+        self.vectors = (
+            np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode='r', shape=(count, components))
+            if count else np.zeros((0, components), dtype=np.float32)
+        )
+        self.build_id = self.meta['build_id']
+
+    def embed(self, text):
+        counts = text_features([(text, 1.0)], self.meta['buckets'])
+        return _normalize(_tfidf_rows([counts], self.idf, self.meta['buckets']) @ self.projection)[0]
+
+    def search(self, query, limit=20, probes=None):
+        """[(product id, cosine similarity)] best first"""
+        vector = self.embed(query)
+        if not vector.any() or not len(self.ids):
+            return []
+        if len(self.centroids):
+            probes = probes or getattr(settings, 'SEMANTIC_SEARCH_PROBES', 8)
+            lists = np.argsort(-(self.centroids @ vector))[:probes]
+            rows = np.concatenate([
+                np.arange(self.list_offsets[cluster], self.list_offsets[cluster + 1]) for cluster in lists
+            ])
+            scores = self.vectors[rows] @ vector
+        else:
+            rows = None
+            scores = self.vectors @ vector
+        k = min(limit, len(scores))
+        if k == 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        if rows is not None:
+            return [(int(self.ids[rows[i]]), float(scores[i])) for i in best if scores[i] > 0]
+        return [(int(self.ids[i]), float(scores[i])) for i in best if scores[i] > 0]
+
+
+_index = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_semantic_index():
+    """This process's index, reloaded after a rebuild; None without NumPy or a built index"""
+    global _index, _index_checked_at
+    if np is None:
+        return None
+    if time.monotonic() - _index_checked_at < RELOAD_CHECK_INTERVAL:
+        return _index
+    with _index_lock:
+        if time.monotonic() - _index_checked_at < RELOAD_CHECK_INTERVAL:
+            return _index
+        _index_checked_at = time.monotonic()
+        path = index_dir()
+        try:
+            with open(os.path.join(path, META_FILE)) as handle:
+                build_id = json.load(handle).get('build_id')
+        except (OSError, ValueError):
+            _index = None
+            return None
+        if _index is None or _index.build_id != build_id:
+            try:
+                _index = SemanticIndex(path)
+            except Exception as e:
+                logger.error(f"Failed to load semantic index from {path}: {str(e)}")
+                _index = None
+        return _index
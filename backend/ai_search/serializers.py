@@ -15,6 +15,7 @@ class ProductTagSerializer(serializers.ModelSerializer):
 
 class AISearchRequestSerializer(serializers.Serializer):
     query = serializers.CharField(max_length=500, required=True)
+    method = serializers.ChoiceField(choices=['ai', 'semantic'], required=False, default='ai')
     
     def validate_query(self, value):
         if not value.strip():
@@ -1,4 +1,3 @@
-import requests
 import json
 import hashlib
 import logging
@@ -11,10 +10,17 @@ from django.db.models import Q, Count
 from django.core.cache import cache
 
 from vendors.models import VendorProduct
+from search.logsink import log_search
 from .models import SearchLog, ProductTag, ProductTagAssociation, SearchResult
+from .catalog import get_catalog_snapshot, thumbnail_url
+from .llm_cache import cached_llm_call
+from .tags import get_vocabulary_version, tag_vocabulary
+from .llm_client import get_llm_client
 
 logger = logging.getLogger(__name__)
 
+LLM_BACKEND = 'ollama'
+
 class OllamaAISearchService:
     """AI-powered product search using Ollama"""
     
@@ -23,6 +29,8 @@ class OllamaAISearchService:
         self.model_name = getattr(settings, 'OLLAMA_MODEL', 'gemma:7b')
         self.debug_mode = getattr(settings, 'AI_SEARCH_DEBUG', False)
         self.cache_timeout = getattr(settings, 'AI_SEARCH_CACHE_TIMEOUT', 3600)  # 1 hour
+        self.hedge_delay = getattr(settings, 'LLM_HEDGE_DELAY', None)
+        self.client = get_llm_client()
         
     def debug_log(self, message: str):
         """Log debug information if debug mode is enabled"""
@@ -30,26 +38,8 @@ class OllamaAISearchService:
             logger.info(f"[AI_SEARCH_DEBUG] {message}")
     
     def get_all_product_tags(self) -> List[str]:
-        """Get all available product tags from various sources"""
-        tags = set()
-        
-        # Get tags from VendorProduct.tags field (comma-separated)
-        products_with_tags = VendorProduct.objects.exclude(tags='').values_list('tags', flat=True)
-        for tag_string in products_with_tags:
-            if tag_string:
-                product_tags = [tag.strip() for tag in tag_string.split(',') if tag.strip()]
-                tags.update(product_tags)
-        
-        # Get tags from ProductTag model
-        ai_tags = ProductTag.objects.values_list('name', flat=True)
-        tags.update(ai_tags)
-        
-        # Get category names as potential tags
-        from categories.models import Category
-        categories = Category.objects.values_list('name', flat=True)
-        tags.update(categories)
-        
-        return sorted(list(tags))
+        """Get all available product tags: product tags, AI tags and category names"""
+        return tag_vocabulary()
     
     def select_relevant_tags_manual(self, user_query: str, all_tags: List[str]) -> List[str]:
         """
@@ -161,8 +151,40 @@ class OllamaAISearchService:
     
     def select_relevant_tags_ai(self, user_query: str, all_tags: List[str]) -> List[str]:
         """
-        Use AI to select relevant tags from the query
+        Use AI to select relevant tags from the query (cached, one call per query at a time)
         """
+        tags = cached_llm_call(
+            f'ollama_tags:{self.model_name}', user_query,
+            lambda: self.select_relevant_tags_uncached(user_query, all_tags),
+            version=get_vocabulary_version()
+        )
+        return list(tags or [])
+    
+    def select_relevant_tags_uncached(self, user_query: str, all_tags: List[str]) -> List[str]:
+        """
+        Ask Ollama for the relevant tags, bypassing the LLM cache. With
+        LLM_HEDGE_DELAY set, GPT-4o is asked too if Ollama has not answered
+        within that many seconds (or failed), and the first answer wins.
+        """
+        calls = [lambda: self._select_relevant_tags_ollama(user_query, all_tags)]
+        hedge = self.hedge_backend()
+        if hedge is not None:
+            calls.append(lambda: hedge.select_relevant_tags_uncached(user_query, all_tags))
+            return self.client.hedged(calls, self.hedge_delay) or []
+        return calls[0]()
+    
+    def hedge_backend(self):
+        """The GPT-4o service when hedging is enabled and it can be called"""
+        if self.hedge_delay is None:
+            return None
+        from .gpt_service import gpt_ai_search_service
+        return gpt_ai_search_service if gpt_ai_search_service.is_available() else None
+    
+    def is_available(self) -> bool:
+        """False while the Ollama circuit is open and there is nothing to hedge with"""
+        return self.client.available(LLM_BACKEND) or self.hedge_backend() is not None
+    
+    def _select_relevant_tags_ollama(self, user_query: str, all_tags: List[str]) -> List[str]:
         try:
             prompt = f"""<start_of_turn>user
 I need you to analyze a user's product search query and identify which product tags are most relevant.
@@ -188,21 +210,20 @@ Respond with only a JSON array of tag names:
             
             self.debug_log(f"Sending AI query for tag analysis: {user_query}")
             
-            response = requests.post(
+            data = self.client.post_json(
+                LLM_BACKEND,
                 self.ollama_url,
-                json={
+                {
                     "model": self.model_name,
                     "prompt": prompt,
                     "stream": False,
                     "options": {
                         "temperature": 0.2
                     }
-                },
-                timeout=30
+                }
             )
-            response.raise_for_status()
             
-            ai_response = response.json().get('response', '')
+            ai_response = data.get('response', '')
             self.debug_log(f"AI response: {ai_response}")
             
             # Extract JSON array from response
@@ -225,32 +246,23 @@ Respond with only a JSON array of tag names:
         
         return []
     
-    def get_products_with_tags(self) -> List[Dict[str, Any]]:
+    def get_products_with_tags(self, product_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
         """
-        Get all active products with their tags
+        Get all active products (or the given ones) with their tags
         """
+        snapshot = get_catalog_snapshot()
         products = []
-        
-        for product in VendorProduct.objects.filter(stock__gt=0).select_related('vendor', 'category'):
-            # Get tags from the tags field
-            product_tags = []
-            if product.tags:
-                product_tags = [tag.strip() for tag in product.tags.split(',') if tag.strip()]
-            
-            # Get AI tags
-            ai_tags = list(product.ai_tags.values_list('tag__name', flat=True))
-            all_tags = list(set(product_tags + ai_tags))
-            
+        for product in snapshot.get(product_ids):
             product_data = {
                 'id': product.id,
                 'name': product.name,
                 'description': product.description,
                 'price': float(product.price),
                 'old_price': float(product.old_price) if product.old_price else None,
-                'vendor_name': product.vendor.store_name,
-                'category': product.category.name if product.category else None,
-                'thumbnail': product.thumbnail.url if product.thumbnail else None,
-                'tags': all_tags,
+                'vendor_name': product.vendor,
+                'category': product.category,
+                'thumbnail': thumbnail_url(product.thumbnail),
+                'tags': snapshot.tags_of(product),
                 'rating': float(product.rating),
                 'stock': product.stock,
                 'is_hot': product.is_hot,
@@ -302,6 +314,43 @@ Respond with only a JSON array of tag names:
         scored_products.sort(key=lambda p: p['match_score'], reverse=True)
         return scored_products
     
+    def rank_products(self, relevant_tags: List[str], query: str, limit: int = 20) -> List[Dict]:
+        """
+        Top scored products, same scoring as score_products but computed on the
+        product term matrix; only the returned products are loaded
+        """
+        from search.matrix import get_product_matrix, np
+        matrix = get_product_matrix()
+        if matrix is None:
+            return self.score_products(self.get_products_with_tags(), relevant_tags, query)[:limit]
+        
+        query_words = [word for word in query.lower().split() if len(word) > 3]
+        scores = np.zeros(matrix.size, dtype=np.float32)
+        
+        # Tag matching (highest weight)
+        for tag in relevant_tags:
+            scores += 3 * matrix.tag_mask(tag)
+        
+        # Name, description and category matching
+        for field, weight in (('name', 2), ('description', 1), ('category', 1)):
+            hits = np.zeros(matrix.size, dtype=bool)
+            for word in query_words:
+                hits |= matrix.text_mask(field, word)
+            scores += weight * hits
+        
+        # Boost for hot products and products with good ratings
+        scores += 0.5 * matrix.is_hot + 0.3 * (matrix.rating >= 4.0)
+        
+        top = matrix.top(scores, limit)
+        products = {product['id']: product for product in self.get_products_with_tags([product_id for row, product_id, score in top])}
+        results = []
+        for row, product_id, score in top:
+            product = products.get(product_id)
+            if product is not None:
+                product['match_score'] = round(score, 2)
+                results.append(product)
+        return results
+    
     def search_products(self, query: str, user_ip: str = None, user_agent: str = '') -> Dict[str, Any]:
         """
         Main search function with AI and fallback mechanisms
@@ -317,28 +366,23 @@ Respond with only a JSON array of tag names:
             return cached_result
         
         try:
-            # Log the search
-            search_log = SearchLog.objects.create(
-                search_query=query,
-                user_ip=user_ip,
-                user_agent=user_agent
-            )
-            
-            # Get all products and tags
+            # Get all tags
             all_tags = self.get_all_product_tags()
-            products = self.get_products_with_tags()
             
-            self.debug_log(f"Loaded {len(products)} products and {len(all_tags)} tags")
+            self.debug_log(f"Loaded {len(all_tags)} tags")
             
             # Select relevant tags (try AI first, fallback to manual)
             relevant_tags = self.select_relevant_tags_ai(query, all_tags)
-            if not relevant_tags:
+            circuit_open = not relevant_tags and not self.is_available()
+            if circuit_open:
+                self.debug_log("Ollama circuit open, skipping to keyword fallback")
+            elif not relevant_tags:
                 relevant_tags = self.select_relevant_tags_manual(query, all_tags)
             
             self.debug_log(f"Selected relevant tags: {relevant_tags}")
             
             # Score and filter products using tag-based approach
-            results = self.score_products(products, relevant_tags, query)
+            results = [] if circuit_open else self.rank_products(relevant_tags, query, limit=20)
             
             # If no results from tag-based search, fall back to keyword search
             if not results:
@@ -347,15 +391,19 @@ Respond with only a JSON array of tag names:
                 search_method = "keyword_fallback"
             else:
                 search_method = "tag_based"
-                results = results[:20]  # Limit tag-based results
             
             # Calculate response time
             response_time = int((time.time() - start_time) * 1000)
             
-            # Update search log
-            search_log.results_count = len(results)
-            search_log.response_time_ms = response_time
-            search_log.save()
+            # Log the search as one row once the outcome is known (buffered)
+            log_search(
+                SearchLog,
+                search_query=query,
+                results_count=len(results),
+                user_ip=user_ip,
+                user_agent=user_agent,
+                response_time_ms=response_time
+            )
             
             # Prepare response
             response_data = {
@@ -381,6 +429,15 @@ Respond with only a JSON array of tag names:
                 fallback_results = self.keyword_search_fallback(query)
                 response_time = int((time.time() - start_time) * 1000)
                 
+                log_search(
+                    SearchLog,
+                    search_query=query,
+                    results_count=len(fallback_results),
+                    user_ip=user_ip,
+                    user_agent=user_agent,
+                    response_time_ms=response_time
+                )
+                
                 return {
                     'query': query,
                     'results': fallback_results,
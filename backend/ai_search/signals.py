@@ -0,0 +1,48 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from vendors.models import VendorProduct
+from vendors.signals import products_bulk_saved
+from categories.models import Category
+from search.changes import request_index_rebuild
+from .models import ProductTag, ProductTagAssociation
+from .tags import bump_vocabulary_version, sync_product_tags, sync_products_tags
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=VendorProduct)
+def product_tags_written_through(sender, instance, update_fields=None, **kwargs):
+    """Mirror the tags field into ProductTag associations (source='product')"""
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    try:
+        sync_product_tags(instance)
+    except Exception as e:
+        logger.error(f"Failed to sync tags of product {instance.pk}: {e}")
+
+
+@receiver(products_bulk_saved, sender=VendorProduct)
+def products_bulk_tags_written_through(sender, products, **kwargs):
+    """The same write-through for bulk writes, in a few queries per batch"""
+    try:
+        sync_products_tags(products)
+    except Exception as e:
+        logger.error(f"Failed to sync tags of {len(products)} bulk-saved products: {e}")
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_save, sender=Category)
+def tag_saved(sender, instance, created, **kwargs):
+    """New names only extend the vocabulary; a rename can affect any product"""
+    transaction.on_commit(bump_vocabulary_version)
+    if not created:
+        transaction.on_commit(request_index_rebuild)
+
+
+@receiver(post_delete, sender=ProductTag)
+@receiver(post_delete, sender=Category)
+def tag_deleted(sender, instance, **kwargs):
+    transaction.on_commit(bump_vocabulary_version)
+    transaction.on_commit(request_index_rebuild)
@@ -0,0 +1,321 @@
+"""
+Offline AI tagging of the whole catalog.
+
+The tag_products command asks an LLM once per product for descriptive tags
+with a confidence. The answers are stored as ProductTagAssociation rows with
+source='ai', so query-time search only matches against stored tags and never
+asks the model about products.
+
+Products are read in id order, one chunk at a time. Each chunk is fanned out
+over a bounded thread pool, throttled by a shared rate limiter. The chunk's
+associations are then written with one bulk_create, and a checkpoint file
+records the last finished id together with the products whose call failed.
+A crashed or interrupted run resumes after the last finished chunk.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import transaction
+
+from .llm_client import CircuitOpen, LLMUnavailable, get_llm_client
+from .tags import get_or_create_tags, normalize_tag_name
+
+logger = logging.getLogger(__name__)
+
+MAX_TAGS_PER_PRODUCT = 10
+VOCABULARY_HINTS = 200  # Existing tags offered to the model so it reuses them
+DESCRIPTION_CHARS = 600
+PRODUCT_FIELDS = ('id', 'name', 'brand', 'description', 'tags', 'category__name')
+
+TAGGING_SYSTEM_PROMPT = (
+    "You are an expert e-commerce catalog assistant. You assign short, "
+    "searchable tags to products in an online marketplace."
+)
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads; rate is calls per second"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def tagging_prompt(product, vocabulary):
+    description = (product['description'] or '')[:DESCRIPTION_CHARS]
+    return f"""
+Assign search tags to this product.
+
+Name: {product['name']}
+Brand: {product['brand'] or '-'}
+Category: {product['category__name'] or '-'}
+Vendor tags: {product['tags'] or '-'}
+Description: {description}
+
+Existing tags (reuse them where they fit): {', '.join(vocabulary[:VOCABULARY_HINTS])}
+
+Instructions:
+1. Return at most {MAX_TAGS_PER_PRODUCT} tags: product type, features, materials, use cases, audience
+2. Tags are 1-3 words, lowercase
+3. Give each tag a confidence between 0 and 1
+4. Respond with ONLY a JSON array, no explanations
+
+Example:
+[{{"tag": "running shoes", "confidence": 0.95}}, {{"tag": "breathable", "confidence": 0.7}}]
+
+Your response:"""
+
+
+def parse_tagging_response(text):
+    """[(tag name, confidence)] from the model's answer, ignoring anything malformed"""
+    start, end = (text or '').find('['), (text or '').rfind(']') + 1
+    if start < 0 or end <= start:
+        return []
+    try:
+        items = json.loads(text[start:end])
+    except json.JSONDecodeError:
+        return []
+
+    tags = {}
+    for item in items:
+        if isinstance(item, str):
+            name, confidence = item, 0.5
+        elif isinstance(item, dict):
+            name, confidence = item.get('tag') or item.get('name'), item.get('confidence', 0.5)
+        else:
+            continue
+        if not isinstance(name, str):
+            continue
+        name = normalize_tag_name(name.lower())
+        try:
+            confidence = min(max(float(confidence), 0.0), 1.0)
+        except (TypeError, ValueError):
+            confidence = 0.5
+        if name and confidence > tags.get(name, -1):
+            tags[name] = confidence
+    return sorted(tags.items(), key=lambda tag: -tag[1])[:MAX_TAGS_PER_PRODUCT]
+
+
+class GPT4oTagger:
+    backend = 'gpt4o'
+
+    def __init__(self):
+        from .gpt_service import gpt_ai_search_service
+        self.service = gpt_ai_search_service
+
+    def complete(self, prompt):
+        token = self.service.get_copilot_token()
+        if not token:
+            raise LLMUnavailable("No Copilot token available")
+        payload = self.service.gpt4o_payload(prompt)
+        payload['messages'][0]['content'] = TAGGING_SYSTEM_PROMPT
+        payload['max_tokens'] = 400
+        data = get_llm_client().post_json(
+            self.backend, self.service.chat_url, payload, {'Authorization': f'Bearer {token}'}
+        )
+        choices = data.get('choices') or []
+        return choices[0]['message']['content'] if choices else ''
+
+
+class OllamaTagger:
+    backend = 'ollama'
+
+    def __init__(self):
+        from .services import ai_search_service
+        self.service = ai_search_service
+
+    def complete(self, prompt):
+        data = get_llm_client().post_json(self.backend, self.service.ollama_url, {
+            'model': self.service.model_name,
+            'prompt': f"{TAGGING_SYSTEM_PROMPT}\n{prompt}",
+            'stream': False,
+            'options': {'temperature': 0.2},
+        })
+        return data.get('response', '')
+
+
+TAGGERS = {'gpt4o': GPT4oTagger, 'ollama': OllamaTagger}
+
+
+class Checkpoint:
+    """Progress of a tagging run, rewritten atomically after every chunk"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.last_id = 0
+        self.failed = set()
+        self.tagged = 0
+
+    def load(self):
+        try:
+            with open(self.path) as handle:
+                data = json.load(handle)
+        except FileNotFoundError:
+            return False
+        self.last_id = data.get('last_id', 0)
+        self.failed = set(data.get('failed', []))
+        self.tagged = data.get('tagged', 0)
+        return True
+
+    def save(self):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({
+                'last_id': self.last_id,
+                'failed': sorted(self.failed),
+                'tagged': self.tagged,
+                'saved_at': time.time(),
+            }, handle)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def save_ai_tags(results):
+    """Replace the AI tags of the given products: {product id: [(name, confidence)]}"""
+    from search.changes import record_product_changes
+    from .models import ProductTagAssociation
+
+    if not results:
+        return 0
+    tag_ids = get_or_create_tags({name for tags in results.values() for name, _ in tags})
+    associations = [
+        ProductTagAssociation(
+            product_id=product_id, tag_id=tag_ids[name],
+            source=ProductTagAssociation.SOURCE_AI, confidence=confidence
+        )
+        for product_id, tags in results.items()
+        for name, confidence in tags
+        if name in tag_ids
+    ]
+    with transaction.atomic():
+        ProductTagAssociation.objects.filter(
+            product_id__in=list(results), source=ProductTagAssociation.SOURCE_AI
+        ).delete()
+        ProductTagAssociation.objects.bulk_create(associations, batch_size=1000, ignore_conflicts=True)
+    # bulk_create sends no signals
+    product_ids = list(results)
+    transaction.on_commit(lambda: record_product_changes(product_ids))
+    return len(associations)
+
+
+class BatchTagger:
+    def __init__(self, tagger, checkpoint, workers=4, rate=2.0, chunk_size=100,
+                 only_untagged=False, limit=None, stdout=None):
+        self.tagger = tagger
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst=max(1, workers))
+        self.chunk_size = chunk_size
+        self.only_untagged = only_untagged
+        self.limit = limit
+        self.stdout = stdout
+        self.vocabulary = []
+        self.canonical_names = {}
+
+    def products(self):
+        """
+        (advances checkpoint, ids requested, product dicts) per chunk: the
+        products that failed last time first, then everything after the checkpoint
+        """
+        from vendors.models import VendorProduct
+        from .models import ProductTagAssociation
+
+        queryset = VendorProduct.objects.order_by('id')
+        if self.only_untagged:
+            queryset = queryset.exclude(ai_tags__source=ProductTagAssociation.SOURCE_AI)
+
+        retry = sorted(self.checkpoint.failed)
+        for start in range(0, len(retry), self.chunk_size):
+            ids = retry[start:start + self.chunk_size]
+            yield False, ids, list(queryset.filter(id__in=ids).values(*PRODUCT_FIELDS))
+
+        # Keyset pages instead of one open cursor, so writes between chunks never disturb the read
+        last_id = self.checkpoint.last_id
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id).values(*PRODUCT_FIELDS)[:self.chunk_size])
+            if not chunk:
+                return
+            last_id = chunk[-1]['id']
+            yield True, [product['id'] for product in chunk], chunk
+
+    def tag_one(self, product):
+        self.limiter.acquire()
+        tags = parse_tagging_response(self.tagger.complete(tagging_prompt(product, self.vocabulary)))
+        # Reuse existing tags whatever case the model answered in
+        return [(self.canonical_names.get(name, name), confidence) for name, confidence in tags]
+
+    def run(self):
+        from .tags import tag_vocabulary
+
+        self.vocabulary = tag_vocabulary()
+        self.canonical_names = {name.lower(): name for name in reversed(self.vocabulary)}
+        processed = 0
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ai-tagging') as executor:
+            for advances, requested, chunk in self.products():
+                # Requested ids without a product row (deleted, or tagged since) are done with
+                covered = set(requested) - {product['id'] for product in chunk}
+                if self.limit is not None:
+                    chunk = chunk[:max(0, self.limit - processed)]
+                    if not chunk:
+                        break
+                covered.update(product['id'] for product in chunk)
+                futures = [(product['id'], executor.submit(self.tag_one, product)) for product in chunk]
+                results, failed, circuit_open = {}, set(), False
+                for product_id, future in futures:
+                    try:
+                        tags = future.result()
+                    except CircuitOpen:
+                        circuit_open = True
+                        failed.add(product_id)
+                        continue
+                    except Exception as e:
+                        logger.warning(f"AI tagging failed for product {product_id}: {str(e)}")
+                        failed.add(product_id)
+                        continue
+                    if tags:
+                        results[product_id] = tags
+                    else:
+                        failed.add(product_id)
+
+                self.checkpoint.tagged += save_ai_tags(results)
+                # Only what was actually attempted; failures cut off by --limit stay queued
+                self.checkpoint.failed -= covered
+                self.checkpoint.failed |= failed
+                if advances:
+                    self.checkpoint.last_id = chunk[-1]['id']
+                self.checkpoint.save()
+
+                processed += len(chunk)
+                if self.stdout:
+                    rate = processed / max(time.time() - started, 1e-6)
+                    self.stdout.write(
+                        f"Tagged {processed} products ({len(results)} in this chunk, {len(failed)} failed), "
+                        f"{rate:.1f} products/s, checkpoint at id {self.checkpoint.last_id}"
+                    )
+                if circuit_open:
+                    raise LLMUnavailable(f"{self.tagger.backend} circuit open, stopping; rerun to resume")
+        return processed
@@ -0,0 +1,195 @@
+"""
+Normalized product tags and the cached tag vocabulary.
+
+VendorProduct.tags stays the editable comma-separated text. Every save
+writes it through to ProductTag rows and ProductTagAssociation rows with
+source='product', next to the AI-assigned ones. Tag lookups and filters
+then join on indexed ids instead of splitting or substring-matching the
+text of every product.
+
+The vocabulary (all tag and category names) is cached under a version
+number. The number is a shared generation counter in the database
+(search.generations), bumped whenever a tag or category is added, renamed
+or removed, so every worker sees the change. Each process keeps the list
+for the version it last saw; the cache holds it for the others.
+"""
+import logging
+import threading
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+MAX_TAG_LENGTH = 50  # ProductTag.name max_length
+VOCABULARY_GENERATION_NAME = 'tag_vocabulary'
+VOCABULARY_TIMEOUT = 86400
+PRODUCT_TAGS_ATTR = 'product_tag_links'
+
+
+def normalize_tag_name(name):
+    return ' '.join((name or '').split())[:MAX_TAG_LENGTH].strip()
+
+
+def split_tag_names(tag_string):
+    """Distinct normalized tag names of a comma-separated tags value, in order"""
+    names = []
+    for name in (tag_string or '').split(','):
+        name = normalize_tag_name(name)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def get_or_create_tags(names):
+    """{name: ProductTag id} for the given names, creating missing tags in bulk"""
+    from .models import ProductTag
+
+    names = set(names)
+    if not names:
+        return {}
+    tag_ids = _lookup_tag_ids(names)
+    missing = names - set(tag_ids)
+    if missing:
+        ProductTag.objects.bulk_create(
+            [ProductTag(name=name) for name in missing], batch_size=1000, ignore_conflicts=True
+        )
+        tag_ids.update(_lookup_tag_ids(missing))
+        # bulk_create sends no signals
+        transaction.on_commit(bump_vocabulary_version)
+    return tag_ids
+
+
+def _lookup_tag_ids(names, batch_size=500):
+    from .models import ProductTag
+
+    tag_ids = {}
+    names = list(names)
+    for start in range(0, len(names), batch_size):  # Stay under the SQL parameter limit
+        tag_ids.update(ProductTag.objects.filter(name__in=names[start:start + batch_size]).values_list('name', 'id'))
+    return tag_ids
+
+
+def product_tags_prefetch(lookup='ai_tags'):
+    """Prefetch of the products' own tag associations (source='product'), read by product_tag_names"""
+    from django.db.models import Prefetch
+    from .models import ProductTagAssociation
+
+    return Prefetch(
+        lookup,
+        queryset=ProductTagAssociation.objects.filter(
+            source=ProductTagAssociation.SOURCE_PRODUCT
+        ).select_related('tag'),
+        to_attr=PRODUCT_TAGS_ATTR
+    )
+
+
+def product_tag_names(product):
+    """The product's own tag names from its associations, in the order of its tags field"""
+    from .models import ProductTagAssociation
+
+    if product.pk is None:
+        return split_tag_names(product.tags)
+    links = getattr(product, PRODUCT_TAGS_ATTR, None)
+    if links is not None:
+        names = [link.tag.name for link in links]
+    else:
+        names = list(ProductTagAssociation.objects.filter(
+            product_id=product.pk, source=ProductTagAssociation.SOURCE_PRODUCT
+        ).values_list('tag__name', flat=True))
+    order = {name: position for position, name in enumerate(split_tag_names(product.tags))}
+    return sorted(names, key=lambda name: (order.get(name, len(order)), name))
+
+
+def sync_product_tags(product):
+    """Write the product's tags field through to its source='product' associations; True if any changed"""
+    return bool(sync_products_tags([product]))
+
+
+def sync_products_tags(products, batch_size=500):
+    """Write the tags fields of many products through at once; ids of the products whose associations changed"""
+    from django.db.models import Q
+    from .models import ProductTagAssociation
+
+    products = list(products)
+    tag_ids = get_or_create_tags({name for product in products for name in split_tag_names(product.tags)})
+    changed = []
+    for start in range(0, len(products), batch_size):
+        batch = products[start:start + batch_size]
+        existing = {product.pk: set() for product in batch}
+        for product_id, tag_id in ProductTagAssociation.objects.filter(
+            product_id__in=list(existing), source=ProductTagAssociation.SOURCE_PRODUCT
+        ).values_list('product_id', 'tag_id'):
+            existing[product_id].add(tag_id)
+
+        removed = Q()
+        added = []
+        for product in batch:
+            wanted = {tag_ids[name] for name in split_tag_names(product.tags) if name in tag_ids}
+            if wanted == existing[product.pk]:
+                continue
+            changed.append(product.pk)
+            if existing[product.pk] - wanted:
+                removed |= Q(product_id=product.pk, tag_id__in=existing[product.pk] - wanted)
+            added.extend(
+                ProductTagAssociation(product_id=product.pk, tag_id=tag_id, source=ProductTagAssociation.SOURCE_PRODUCT)
+                for tag_id in wanted - existing[product.pk]
+            )
+        if removed:
+            ProductTagAssociation.objects.filter(removed, source=ProductTagAssociation.SOURCE_PRODUCT).delete()
+        if added:
+            ProductTagAssociation.objects.bulk_create(added, batch_size=1000, ignore_conflicts=True)
+    return changed
+
+
+def tag_ids_matching(names):
+    """Ids of the tags named like any of names, ignoring case"""
+    from django.db.models import Q
+    from .models import ProductTag
+
+    condition = Q()
+    for name in {normalize_tag_name(name) for name in names}:
+        if name:
+            condition |= Q(name__iexact=name)
+    if not condition:
+        return []
+    return list(ProductTag.objects.filter(condition).values_list('id', flat=True))
+
+
+def get_vocabulary_version():
+    from search.generations import get_generation
+    return get_generation(VOCABULARY_GENERATION_NAME)[0]
+
+
+def bump_vocabulary_version():
+    from search.generations import bump_generation
+    bump_generation(VOCABULARY_GENERATION_NAME)
+
+
+_vocabulary = (None, [])
+_vocabulary_lock = threading.Lock()
+
+
+def tag_vocabulary():
+    """Sorted names of all tags and categories, for the current vocabulary version"""
+    global _vocabulary
+    version = get_vocabulary_version()
+    cached_version, names = _vocabulary
+    if cached_version == version:
+        return names
+    with _vocabulary_lock:
+        key = f'ai_search:tag_vocabulary:{version}'
+        names = cache.get(key)
+        if names is None:
+            names = _load_vocabulary()
+            cache.set(key, names, VOCABULARY_TIMEOUT)
+        _vocabulary = (version, names)
+    return names
+
+
+def _load_vocabulary():
+    from categories.models import Category
+    from .models import ProductTag
+
+    names = set(ProductTag.objects.values_list('name', flat=True))
+    names.update(Category.objects.values_list('name', flat=True))
+    return sorted(names)
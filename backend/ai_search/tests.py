@@ -1,3 +1,198 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase
+from search.changes import record_product_changes, request_index_rebuild
+from vendors.models import Vendor, VendorProduct
+from . import catalog
+from .llm_client import CircuitOpen, LLMClient, LLMUnavailable
+from .models import ProductTagAssociation
+from .tagging import BatchTagger, Checkpoint, parse_tagging_response
 
-# Create your tests here.
+
+class CatalogSnapshotTests(TransactionTestCase):
+    def setUp(self):
+        catalog._snapshot = None
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.phone = VendorProduct.objects.create(vendor=vendor, name='Phone', price=100, stock=5)
+        self.laptop = VendorProduct.objects.create(vendor=vendor, name='Laptop', price=900, stock=2)
+
+    def test_applies_changes_logged_by_other_processes(self):
+        """A write in another worker reaches this worker's snapshot through the shared log"""
+        self.assertEqual(len(catalog.get_catalog_snapshot()), 2)
+
+        # What another worker's save leaves behind: new rows and a log entry, no local signal
+        VendorProduct.objects.filter(pk=self.phone.pk).update(price=80)
+        VendorProduct.objects.filter(pk=self.laptop.pk).update(stock=0)
+        record_product_changes([self.phone.pk, self.laptop.pk])
+
+        snapshot = catalog.get_catalog_snapshot()
+        self.assertEqual([product.id for product in snapshot.get()], [self.phone.pk])
+        self.assertEqual(snapshot.products[self.phone.pk].price, Decimal('80'))
+
+    def test_unchanged_log_keeps_the_snapshot(self):
+        snapshot = catalog.get_catalog_snapshot()
+        self.assertIs(catalog.get_catalog_snapshot(), snapshot)
+
+    def test_rebuild_request_rebuilds(self):
+        snapshot = catalog.get_catalog_snapshot()
+        VendorProduct.objects.filter(pk=self.phone.pk).update(name='Smartphone')
+        request_index_rebuild()
+        rebuilt = catalog.get_catalog_snapshot()
+        self.assertIsNot(rebuilt, snapshot)
+        self.assertEqual(rebuilt.products[self.phone.pk].name, 'Smartphone')
+
+
+class StubTagger:
+    """Tags a product with the words of its name; fails for the names in failing"""
+    backend = 'stub'
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.asked = []
+
+    def complete(self, prompt):
+        name = prompt.split('Name: ', 1)[1].split('\n', 1)[0]
+        self.asked.append(name)
+        if name in self.failing:
+            raise LLMUnavailable('stub failure')
+        return 'Sure: ' + json.dumps([{'tag': word, 'confidence': 0.8} for word in name.lower().split()])
+
+
+class BatchTaggingTests(TransactionTestCase):
+    def setUp(self):
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.products = [
+            VendorProduct.objects.create(vendor=vendor, name=name, price=1)
+            for name in ('Red Shoe', 'Blue Hat', 'Green Scarf', 'Black Belt', 'White Sock')
+        ]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint_path = os.path.join(directory.name, 'checkpoint.json')
+
+    def run_tagger(self, tagger, **options):
+        checkpoint = Checkpoint(self.checkpoint_path)
+        checkpoint.load()
+        BatchTagger(tagger, checkpoint, workers=2, rate=0, chunk_size=2, **options).run()
+        return checkpoint
+
+    def ai_tags(self, product):
+        return dict(ProductTagAssociation.objects.filter(
+            product=product, source=ProductTagAssociation.SOURCE_AI
+        ).values_list('tag__name', 'confidence'))
+
+    def test_parses_tags_out_of_chatty_answers(self):
+        self.assertEqual(
+            parse_tagging_response('Here: ["Running  Shoes", {"tag": "light", "confidence": 3}, {"tag": 1}] ok'),
+            [('light', 1.0), ('running shoes', 0.5)]
+        )
+        self.assertEqual(parse_tagging_response('no tags'), [])
+
+    def test_tags_products_and_retries_failures_on_resume(self):
+        checkpoint = self.run_tagger(StubTagger(failing={'Blue Hat'}))
+        self.assertEqual(self.ai_tags(self.products[0]), {'red': 0.8, 'shoe': 0.8})
+        self.assertEqual(self.ai_tags(self.products[1]), {})
+        self.assertEqual(checkpoint.last_id, self.products[-1].pk)
+        self.assertEqual(checkpoint.failed, {self.products[1].pk})
+
+        tagger = StubTagger()
+        checkpoint = self.run_tagger(tagger)
+        self.assertEqual(tagger.asked, ['Blue Hat'])
+        self.assertEqual(self.ai_tags(self.products[1]), {'blue': 0.8, 'hat': 0.8})
+        self.assertEqual(checkpoint.failed, set())
+
+    def test_interrupted_run_resumes_after_its_last_chunk(self):
+        self.run_tagger(StubTagger(), limit=2)
+        tagger = StubTagger()
+        self.run_tagger(tagger)
+        self.assertEqual(tagger.asked, ['Green Scarf', 'Black Belt', 'White Sock'])
+        self.assertEqual(self.ai_tags(self.products[4]), {'white': 0.8, 'sock': 0.8})
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """/ok answers at once, /slow after half a second, anything else with a 500"""
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled connections are reused
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append((self.path, self.client_address))
+        if self.path == '/slow':
+            time.sleep(0.5)
+        status = 200 if self.path in ('/ok', '/slow') else 500
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LLMClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLMHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests = []
+        self.client = LLMClient(timeout=5, failure_threshold=2, reset_timeout=0.2, max_workers=2)
+
+    def call(self, path):
+        return lambda: self.client.post_json('stub', self.base_url + path)
+
+    def test_reuses_pooled_connections(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post_json('stub', f'{self.base_url}/ok'), {'path': '/ok'})
+        self.assertEqual(len({address for path, address in self.server.requests}), 1)
+
+    def test_breaker_opens_and_closes_after_a_trial_call(self):
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailable):
+                self.client.post_json('stub', f'{self.base_url}/fail')
+        with self.assertRaises(CircuitOpen):
+            self.client.post_json('stub', f'{self.base_url}/ok')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertFalse(self.client.available('stub'))
+
+        time.sleep(0.25)
+        self.assertEqual(self.client.post_json('stub', f'{self.base_url}/ok'), {'path': '/ok'})
+        self.assertEqual(self.client.breaker('stub').state, 'closed')
+
+    def test_hedge_answers_when_the_first_call_is_slow(self):
+        started = time.monotonic()
+        self.assertEqual(self.client.hedged([self.call('/slow'), self.call('/ok')], 0.05), {'path': '/ok'})
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_hedge_moves_on_at_once_when_a_call_fails(self):
+        started = time.monotonic()
+        self.assertEqual(self.client.hedged([self.call('/fail'), self.call('/ok')], 5), {'path': '/ok'})
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_hedge_gives_up_after_its_timeout(self):
+        self.assertIsNone(self.client.hedged([self.call('/slow')], 0.05, timeout=0.1))
+
+    def test_submitted_tasks_can_hedge_without_exhausting_the_pool(self):
+        """Request tasks filling every call worker would leave their hedged calls queued forever"""
+        futures = [
+            self.client.submit(self.client.hedged, [self.call('/slow'), self.call('/ok')], 0.05)
+            for _ in range(self.client.max_workers)
+        ]
+        for future in futures:
+            self.assertIn(future.result(timeout=5), [{'path': '/slow'}, {'path': '/ok'}])
@@ -31,7 +31,8 @@ def ai_search(request):
     search_results = gpt_ai_search_service.search_products(
         query=query,
         user_ip=user_ip,
-        user_agent=user_agent
+        user_agent=user_agent,
+        method=serializer.validated_data['method']
     )
     
     return Response(search_results, status=status.HTTP_200_OK)
@@ -163,6 +164,10 @@ def health_check(request):
         health_status['ollama_connected'] = False
         health_status['ollama_error'] = str(e)
     
+    # Circuit breaker state of the LLM backends used by search
+    from .llm_client import get_llm_client
+    health_status['llm_backends'] = get_llm_client().stats()
+    
     try:
         # Test a simple search (this tests the full pipeline)
         test_result = gpt_ai_search_service.search_products("test", user_ip="127.0.0.1")
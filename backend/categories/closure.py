@@ -0,0 +1,86 @@
+"""
+Maintenance of the CategoryClosure table.
+
+The table holds one row for every (ancestor, descendant) pair of the
+category tree, with their distance as depth, and a depth 0 row pairing each
+category with itself. The descendants of any set of categories are then a
+single indexed lookup, and the ancestors of a category another one.
+
+categories.signals keeps it consistent:
+
+- a new category gets its self row plus one row per ancestor of its parent;
+- a re-parented category's subtree is detached from its old ancestors and
+  attached under its new parent;
+- the children of a deleted category become roots (parent_category is
+  SET_NULL), so their subtrees are detached from the deleted category's
+  ancestors. Rows of the deleted category itself cascade.
+
+rebuild_category_closure recomputes the whole table from parent_category.
+"""
+import logging
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def attach_subtree(category_id, parent_id):
+    """Link the subtree rooted at category_id under parent_id and every ancestor of parent_id"""
+    from .models import CategoryClosure
+
+    if parent_id is None:
+        return
+    ancestors = list(CategoryClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+    subtree = list(CategoryClosure.objects.filter(ancestor_id=category_id).values_list('descendant_id', 'depth'))
+    CategoryClosure.objects.bulk_create(
+        [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=above + below + 1)
+            for ancestor_id, above in ancestors
+            for descendant_id, below in subtree
+        ],
+        ignore_conflicts=True
+    )
+
+
+def detach_subtree(category_id):
+    """Unlink the subtree rooted at category_id from the categories above it"""
+    from .models import CategoryClosure
+
+    subtree = list(CategoryClosure.objects.filter(ancestor_id=category_id).values_list('descendant_id', flat=True))
+    CategoryClosure.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+
+
+def add_category(category):
+    from .models import CategoryClosure
+
+    with transaction.atomic():
+        CategoryClosure.objects.bulk_create(
+            [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)], ignore_conflicts=True
+        )
+        attach_subtree(category.pk, category.parent_category_id)
+
+
+def move_category(category):
+    with transaction.atomic():
+        detach_subtree(category.pk)
+        attach_subtree(category.pk, category.parent_category_id)
+
+
+def rebuild_category_closure():
+    """Recompute every closure row from the parent links; returns the number of rows"""
+    from .models import Category, CategoryClosure
+
+    parents = dict(Category.objects.values_list('id', 'parent_category_id'))
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        # seen guards against parent cycles written around Category.save
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(rows, batch_size=1000)
+    logger.info(f"Category closure rebuilt with {len(rows)} rows for {len(parents)} categories")
+    return len(rows)
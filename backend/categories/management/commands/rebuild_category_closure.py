@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from categories.closure import rebuild_category_closure
+
+
+class Command(BaseCommand):
+    help = 'Recompute the category ancestor/descendant closure table from the parent links'
+
+    def handle(self, *args, **options):
+        rows = rebuild_category_closure()
+        self.stdout.write(self.style.SUCCESS(f'Category closure rebuilt with {rows} rows'))
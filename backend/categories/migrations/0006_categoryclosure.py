@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0005_alter_attribute_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='categories.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='categories.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='categories__descend_a03b0a_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+    ]
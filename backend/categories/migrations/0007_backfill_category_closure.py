@@ -0,0 +1,34 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_category_closure(apps, schema_editor):
+    """One row per (ancestor, descendant) pair, walked up the parent links"""
+    Category = apps.get_model('categories', 'Category')
+    CategoryClosure = apps.get_model('categories', 'CategoryClosure')
+
+    parents = dict(Category.objects.values_list('id', 'parent_category_id'))
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    CategoryClosure.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def remove_category_closure(apps, schema_editor):
+    apps.get_model('categories', 'CategoryClosure').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0006_categoryclosure'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_category_closure, remove_category_closure),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models
 from django.utils import timezone
 from django.utils.text import slugify
 
+CYCLE_ERROR = 'A category cannot be moved under itself or one of its subcategories'
+
 class Category(models.Model):
     name = models.CharField(max_length=100, default='')
     slug = models.SlugField(unique=True, null=True, blank=True)
@@ -20,38 +23,37 @@ class Category(models.Model):
         """Get count of products in this category and all its subcategories"""
         from vendors.models import VendorProduct
         
-        # Get all descendant categories (including self)
-        descendant_ids = self.get_descendants_and_self()
-        
-        # Count products in any of these categories
-        return VendorProduct.objects.filter(category_id__in=descendant_ids).count()
+        return VendorProduct.objects.filter(category_id__in=CategoryClosure.descendants_of([self.id])).count()
     
     def get_descendants_and_self(self):
         """Get IDs of this category and all its descendants"""
-        result = [self.id]
-        
-        # Get direct children
-        children = Category.objects.filter(parent_category=self)
-        for child in children:
-            result.extend(child.get_descendants_and_self())
-        
-        return result
+        return list(CategoryClosure.descendants_of([self.id]).values_list('descendant_id', flat=True))
+    
+    def get_ancestors_and_self(self):
+        """This category and its ancestors, root first"""
+        if not self.pk:
+            return [self]
+        return list(
+            Category.objects.filter(descendant_links__descendant_id=self.id).order_by('-descendant_links__depth')
+        )
     
     def get_root_category(self):
         """Get the root category for this category"""
-        if self.parent_category is None:
-            return self
-        return self.parent_category.get_root_category()
+        return self.get_ancestors_and_self()[0]
     
     def get_breadcrumb_path(self):
         """Get the full path from root to this category"""
-        path = []
-        current = self
-        while current:
-            path.insert(0, current)
-            current = current.parent_category
-        return path
+        return self.get_ancestors_and_self()
     
+    def creates_cycle(self, parent_id):
+        """True if making parent_id the parent would put this category under its own subtree"""
+        return bool(self.pk and parent_id and parent_id in self.get_descendants_and_self())
+
+    def clean(self):
+        super().clean()
+        if self.creates_cycle(self.parent_category_id):
+            raise ValidationError({'parent_category': CYCLE_ERROR})
+
     def save(self, *args, **kwargs):
         # Auto-generate slug if not provided
         if not self.slug:
@@ -60,6 +62,9 @@ class Category(models.Model):
         if not self.created_at:
             self.created_at = timezone.now()
         self.updated_at = timezone.now()
+        # Last line of defence; forms and serializers reject this in validation
+        if self.creates_cycle(self.parent_category_id):
+            raise IntegrityError(CYCLE_ERROR)
         super().save(*args, **kwargs)
     
     class Meta:
@@ -67,6 +72,32 @@ class Category(models.Model):
         ordering = ['display_order', 'name']
 
 
+class CategoryClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair of the category tree, including
+    each category paired with itself at depth 0. Maintained by
+    categories.signals, so a subtree is one indexed lookup at any depth.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['ancestor', 'descendant']
+        indexes = [models.Index(fields=['descendant', 'depth'])]
+
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def descendants_of(cls, category_ids):
+        """
+        Subquery of the ids of the given categories and all their descendants,
+        for filters like category_id__in=CategoryClosure.descendants_of(ids)
+        """
+        return cls.objects.filter(ancestor_id__in=category_ids).values('descendant_id')
+
+
 class AttributeGroup(models.Model):
     """
     Groups of related attributes, such as 'Screen', 'Interfaces', 'Dimensions', etc.
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Category, AttributeGroup, Attribute, AttributeOption
+from .models import CYCLE_ERROR, Category, AttributeGroup, Attribute, AttributeOption
 
 class AttributeOptionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -37,6 +37,11 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'parent_category', 'subcategories', 'attribute_groups', 'product_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+    def validate_parent_category(self, value):
+        if self.instance is not None and value is not None and self.instance.creates_cycle(value.pk):
+            raise serializers.ValidationError(CYCLE_ERROR)
+        return value
+
     def get_subcategories(self, obj):
         # Recursively serialize subcategories
         if obj.subcategories.exists():
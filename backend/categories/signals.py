@@ -0,0 +1,88 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from vendors.models import VendorProduct
+from vendors.signals import products_bulk_saved
+from .closure import add_category, detach_subtree, move_category
+from .models import Attribute, AttributeGroup, AttributeOption, Category
+from .tree import bump_tree_generation
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(pre_save, sender=Category)
+def category_parent_before_save(sender, instance, **kwargs):
+    """Remember the stored parent, to tell a re-parent from other edits"""
+    instance._stored_parent_id = None
+    if instance.pk:
+        instance._stored_parent_id = Category.objects.filter(pk=instance.pk).values_list(
+            'parent_category_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    """Keep the category closure consistent with the new or moved category"""
+    if created:
+        add_category(instance)
+    elif getattr(instance, '_stored_parent_id', None) != instance.parent_category_id:
+        move_category(instance)
+
+
+@receiver(pre_delete, sender=Category)
+def category_children_before_delete(sender, instance, **kwargs):
+    instance._child_ids = list(instance.subcategories.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    """The deleted category's children are now roots, detach their subtrees"""
+    for child_id in getattr(instance, '_child_ids', ()):
+        detach_subtree(child_id)
+
+
+@receiver(pre_save, sender=VendorProduct)
+def product_category_before_save(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored category, to tell a product move from other edits"""
+    instance._stored_category_id = instance.category_id
+    if instance.pk and (update_fields is None or {'category', 'category_id'} & set(update_fields)):
+        instance._stored_category_id = VendorProduct.objects.filter(pk=instance.pk).values_list(
+            'category_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=VendorProduct)
+def product_saved_tree(sender, instance, created, **kwargs):
+    """Only new and moved products change the product counts in the tree; stock and price edits do not"""
+    if created or getattr(instance, '_stored_category_id', None) != instance.category_id:
+        _bump_tree_generation_on_commit()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=AttributeGroup)
+@receiver(post_delete, sender=AttributeGroup)
+@receiver(m2m_changed, sender=AttributeGroup.categories.through)
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_save, sender=AttributeOption)
+@receiver(post_delete, sender=AttributeOption)
+@receiver(post_delete, sender=VendorProduct)
+@receiver(products_bulk_saved, sender=VendorProduct)
+def category_tree_changed(sender, **kwargs):
+    """Categories, their attribute groups and product counts are all part of the category tree"""
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+    _bump_tree_generation_on_commit()
+
+
+def _bump_tree_generation_on_commit():
+    def bump():
+        try:
+            bump_tree_generation()
+        except Exception as e:
+            logger.error(f"Failed to invalidate category tree: {e}")
+
+    # After commit, so a tree built from the old rows meanwhile is not taken as current
+    transaction.on_commit(bump)
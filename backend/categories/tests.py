@@ -1,3 +1,77 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+from vendors.models import Vendor, VendorProduct
+from .models import CYCLE_ERROR, Category
+from .tree import get_tree_generation
 
-# Create your tests here.
+
+class CategoryCycleTests(TransactionTestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name='Electronics')
+        self.child = Category.objects.create(name='Phones', parent_category=self.root)
+
+    def test_api_rejects_move_under_own_subtree(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        response = client.patch(
+            f'/api/categories/{self.root.slug}/', {'parent_category': self.child.pk}, format='json',
+            secure=True  # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['parent_category'], [CYCLE_ERROR])
+        self.root.refresh_from_db()
+        self.assertIsNone(self.root.parent_category_id)
+
+    def test_clean_and_save_reject_cycle(self):
+        self.root.parent_category = self.child
+        with self.assertRaises(ValidationError):
+            self.root.full_clean()
+        with self.assertRaises(IntegrityError):
+            self.root.save()
+
+
+class TreeGenerationTests(TransactionTestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(name='Phones')
+        self.laptops = Category.objects.create(name='Laptops')
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.product = VendorProduct.objects.create(vendor=vendor, name='Phone', price=1, category=self.phones)
+
+    def test_stock_and_price_edits_keep_the_tree(self):
+        generation = get_tree_generation()
+        self.product.stock = 3
+        self.product.price = 2
+        self.product.save()
+        self.product.save(update_fields=['stock'])
+        self.assertEqual(get_tree_generation(), generation)
+
+    def test_moves_creates_and_deletes_bump_it(self):
+        generation = get_tree_generation()
+        self.product.category = self.laptops
+        self.product.save()
+        self.assertGreater(get_tree_generation(), generation)
+
+        generation = get_tree_generation()
+        VendorProduct.objects.create(vendor=self.product.vendor, name='Laptop', price=1, category=self.laptops)
+        self.assertGreater(get_tree_generation(), generation)
+
+        generation = get_tree_generation()
+        self.product.delete()
+        self.assertGreater(get_tree_generation(), generation)
+
+
+class CategoryConditionalGetTests(TransactionTestCase):
+    def test_tree_edits_invalidate_the_etag(self):
+        Category.objects.create(name='Phones')
+        client = APIClient()
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        response = client.get('/api/categories/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(client.get('/api/categories/', secure=True, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Category.objects.create(name='Laptops')
+        self.assertEqual(client.get('/api/categories/', secure=True, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -0,0 +1,194 @@
+"""
+Process-local, immutable snapshot of the category tree.
+
+The tree is small and rarely changes. The category endpoints used to
+re-serialize it recursively on every request, with queries per node for
+its subcategories, attribute groups and rolled-up product count. Instead,
+each process builds a CategoryTree from a handful of queries:
+
+- the categories;
+- the attribute groups with their attributes and options;
+- one grouped count of products per category.
+
+Every category's JSON (its subtree included) is rendered to bytes once, in
+the CategorySerializer and CategoryDetailSerializer formats. Requests then
+only splice those bytes together.
+
+The snapshot is keyed by a generation counter in the database
+(search.generations), read once per request. The categories signals bump it
+when a category, attribute group, attribute or option changes, and when a
+product is created, deleted or moved to another category (the changes that
+affect product counts; stock and price edits leave the tree alone).
+Every process rebuilds its tree lazily on the first request that sees a
+newer generation, whichever process made the change.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+GENERATION_NAME = 'categories'
+
+
+def get_tree_generation():
+    from search.generations import get_generation
+    return get_generation(GENERATION_NAME)[0]
+
+
+def bump_tree_generation():
+    """Make every process rebuild its category tree on next use"""
+    from search.generations import bump_generation
+    bump_generation(GENERATION_NAME)
+
+
+def get_tree_last_modified():
+    """Time of the latest change to the tree, None when unknown"""
+    from search.generations import get_generation
+    return get_generation(GENERATION_NAME)[1]
+
+
+class CategoryTree:
+    """Parent/children links, slugs, breadcrumbs, rolled-up product counts and pre-rendered JSON"""
+
+    def __init__(self, generation, rows, direct_counts, groups):
+        from rest_framework.fields import DateTimeField
+        from rest_framework.renderers import JSONRenderer
+
+        self.generation = generation
+        self.ids = tuple(row['id'] for row in rows)
+        self.rows = {row['id']: row for row in rows}
+        self.parents = {row['id']: row['parent_category_id'] for row in rows}
+        self.slugs = {row['slug']: row['id'] for row in rows if row['slug']}
+        children = {category_id: [] for category_id in self.ids}
+        for category_id in self.ids:
+            # Rows come in display order, so children lists do too
+            parent_id = self.parents[category_id]
+            if parent_id in children:
+                children[parent_id].append(category_id)
+        self.children = {category_id: tuple(child_ids) for category_id, child_ids in children.items()}
+        self.root_ids = tuple(category_id for category_id in self.ids if self.parents[category_id] not in self.rows)
+
+        self.product_counts = dict.fromkeys(self.ids, 0)
+        for category_id, count in direct_counts.items():
+            for ancestor_id in self.breadcrumb(category_id):
+                self.product_counts[ancestor_id] += count
+
+        category_groups = {category_id: [] for category_id in self.ids}
+        for group in groups:
+            for category_id in group['categories']:
+                if category_id in category_groups:
+                    category_groups[category_id].append(group)
+
+        timestamp = DateTimeField()
+        renderer = JSONRenderer()
+        nodes = {}
+
+        def node(category_id, path):
+            if category_id not in nodes:
+                row = self.rows[category_id]
+                path = path | {category_id}
+                nodes[category_id] = {
+                    'id': category_id,
+                    'name': row['name'],
+                    'slug': row['slug'],
+                    'parent_category': row['parent_category_id'],
+                    'subcategories': [node(child_id, path) for child_id in self.children[category_id] if child_id not in path],
+                    'attribute_groups': category_groups[category_id],
+                    'product_count': self.product_counts[category_id],
+                    'created_at': timestamp.to_representation(row['created_at']),
+                    'updated_at': timestamp.to_representation(row['updated_at']),
+                }
+            return nodes[category_id]
+
+        self._json = {}
+        self._detail_json = {}
+        for category_id in self.ids:
+            data = node(category_id, frozenset())
+            self._json[category_id] = renderer.render(data)
+            # CategoryDetailSerializer lists the attribute groups without their categories
+            self._detail_json[category_id] = renderer.render({
+                **data,
+                'attribute_groups': [
+                    {key: value for key, value in group.items() if key != 'categories'}
+                    for group in data['attribute_groups']
+                ],
+            })
+
+    def __contains__(self, category_id):
+        return category_id in self.rows
+
+    def breadcrumb(self, category_id):
+        """Ids from the root down to the category"""
+        path = []
+        while category_id in self.rows and category_id not in path:
+            path.append(category_id)
+            category_id = self.parents[category_id]
+        return path[::-1]
+
+    def descendant_ids(self, category_id):
+        """The category and all its descendants"""
+        result, pending = [], [category_id] if category_id in self.rows else []
+        while pending:
+            current = pending.pop()
+            if current not in result:
+                result.append(current)
+                pending.extend(self.children[current])
+        return result
+
+    def category_id(self, slug):
+        return self.slugs.get(slug)
+
+    def category_json(self, category_id):
+        """The category in the CategorySerializer format, as JSON bytes"""
+        return self._json[category_id]
+
+    def detail_json(self, category_id):
+        """The category in the CategoryDetailSerializer format, as JSON bytes"""
+        return self._detail_json[category_id]
+
+    def list_json(self, category_ids):
+        return b'[' + b','.join(self._json[category_id] for category_id in category_ids) + b']'
+
+
+def build_category_tree(generation):
+    from django.db.models import Count
+    from vendors.models import VendorProduct
+    from .models import AttributeGroup, Category
+    from .serializers import AttributeGroupSerializer
+
+    started = time.perf_counter()
+    rows = list(Category.objects.values(
+        'id', 'name', 'slug', 'parent_category_id', 'created_at', 'updated_at'
+    ))
+    direct_counts = dict(
+        VendorProduct.objects.filter(category__isnull=False).order_by().values('category_id')
+        .annotate(count=Count('id')).values_list('category_id', 'count')
+    )
+    groups = AttributeGroupSerializer(
+        AttributeGroup.objects.prefetch_related('categories', 'attributes__options'), many=True
+    ).data
+    tree = CategoryTree(generation, rows, direct_counts, groups)
+    logger.info(
+        f"Category tree built with {len(rows)} categories in {(time.perf_counter() - started) * 1000:.1f}ms"
+    )
+    return tree
+
+
+_tree = None
+_tree_lock = threading.Lock()
+
+
+def get_category_tree():
+    """This process's tree for the current generation, rebuilt when a newer one is seen"""
+    global _tree
+    generation = get_tree_generation()
+    tree = _tree
+    if tree is None or tree.generation != generation:
+        with _tree_lock:
+            if _tree is None or _tree.generation != generation:
+                # Tagged with the generation read before loading, so an edit
+                # made during the build triggers another one
+                _tree = build_category_tree(generation)
+            tree = _tree
+    return tree
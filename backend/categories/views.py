@@ -1,18 +1,23 @@
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from django.utils import timezone
 from .models import Category, AttributeGroup, Attribute, AttributeOption
+from .tree import get_category_tree
+from utils.conditional import category_conditional_get
 from .serializers import (
-    CategorySerializer, CategoryDetailSerializer, 
+    CategorySerializer,
     AttributeGroupSerializer, AttributeSerializer, AttributeOptionSerializer
 )
 import logging
 
 logger = logging.getLogger(__name__)
 
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -20,7 +25,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
 
     def get_permissions(self):
         """Require admin for all write operations"""
-        if self.action in ['list', 'retrieve', 'root', 'detail']:
+        if self.action in ['list', 'retrieve', 'root', 'detail_view']:
             logger.info(f"Read-only action {self.action} - allowing public access")
             permission_classes = []
         else:
@@ -37,19 +42,53 @@ class CategoryViewSet(viewsets.ModelViewSet):
         if request.method not in ['GET', 'HEAD', 'OPTIONS']:
             logger.info(f"User {request.user} attempting to modify category {obj.name}")
 
+    def _tree_response(self, request, render_json, *surrogate_keys):
+        """render_json(tree) as the response, or a 304 when the client's copy is of the current tree"""
+        conditional = category_conditional_get(request, *surrogate_keys)
+        not_modified = conditional.not_modified()
+        if not_modified is not None:
+            return not_modified
+        return conditional.apply(HttpResponse(render_json(get_category_tree()), content_type='application/json'))
+
+    def _category_id(self, tree, slug):
+        category_id = tree.category_id(slug)
+        if category_id is None:
+            raise Http404
+        return category_id
+
+    def list(self, request, *args, **kwargs):
+        """All categories with their subtrees, served from the in-memory category tree"""
+        def render_json(tree):
+            page = self.paginate_queryset(list(tree.ids))
+            if page is None:
+                return tree.list_json(tree.ids)
+            envelope = JSONRenderer().render({
+                'count': self.paginator.page.paginator.count,
+                'next': self.paginator.get_next_link(),
+                'previous': self.paginator.get_previous_link(),
+            })
+            # The envelope's keys, then the pre-rendered results
+            return envelope[:-1] + b',"results":' + tree.list_json(page) + b'}'
+        return self._tree_response(request, render_json)
+
+    def retrieve(self, request, *args, **kwargs):
+        slug = kwargs[self.lookup_field]
+        return self._tree_response(
+            request, lambda tree: tree.category_json(self._category_id(tree, slug)), f'category-{slug}'
+        )
+
     @action(detail=False, methods=['get'])
     def root(self, request):
         """Get only root categories (those without parents)"""
-        root_categories = Category.objects.filter(parent_category=None)
-        serializer = self.get_serializer(root_categories, many=True)
-        return Response(serializer.data)
+        return self._tree_response(request, lambda tree: tree.list_json(tree.root_ids))
     
-    @action(detail=True, methods=['get'])
-    def detail(self, request, slug=None):
+    # Not named detail: DRF sets a view's detail attribute to a bool, shadowing such a method
+    @action(detail=True, methods=['get'], url_path='detail')
+    def detail_view(self, request, slug=None):
         """Get detailed category view with attribute groups"""
-        category = self.get_object()
-        serializer = CategoryDetailSerializer(category)
-        return Response(serializer.data)
+        return self._tree_response(
+            request, lambda tree: tree.detail_json(self._category_id(tree, slug)), f'category-{slug}'
+        )
 
     def perform_create(self, serializer):
         serializer.save(
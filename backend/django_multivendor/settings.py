@@ -522,11 +522,111 @@ CORS_ALLOW_HEADERS = [
 # GitHub Copilot API Configuration
 GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN', None)  # Set your GitHub token in environment variables
 
+COPILOT_TOKEN_URL = os.environ.get('COPILOT_TOKEN_URL', 'https://api.github.com/copilot_internal/v2/token')
+COPILOT_CHAT_URL = os.environ.get('COPILOT_CHAT_URL', 'https://copilot-proxy.githubusercontent.com/v1/chat/completions')
+
 # Legacy Ollama configuration (kept for fallback)
-OLLAMA_API_URL = 'http://localhost:11434/api/generate'
+OLLAMA_API_URL = os.environ.get('OLLAMA_API_URL', 'http://localhost:11434/api/generate')
 OLLAMA_MODEL = 'gemma:7b'
 AI_SEARCH_DEBUG = True  # Set to False in production
 AI_SEARCH_CACHE_TIMEOUT = 3600  # 1 hour cache
+# Seconds the streaming AI search waits for the AI stage before it sends an error frame
+AI_SEARCH_STREAM_TIMEOUT = 60
+
+# Product full-text search backend (dotted path to a search.backends class).
+# None picks the native index of the database: SQLite FTS5 or PostgreSQL tsvector,
+# falling back to 'search.backends.postings.PostingsSearchBackend' (portable inverted index).
+SEARCH_BACKEND = None
+
+# Result counts of paginated product listings: 'exact' runs COUNT(*) on every
+# request, 'cached' caches the exact count per filter signature for
+# LISTING_COUNT_CACHE_TIMEOUT seconds, 'estimate' reads the search index or
+# the query planner and flags the response with count_is_estimate. Where
+# neither applies, 'estimate' reuses an exact count per filter signature for
+# LISTING_COUNT_ESTIMATE_TIMEOUT seconds (flagged as an estimate when reused)
+LISTING_COUNT_STRATEGY = 'cached'
+LISTING_COUNT_CACHE_TIMEOUT = 60
+LISTING_COUNT_ESTIMATE_TIMEOUT = 900
+
+# Search log rows are buffered in-process and bulk inserted by a background
+# thread every SEARCH_LOG_FLUSH_INTERVAL seconds or SEARCH_LOG_BATCH_SIZE rows.
+# Events beyond SEARCH_LOG_MAX_QUEUE are dropped (and counted) rather than
+# slowing requests down. SEARCH_LOG_ASYNC = False writes each row immediately.
+SEARCH_LOG_ASYNC = True
+SEARCH_LOG_BATCH_SIZE = 200
+SEARCH_LOG_FLUSH_INTERVAL = 2.0
+SEARCH_LOG_MAX_QUEUE = 10000
+
+# Seconds between full rebuilds of the in-memory typeahead trie (product
+# changes are patched in immediately by signals in the same process)
+TYPEAHEAD_REBUILD_INTERVAL = 600
+
+# Typo-tolerant search: when exact search finds fewer than FUZZY_SEARCH_MIN_RESULTS
+# products, add products with a name, brand or category word whose trigram word
+# similarity to a query word is at least FUZZY_SEARCH_THRESHOLD (pg_trgm on
+# PostgreSQL, else an in-memory trigram index rebuilt every FUZZY_INDEX_REBUILD_INTERVAL seconds)
+FUZZY_SEARCH_MIN_RESULTS = 5
+FUZZY_SEARCH_THRESHOLD = 0.4
+FUZZY_INDEX_REBUILD_INTERVAL = 600
+
+# Lower bounds of the price histogram facet returned with ?facets=true
+# (the last bucket is open-ended)
+FACET_PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+# Seconds between full rebuilds of the in-memory product x term matrix used to
+# score tag/AI search (requires numpy; product changes are overlaid in between)
+PRODUCT_MATRIX_REBUILD_INTERVAL = 900
+
+# Lifetime of cached search/listing result pages (product ids only). Entries
+# are also invalidated at once by any product, category or review change:
+# they are keyed by a generation counter kept in the database
+# (search.generations), which every worker process reads. The pages live in
+# django.core.cache. Without CACHES that is a per-process LocMemCache, which
+# stays correct but gives each worker its own cache. Point CACHES at a shared
+# backend (e.g. Redis) to share the pages too.
+SEARCH_RESULT_CACHE_TIMEOUT = 300
+
+# Conditional GET on catalog reads (products, categories, search suggestions):
+# ETags follow the catalog/category generations, so clients revalidate with a
+# cheap 304 after CATALOG_CACHE_MAX_AGE seconds. Shared caches (the Cloudflare
+# edge) may serve a response for CATALOG_EDGE_MAX_AGE seconds, or until it is
+# purged by one of its Surrogate-Key / Cache-Tag keys.
+CATALOG_CACHE_MAX_AGE = 0
+CATALOG_EDGE_MAX_AGE = 60
+
+# Rows of a bulk product import (vendors.bulk) validated and written per
+# transaction; each chunk is reindexed and invalidates the catalog caches once
+PRODUCT_IMPORT_CHUNK_SIZE = 1000
+
+# Seconds between full rebuilds of the in-memory catalog snapshot shared by the
+# AI search services. In between, product and tag edits made by any worker are
+# read from the shared change log (search.changes) and applied incrementally.
+AI_CATALOG_REBUILD_INTERVAL = 900
+
+# LLM tag extraction cache: a per-process LRU in front of ai_search.SearchResult.
+# Concurrent identical queries wait up to LLM_CACHE_WAIT_TIMEOUT for one call.
+LLM_CACHE_TIMEOUT = 86400
+LLM_CACHE_LOCAL_SIZE = 1024
+LLM_CACHE_LOCAL_TIMEOUT = 300
+LLM_CACHE_WAIT_TIMEOUT = 45
+
+# Shared LLM HTTP client: pooled connections, per-backend circuit breakers that
+# skip a failing backend for LLM_CIRCUIT_RESET seconds after LLM_CIRCUIT_FAILURES
+# consecutive failures, and optional hedging (ask GPT-4o too when Ollama has not
+# answered within LLM_HEDGE_DELAY seconds; None disables it)
+LLM_TIMEOUT = 30
+LLM_CONNECT_TIMEOUT = 3
+LLM_POOL_SIZE = 20
+LLM_MAX_WORKERS = 16
+LLM_CIRCUIT_FAILURES = 5
+LLM_CIRCUIT_RESET = 30
+LLM_HEDGE_DELAY = None
+
+# Local semantic search (search_method 'semantic'): vectors written by the
+# build_semantic_index command and memory-mapped by every worker. IVF indexes
+# score the SEMANTIC_SEARCH_PROBES clusters closest to the query.
+SEMANTIC_INDEX_DIR = BASE_DIR / 'semantic_index'
+SEMANTIC_SEARCH_PROBES = 8
 
 # Channel Layers Configuration for WebSocket Support
 if is_package_installed('channels'):
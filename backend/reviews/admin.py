@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Review, ReviewImage, ReviewVideo
+from .models import ProductRatingSummary, Review, ReviewImage, ReviewVideo
 
 
 class ReviewImageInline(admin.TabularInline):
@@ -30,4 +30,13 @@ class ReviewImageAdmin(admin.ModelAdmin):
 @admin.register(ReviewVideo)  
 class ReviewVideoAdmin(admin.ModelAdmin):
     list_display = ['id', 'review', 'video', 'duration', 'created_at']
-    list_filter = ['created_at']
\ No newline at end of file
+    list_filter = ['created_at']
+
+
+@admin.register(ProductRatingSummary)
+class ProductRatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ['product', 'review_count', 'average_rating', 'updated_at']
+    search_fields = ['product__name']
+    readonly_fields = [
+        'product', 'review_count', 'rating_sum', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5', 'updated_at'
+    ]
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from reviews.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the review count, rating sum and star histogram of products from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='products',
+            help='Only repair this product id (repeatable; default: every product)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of summaries written per bulk upsert (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recomputing product rating summaries...')
+        written, removed = rebuild_rating_summaries(
+            product_ids=options['products'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} rating summaries written, {removed} summaries of products without reviews removed'
+        ))
@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db.models import Count
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    """One summary per reviewed product, from a single grouped count of its reviews"""
+    Review = apps.get_model('reviews', 'Review')
+    ProductRatingSummary = apps.get_model('reviews', 'ProductRatingSummary')
+
+    summaries = {}
+    now = timezone.now()
+    rows = Review.objects.order_by().values('product_id', 'rating').annotate(count=Count('id'))
+    for row in rows:
+        summary = summaries.get(row['product_id'])
+        if summary is None:
+            summary = summaries[row['product_id']] = ProductRatingSummary(product_id=row['product_id'], updated_at=now)
+        summary.review_count += row['count']
+        summary.rating_sum += row['rating'] * row['count']
+        if 1 <= row['rating'] <= 5:
+            field = f"stars_{row['rating']}"
+            setattr(summary, field, getattr(summary, field) + row['count'])
+
+    ProductRatingSummary.objects.bulk_create(list(summaries.values()), batch_size=BATCH_SIZE)
+
+
+def remove_rating_summaries(apps, schema_editor):
+    apps.get_model('reviews', 'ProductRatingSummary').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_productratingsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rating_summaries, remove_rating_summaries),
+    ]
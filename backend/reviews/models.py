@@ -43,3 +43,35 @@ class ReviewVideo(models.Model):
 
     def __str__(self):
         return f"Video for review {self.review.id}"
+
+
+class ProductRatingSummary(models.Model):
+    """
+    Review count, rating sum and star histogram of a product, kept in step
+    with its reviews by reviews.signals (repair_rating_summaries recomputes them)
+    """
+    product = models.OneToOneField(
+        VendorProduct, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary'
+    )
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.average_rating} from {self.review_count} reviews"
+
+    @property
+    def average_rating(self):
+        if self.review_count <= 0:
+            return 0.0
+        return round(self.rating_sum / self.review_count, 1)
+
+    @property
+    def histogram(self):
+        """{stars: number of reviews} for 1 to 5 stars"""
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
@@ -0,0 +1,86 @@
+"""
+Denormalized review statistics of products.
+
+Every product with reviews has a ProductRatingSummary row holding its
+review count, rating sum and 1-5 star histogram. Product listings read
+average_rating and review_count from it, through select_related, instead of
+aggregating the reviews of every product on the page.
+
+The reviews signals move a summary by the rating of each created, updated
+or deleted review. Each move is a single UPDATE of F() expressions, so
+concurrent reviews of the same product cannot lose each other's deltas.
+rebuild_rating_summaries recomputes the summaries from the reviews in bulk,
+for a backfill or after writes that bypassed the signals.
+"""
+import logging
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STAR_FIELDS = {stars: f'stars_{stars}' for stars in range(1, 6)}
+
+
+def apply_rating_delta(product_id, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one review of the given rating from the product's summary"""
+    from .models import ProductRatingSummary
+
+    changes = {
+        'review_count': F('review_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+        'updated_at': timezone.now(),
+    }
+    if rating in STAR_FIELDS:
+        changes[STAR_FIELDS[rating]] = F(STAR_FIELDS[rating]) + sign
+
+    summaries = ProductRatingSummary.objects.filter(product_id=product_id)
+    if summaries.update(**changes) or sign < 0:
+        # A missing summary has nothing to remove, e.g. while its product is being deleted
+        return
+    with transaction.atomic():
+        # A concurrent first review may create the row in between; the update then adds to it
+        ProductRatingSummary.objects.bulk_create(
+            [ProductRatingSummary(product_id=product_id)], ignore_conflicts=True
+        )
+        summaries.update(**changes)
+
+
+def rebuild_rating_summaries(product_ids=None, batch_size=1000):
+    """
+    Recompute the summaries of the given products (all products when None)
+    from their reviews; returns (summaries written, summaries removed)
+    """
+    from .models import ProductRatingSummary, Review
+
+    reviews = Review.objects.all()
+    summaries = ProductRatingSummary.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+        summaries = summaries.filter(product_id__in=product_ids)
+
+    computed = {}
+    now = timezone.now()
+    rows = reviews.order_by().values('product_id', 'rating').annotate(count=Count('id'))
+    for row in rows:
+        summary = computed.get(row['product_id'])
+        if summary is None:
+            summary = computed[row['product_id']] = ProductRatingSummary(product_id=row['product_id'], updated_at=now)
+        summary.review_count += row['count']
+        summary.rating_sum += row['rating'] * row['count']
+        if row['rating'] in STAR_FIELDS:
+            setattr(summary, STAR_FIELDS[row['rating']], getattr(summary, STAR_FIELDS[row['rating']]) + row['count'])
+
+    with transaction.atomic():
+        removed, _ = summaries.exclude(
+            Exists(Review.objects.filter(product_id=OuterRef('product_id')))
+        ).delete()
+        ProductRatingSummary.objects.bulk_create(
+            list(computed.values()),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['review_count', 'rating_sum', *STAR_FIELDS.values(), 'updated_at']
+        )
+    logger.info(f"Rebuilt {len(computed)} product rating summaries, removed {removed}")
+    return len(computed), removed
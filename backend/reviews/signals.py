@@ -1,15 +1,33 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
 from .models import Review
+from .ratings import apply_rating_delta
+
+
+@receiver(pre_save, sender=Review)
+def review_rating_before_save(sender, instance, **kwargs):
+    """Remember the stored product and rating, so an edit moves the summary by the difference"""
+    instance._stored_rating = None
+    if instance.pk:
+        instance._stored_rating = Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
 
 
 @receiver(post_save, sender=Review)
 def review_saved(sender, instance, created, **kwargs):
     """
     Signal handler for when a review is created or updated.
-    Clears cache for the product to ensure fresh rating calculations.
+    Updates the product's rating summary and clears cache for the product
+    to ensure fresh rating calculations.
     """
+    stored = getattr(instance, '_stored_rating', None)
+    if stored != (instance.product_id, instance.rating):
+        with transaction.atomic():
+            if stored is not None:
+                apply_rating_delta(stored[0], stored[1], -1)
+            apply_rating_delta(instance.product_id, instance.rating, 1)
+
     # Clear any cached data for this product
     product_cache_key = f"product_{instance.product.id}"
     cache.delete(product_cache_key)
@@ -27,8 +45,11 @@ def review_saved(sender, instance, created, **kwargs):
 def review_deleted(sender, instance, **kwargs):
     """
     Signal handler for when a review is deleted.
-    Clears cache for the product to ensure fresh rating calculations.
+    Updates the product's rating summary and clears cache for the product
+    to ensure fresh rating calculations.
     """
+    apply_rating_delta(instance.product_id, instance.rating, -1)
+
     # Clear any cached data for this product
     product_cache_key = f"product_{instance.product.id}"
     cache.delete(product_cache_key)
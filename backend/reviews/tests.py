@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+from vendors.models import Vendor, VendorProduct
+from .models import ProductRatingSummary, Review
+from .ratings import rebuild_rating_summaries
 
-# Create your tests here.
+
+class RatingSummaryTests(TransactionTestCase):
+    def setUp(self):
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.phone = VendorProduct.objects.create(vendor=vendor, name='Phone', price=1)
+        self.laptop = VendorProduct.objects.create(vendor=vendor, name='Laptop', price=1)
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+
+    def summary(self, product):
+        summary = ProductRatingSummary.objects.filter(product=product).first()
+        if summary is None:
+            return None
+        return summary.review_count, summary.rating_sum, summary.histogram
+
+    def test_reviews_move_the_summary_by_their_deltas(self):
+        review = Review.objects.create(product=self.phone, user=self.alice, rating=4)
+        Review.objects.create(product=self.phone, user=self.bob, rating=5)
+        self.assertEqual(self.summary(self.phone), (2, 9, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}))
+
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.summary(self.phone), (2, 7, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}))
+
+        # Edits that keep the rating leave the summary alone
+        review.comment = 'Still fine'
+        review.save()
+        self.assertEqual(self.summary(self.phone), (2, 7, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}))
+
+        review.product = self.laptop
+        review.save()
+        self.assertEqual(self.summary(self.phone), (1, 5, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}))
+        self.assertEqual(self.summary(self.laptop), (1, 2, {1: 0, 2: 1, 3: 0, 4: 0, 5: 0}))
+
+        review.delete()
+        self.assertEqual(self.summary(self.laptop), (0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+        product = VendorProduct.objects.select_related('rating_summary').get(pk=self.phone.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual((product.average_rating, product.review_count), (5.0, 1))
+
+    def test_repair_recomputes_summaries_from_reviews(self):
+        Review.objects.create(product=self.phone, user=self.alice, rating=3)
+        Review.objects.create(product=self.phone, user=self.bob, rating=5)
+        Review.objects.create(product=self.laptop, user=self.alice, rating=1)
+        Review.objects.filter(product=self.laptop).delete()
+        # Summaries left wrong by writes that bypassed the signals
+        ProductRatingSummary.objects.filter(product=self.phone).update(review_count=7, stars_3=0)
+        ProductRatingSummary.objects.filter(product=self.laptop).update(review_count=1, rating_sum=1, stars_1=1)
+
+        self.assertEqual(rebuild_rating_summaries(), (1, 1))
+        self.assertEqual(self.summary(self.phone), (2, 8, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}))
+        self.assertIsNone(self.summary(self.laptop))
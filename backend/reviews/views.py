@@ -163,23 +163,17 @@ class ReviewViewSet(viewsets.ModelViewSet):
             return Response({'error': 'product_id parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            product = VendorProduct.objects.get(id=product_id)
+            product = VendorProduct.objects.select_related('rating_summary').get(id=product_id)
         except VendorProduct.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        summary = product.get_rating_summary()
         reviews = Review.objects.filter(product=product).select_related('user').prefetch_related('images', 'videos')
         serializer = self.get_serializer(reviews, many=True)
         
         return Response({
             'results': serializer.data,
-            'average_rating': self._calculate_average_rating(reviews),
-            'total_reviews': reviews.count()
+            'average_rating': product.average_rating,
+            'total_reviews': product.review_count,
+            'rating_distribution': summary.histogram if summary else {stars: 0 for stars in range(1, 6)}
         })
-
-    def _calculate_average_rating(self, reviews):
-        """Calculate average rating for reviews"""
-        if not reviews:
-            return 0
-        
-        total_rating = sum(review.rating for review in reviews)
-        return round(total_rating / len(reviews), 1)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SearchLog, SearchResult
+from .models import SearchLog, SearchResult, SearchLogRollup, SearchQueryRollup
 
 @admin.register(SearchLog)
 class SearchLogAdmin(admin.ModelAdmin):
@@ -50,3 +50,19 @@ class SearchResultAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False  # Make read-only
+
+
+@admin.register(SearchLogRollup)
+class SearchLogRollupAdmin(admin.ModelAdmin):
+    list_display = ['period_start', 'granularity', 'search_type', 'search_count', 'zero_result_count']
+    list_filter = ['granularity', 'search_type']
+    date_hierarchy = 'period_start'
+    ordering = ['-period_start']
+
+
+@admin.register(SearchQueryRollup)
+class SearchQueryRollupAdmin(admin.ModelAdmin):
+    list_display = ['day', 'query', 'search_count']
+    search_fields = ['query']
+    date_hierarchy = 'day'
+    ordering = ['-day', '-search_count']
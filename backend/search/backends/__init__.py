@@ -0,0 +1,58 @@
+"""
+Pluggable full-text search backends for product search.
+
+settings.SEARCH_BACKEND is a dotted path to a BaseSearchBackend subclass.
+When it is None the native backend of the default database is used if its
+index exists (SQLite FTS5, PostgreSQL tsvector), otherwise the portable
+inverted-index backend.
+"""
+import logging
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .base import BaseSearchBackend
+from .postings import PostingsSearchBackend
+
+logger = logging.getLogger(__name__)
+
+NATIVE_BACKENDS = {
+    'sqlite': 'search.backends.sqlite_fts.SQLiteFTSSearchBackend',
+    'postgresql': 'search.backends.postgres.PostgresSearchBackend',
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured search backend instance (resolved once per process)"""
+    global _backend
+    if _backend is None:
+        _backend = _load_backend()
+    return _backend
+
+
+def reset_search_backend():
+    """Forget the resolved backend, e.g. after creating the native index"""
+    global _backend
+    _backend = None
+
+
+def _load_backend():
+    backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+
+    native_path = NATIVE_BACKENDS.get(connection.vendor)
+    if native_path:
+        backend = import_string(native_path)()
+        try:
+            if backend.is_available():
+                return backend
+        except Exception as e:
+            logger.warning(f"Native search backend check failed: {e}")
+        logger.info(f"Native search index for {connection.vendor} not found, using postings backend")
+    return PostingsSearchBackend()
+
+
+__all__ = ['BaseSearchBackend', 'PostingsSearchBackend', 'get_search_backend', 'reset_search_backend']
@@ -0,0 +1,66 @@
+"""
+Common interface of the product full-text search backends.
+"""
+from abc import ABC, abstractmethod
+from django.db.models import Q
+
+from search.indexing import query_terms
+
+
+class BaseSearchBackend(ABC):
+    """
+    A search backend restricts a VendorProduct queryset to the products
+    matching a free-text query and annotates them with `relevance_score`
+    (higher is better), so callers can keep chaining their own filters,
+    ordering and pagination.
+    """
+    name = 'base'
+
+    def is_available(self):
+        """Whether the backend's index structures exist in the database"""
+        return True
+
+    @abstractmethod
+    def filter(self, queryset, query):
+        """Restrict the queryset to products matching the query"""
+
+    @abstractmethod
+    def annotate_relevance(self, queryset, query):
+        """Annotate the queryset with a relevance_score for the query"""
+
+    def search(self, queryset, query):
+        """Filter and annotate in one step; the usual entry point"""
+        if not query_terms(query):
+            return queryset.none()
+        return self.annotate_relevance(self.filter(queryset, query), query)
+
+    def rank(self, queryset, query, limit=None, after=None, with_total=True):
+        """
+        Return (top, total): the `limit` most relevant (product_id, score)
+        pairs among the queryset's matches, best first, and the match count.
+
+        after is an optional (score, product_id) keyset position; only
+        results ranked strictly below it are returned. total is None when
+        with_total is False. The default ranks in the database by
+        relevance_score.
+        """
+        matches = self.search(queryset, query)
+        total = matches.count() if with_total else None
+        if after is not None:
+            score, last_id = after
+            matches = matches.filter(
+                Q(relevance_score__lt=score) | Q(relevance_score=score, id__gt=last_id)
+            )
+        ranked = matches.order_by('-relevance_score', 'id').values_list('id', 'relevance_score')
+        if limit is not None:
+            ranked = ranked[:limit]
+        return list(ranked), total
+
+    def estimate_count(self, query, in_stock_only=False):
+        """Cheap approximate match count for the query, from the inverted index"""
+        from search.ranking import estimate_match_count
+        return estimate_match_count(query, in_stock_only=in_stock_only)
+
+    @abstractmethod
+    def rebuild(self, stdout=None):
+        """Rebuild the backend's index from the product table"""
@@ -0,0 +1,94 @@
+"""
+Native PostgreSQL backend: a stored generated tsvector column on
+vendors_vendorproduct with a GIN index, ranked with ts_rank_cd().
+
+Each field is stored under its own tsvector weight class and the classes
+are ranked with FIELD_WEIGHTS, so fields count as they do in the other
+backends. Ranks are normalised by document length.
+"""
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from search.indexing import FIELD_WEIGHTS, query_terms
+from vendors.models import VendorProduct
+from .base import BaseSearchBackend
+
+PRODUCT_TABLE = VendorProduct._meta.db_table
+PRODUCT_PK = VendorProduct._meta.pk.column
+VECTOR_COLUMN = 'search_vector'
+GIN_INDEX = 'search_product_vector_gin'
+
+# tsvector weight class of each field
+FIELD_CLASSES = {'name': 'A', 'brand': 'B', 'tags': 'C', 'description': 'D'}
+# ts_rank_cd takes the class weights in D, C, B, A order, each at most 1.0
+RANK_WEIGHTS = '{%s}' % ', '.join(
+    str(FIELD_WEIGHTS[field] / max(FIELD_WEIGHTS.values()))
+    for field in sorted(FIELD_CLASSES, key=FIELD_CLASSES.get, reverse=True)
+)
+# 1: divide by 1 + log(document length), 32: scale to rank / (rank + 1)
+RANK_NORMALIZATION = 1 | 32
+
+
+def vector_expression():
+    return ' || '.join(
+        f"setweight(to_tsvector('simple', coalesce({field}, '')), '{weight_class}')"
+        for field, weight_class in FIELD_CLASSES.items()
+    )
+
+
+def install(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {PRODUCT_TABLE} ADD COLUMN IF NOT EXISTS {VECTOR_COLUMN} tsvector "
+            f"GENERATED ALWAYS AS ({vector_expression()}) STORED"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} ON {PRODUCT_TABLE} USING GIN ({VECTOR_COLUMN})"
+        )
+    return True
+
+
+def uninstall(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP INDEX IF EXISTS {GIN_INDEX}")
+        cursor.execute(f"ALTER TABLE {PRODUCT_TABLE} DROP COLUMN IF EXISTS {VECTOR_COLUMN}")
+
+
+def tsquery_expression(query):
+    """to_tsquery string: any query word as a prefix, OR-ed together"""
+    # Terms only contain word characters, so no tsquery operators can leak in
+    return ' | '.join(f'{term}:*' for term in query_terms(query))
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    name = 'postgres_tsvector'
+
+    def is_available(self):
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            columns = connection.introspection.get_table_description(cursor, PRODUCT_TABLE)
+        return any(column.name == VECTOR_COLUMN for column in columns)
+
+    def filter(self, queryset, query):
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT {PRODUCT_PK} FROM {PRODUCT_TABLE} WHERE {VECTOR_COLUMN} @@ to_tsquery('simple', %s)",
+            [tsquery_expression(query)]
+        ))
+
+    def annotate_relevance(self, queryset, query):
+        return queryset.annotate(relevance_score=RawSQL(
+            f"ts_rank_cd('{RANK_WEIGHTS}', {PRODUCT_TABLE}.{VECTOR_COLUMN}, "
+            f"to_tsquery('simple', %s), {RANK_NORMALIZATION})",
+            [tsquery_expression(query)],
+            output_field=FloatField()
+        ))
+
+    def rebuild(self, stdout=None):
+        # The generated column is maintained by PostgreSQL itself
+        install()
+        if stdout:
+            stdout.write(f'Verified PostgreSQL tsvector column {PRODUCT_TABLE}.{VECTOR_COLUMN}')
@@ -0,0 +1,36 @@
+"""
+Portable backend on top of the search app's own inverted index tables.
+Works on every database Django supports.
+"""
+from django.db.models import FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from search.indexing import candidate_product_ids, matching_postings, rebuild_index
+from search.ranking import bm25f_scores, invalidate_index_statistics, top_k
+from .base import BaseSearchBackend
+
+
+class PostingsSearchBackend(BaseSearchBackend):
+    name = 'postings'
+
+    def filter(self, queryset, query):
+        return queryset.filter(id__in=candidate_product_ids(query))
+
+    def annotate_relevance(self, queryset, query):
+        # Sum of field-weighted term frequencies of the matching postings
+        relevance = matching_postings(query).filter(product_id=OuterRef('pk')).values('product_id').annotate(
+            score=Sum('weight')
+        ).values('score')
+        return queryset.annotate(
+            relevance_score=Coalesce(Subquery(relevance, output_field=FloatField()), 0.0)
+        )
+
+    def rank(self, queryset, query, limit=None, after=None, with_total=True):
+        # BM25F over the postings of the query terms, top-k through a heap
+        scores = bm25f_scores(query, candidates=queryset)
+        return top_k(scores, limit, after=after), len(scores)
+
+    def rebuild(self, stdout=None):
+        indexed = rebuild_index(stdout=stdout)
+        invalidate_index_statistics()
+        return indexed
@@ -0,0 +1,160 @@
+"""
+Native SQLite backend: an FTS5 external-content table over
+vendors_vendorproduct, kept current by triggers and ranked with bm25()
+weighted per column by FIELD_WEIGHTS, the same field weights the postings
+backend's BM25F uses.
+"""
+import logging
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from search.indexing import FIELD_WEIGHTS, INDEXED_FIELDS, query_terms
+from vendors.models import VendorProduct
+from .base import BaseSearchBackend
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'search_product_fts'
+PRODUCT_TABLE = VendorProduct._meta.db_table
+PRODUCT_PK = VendorProduct._meta.pk.column
+FTS_COLUMNS = INDEXED_FIELDS
+# bm25() takes one weight per column, in column order
+BM25_WEIGHTS = ', '.join(str(FIELD_WEIGHTS[column]) for column in FTS_COLUMNS)
+
+
+def _column_list(prefix=''):
+    return ', '.join(f'{prefix}{column}' for column in FTS_COLUMNS)
+
+
+def fts_statements():
+    """DDL for the FTS5 table and the triggers that keep it in sync"""
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{_column_list()}, content='{PRODUCT_TABLE}', content_rowid='{PRODUCT_PK}', prefix='2 3')",
+
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {PRODUCT_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {_column_list()}) VALUES (new.{PRODUCT_PK}, {_column_list('new.')}); "
+        f"END",
+
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {PRODUCT_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_column_list()}) "
+        f"VALUES ('delete', old.{PRODUCT_PK}, {_column_list('old.')}); "
+        f"END",
+
+        f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {_column_list()} ON {PRODUCT_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_column_list()}) "
+        f"VALUES ('delete', old.{PRODUCT_PK}, {_column_list('old.')}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {_column_list()}) VALUES (new.{PRODUCT_PK}, {_column_list('new.')}); "
+        f"END",
+    ]
+
+
+def fts5_supported(cursor):
+    """Whether the linked SQLite library was compiled with FTS5"""
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Loadable or built-in without the compile option flag; probe directly
+        cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        cursor.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def install(schema_editor=None):
+    """Create the FTS table and triggers (idempotent) and fill the table"""
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        if not fts5_supported(cursor):
+            logger.warning("SQLite FTS5 is not available; product search will use the postings backend")
+            return False
+        for statement in fts_statements():
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def match_expression(query):
+    """FTS5 MATCH string: any query word as a prefix, OR-ed together"""
+    # Terms only contain word characters, so quoting them is sufficient escaping
+    return ' OR '.join(f'"{term}"*' for term in query_terms(query))
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    name = 'sqlite_fts5'
+
+    def is_available(self):
+        return connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+
+    def filter(self, queryset, query):
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [match_expression(query)]
+        ))
+
+    def annotate_relevance(self, queryset, query):
+        # bm25() is lower-is-better, negate it so higher means more relevant
+        relevance = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {BM25_WEIGHTS}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = {PRODUCT_TABLE}.{PRODUCT_PK}",
+            [match_expression(query)],
+            output_field=FloatField()
+        )
+        return queryset.annotate(relevance_score=Coalesce(relevance, 0.0))
+
+    def rank(self, queryset, query, limit=None, after=None, with_total=True):
+        # One pass over the FTS matches among the queryset's rows, with the top
+        # k sorted by SQLite, instead of a bm25() subquery per candidate row
+        if not query_terms(query):
+            return [], 0 if with_total else None
+        try:
+            candidates, candidate_params = queryset.order_by().values('pk').query.sql_with_params()
+        except EmptyResultSet:
+            return [], 0 if with_total else None
+        matches = (
+            f"SELECT rowid AS product_id, -bm25({FTS_TABLE}, {BM25_WEIGHTS}) AS score FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({candidates})"
+        )
+        match_params = [match_expression(query), *candidate_params]
+
+        sql, params = f"SELECT product_id, score FROM ({matches})", list(match_params)
+        if after is not None:
+            score, last_id = after
+            sql += " WHERE score < %s OR (score = %s AND product_id > %s)"
+            params += [score, score, last_id]
+        sql += " ORDER BY score DESC, product_id"
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            top = [(product_id, score) for product_id, score in cursor.fetchall()]
+            total = None
+            if with_total:
+                cursor.execute(f"SELECT COUNT(*) FROM ({matches})", match_params)
+                total = cursor.fetchone()[0]
+        return top, total
+
+    def rebuild(self, stdout=None):
+        # Also reinstalls the triggers, which SQLite drops when Django remakes
+        # the product table during a vendors migration
+        install()
+        if stdout:
+            stdout.write(f'Rebuilt SQLite FTS5 table {FTS_TABLE}')
@@ -0,0 +1,314 @@
+"""
+Search benchmark and replay harness, used by the benchmark_search command.
+
+A query corpus is replayed against each search method with a configurable
+number of concurrent workers. The corpus comes from a file, or from the
+most recent search logs, or from words of the catalog's product names.
+Each query records:
+
+- its wall-clock latency;
+- the number of SQL queries it issued on its worker's connection;
+- its top result ids.
+
+The report gives latency percentiles and throughput per method, plus the
+overlap of the top results between every pair of methods.
+
+The LLM is always stubbed. The AI tag selection is replaced by the manual
+tag selection plus a fixed simulated latency. No network call is made, and
+the LLM cache is never written. Search logging is switched off, so a
+replay does not skew the analytics.
+
+A synthetic catalog can be seeded under a dedicated vendor first. It is
+created through the ORM, so the search index, tags and catalog snapshot
+are maintained by the usual signals. It is removed again afterwards
+unless it is kept.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_VENDOR = 'benchmark-synthetic'
+DEFAULT_METHODS = ('regular', 'keyword', 'tags')
+
+ADJECTIVES = [
+    'wireless', 'portable', 'compact', 'premium', 'classic', 'waterproof', 'lightweight', 'ergonomic',
+    'vintage', 'smart', 'organic', 'handmade', 'rechargeable', 'foldable', 'durable', 'slim',
+]
+MATERIALS = ['leather', 'steel', 'cotton', 'bamboo', 'ceramic', 'wool', 'glass', 'silicone', 'oak', 'golden']
+NOUNS = [
+    'headphones', 'backpack', 'watch', 'lamp', 'kettle', 'sneakers', 'jacket', 'speaker', 'mug',
+    'bracelet', 'keyboard', 'blender', 'tent', 'wallet', 'chair', 'camera', 'ring', 'scarf',
+]
+BRANDS = ['Acme', 'Northwind', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli']
+USES = ['travel', 'office', 'outdoor', 'kitchen', 'fitness', 'gaming', 'gift', 'everyday use']
+
+
+def seed_synthetic_catalog(count, seed=0, stdout=None):
+    """Create count in-stock products under the benchmark vendor; returns how many were created"""
+    from django.contrib.auth.models import User
+    from categories.models import Category
+    from vendors.models import Vendor, VendorProduct
+
+    rng = random.Random(seed)
+    user, _ = User.objects.get_or_create(username=SYNTHETIC_VENDOR)
+    # Not get_or_create: its savepoint would be rolled back by the vendor's notification signals
+    vendor = Vendor.objects.filter(user=user).first() or Vendor.objects.create(user=user, store_name=SYNTHETIC_VENDOR)
+    existing = vendor.vendor_products.count()
+    if existing >= count:
+        return 0
+
+    categories = list(Category.objects.values_list('id', flat=True)) or [None]
+    with transaction.atomic():
+        for index in range(existing, count):
+            adjective, material, noun = rng.choice(ADJECTIVES), rng.choice(MATERIALS), rng.choice(NOUNS)
+            use = rng.choice(USES)
+            brand = rng.choice(BRANDS)
+            VendorProduct(
+                vendor=vendor,
+                category_id=rng.choice(categories),
+                name=f'{adjective.title()} {material} {noun} {index}',
+                brand=brand,
+                sku=f'BENCH-{index}',
+                price=round(rng.uniform(5, 500), 2),
+                stock=rng.randint(1, 100),
+                rating=round(rng.uniform(1, 5), 2),
+                is_hot=rng.random() < 0.1,
+                description=(
+                    f'A {adjective} {noun} made of {material} by {brand}. '
+                    f'Great for {use}, {rng.choice(ADJECTIVES)} and {rng.choice(ADJECTIVES)}.'
+                ),
+                tags=f'{noun}, {material}, {adjective}, {use}',
+            ).save()
+            if stdout and (index + 1) % 500 == 0:
+                stdout.write(f'Seeded {index + 1}/{count} synthetic products')
+    return count - existing
+
+
+def remove_synthetic_catalog():
+    from django.contrib.auth.models import User
+    # Deleting the user cascades to the vendor and its products
+    User.objects.filter(username=SYNTHETIC_VENDOR).delete()
+
+
+def load_corpus(path=None, from_logs=False, limit=200, seed=0):
+    """Queries to replay, in order; duplicates are kept so caches behave as in production"""
+    if path:
+        with open(path, encoding='utf-8') as handle:
+            queries = [line.strip() for line in handle if line.strip() and not line.startswith('#')]
+        return queries[:limit] if limit else queries
+
+    if from_logs:
+        from ai_search.models import SearchLog as AISearchLog
+        from .models import SearchLog
+        logged = list(SearchLog.objects.order_by('-created_at').values_list('created_at', 'query')[:limit])
+        logged += AISearchLog.objects.order_by('-search_date').values_list('search_date', 'search_query')[:limit]
+        logged.sort()
+        queries = [query.strip() for _, query in logged[-limit:] if query.strip()]
+        if queries:
+            return queries
+
+    # Synthetic corpus: one or two words of random product names, plus brands
+    from ai_search.catalog import get_catalog_snapshot
+    rng = random.Random(seed)
+    products = get_catalog_snapshot().get()
+    queries = []
+    for _ in range(limit if products else 0):
+        product = rng.choice(products)
+        words = [word for word in product.name.lower().split() if not word.isdigit()]
+        if product.brand and rng.random() < 0.2:
+            words.append(product.brand.lower())
+        if words:
+            queries.append(' '.join(rng.sample(words, min(len(words), rng.choice((1, 2))))))
+    return queries
+
+
+@contextmanager
+def stubbed_llm(latency=0.0):
+    """Replace LLM tag selection with the manual selection after latency seconds, and mute search logging"""
+    from ai_search.gpt_service import GPTAISearchService
+
+    def select_relevant_tags_ai(service, user_query, all_tags):
+        if latency:
+            time.sleep(latency)
+        return service.select_relevant_tags_manual(user_query, all_tags)
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(GPTAISearchService, 'select_relevant_tags_ai', select_relevant_tags_ai))
+        stack.enter_context(mock.patch('search.views.log_search'))
+        stack.enter_context(mock.patch('ai_search.gpt_service.log_search'))
+        yield
+
+
+def _regular_search(query):
+    from importlib import import_module
+    from django.conf import settings
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from .views import regular_search
+
+    request = RequestFactory().get('/api/search/', {'q': query}, HTTP_HOST='localhost')
+    request.user = AnonymousUser()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    response = regular_search(request)
+    if response.status_code != 200:
+        raise RuntimeError(f"regular_search returned {response.status_code}: {response.data}")
+    return [product['id'] for product in response.data['results']]
+
+
+def _keyword_search(query):
+    from ai_search.gpt_service import gpt_ai_search_service
+    return [product['id'] for product in gpt_ai_search_service.keyword_search_fallback(query)]
+
+
+def _tag_search(query):
+    from ai_search.gpt_service import gpt_ai_search_service
+    results, _, _ = gpt_ai_search_service.tag_search(query)
+    return [product['id'] for product in results]
+
+
+def _semantic_search(query):
+    from ai_search.gpt_service import gpt_ai_search_service
+    return [product['id'] for product in gpt_ai_search_service.semantic_search(query) or []]
+
+
+METHODS = {
+    'regular': _regular_search,
+    'keyword': _keyword_search,
+    'tags': _tag_search,
+    'semantic': _semantic_search,
+}
+
+
+class Sample:
+    __slots__ = ('latency', 'db_queries', 'ids', 'error')
+
+    def __init__(self, latency, db_queries, ids, error=None):
+        self.latency = latency
+        self.db_queries = db_queries
+        self.ids = ids
+        self.error = error
+
+
+def replay(search, queries, concurrency=1, top_k=20):
+    """(samples in corpus order, wall-clock seconds) of running search over queries"""
+    samples = [None] * len(queries)
+    positions = iter(range(len(queries)))
+    positions_lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                with positions_lock:
+                    position = next(positions, None)
+                if position is None:
+                    return
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    try:
+                        ids, error = search(queries[position])[:top_k], None
+                    except Exception as e:
+                        ids, error = [], str(e)
+                    latency = time.perf_counter() - started
+                samples[position] = Sample(latency, len(captured), ids, error)
+        finally:
+            # Every worker thread has its own connection
+            connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f'benchmark-{i}') for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples, wall_seconds):
+    latencies = [sample.latency * 1000 for sample in samples if sample.error is None]
+    db_queries = [sample.db_queries for sample in samples if sample.error is None]
+    return {
+        'queries': len(samples),
+        'errors': sum(1 for sample in samples if sample.error is not None),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'qps': round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0,
+        'db_queries_mean': round(sum(db_queries) / len(db_queries), 2) if db_queries else 0.0,
+        'db_queries_max': max(db_queries, default=0),
+        'zero_results': sum(1 for sample in samples if sample.error is None and not sample.ids),
+    }
+
+
+def overlap(samples_a, samples_b):
+    """
+    Mean |A & B| / min(|A|, |B|) of the top results, over the queries that
+    both methods answered; 1.0 means the smaller list is contained in the larger
+    """
+    scores = [
+        len(set(a.ids) & set(b.ids)) / min(len(a.ids), len(b.ids))
+        for a, b in zip(samples_a, samples_b)
+        if a.ids and b.ids
+    ]
+    return {
+        'overlap': round(sum(scores) / len(scores), 3) if scores else None,
+        'compared': len(scores),
+    }
+
+
+def run_benchmark(queries, methods=DEFAULT_METHODS, concurrency=1, top_k=20, warmup=10,
+                  llm_latency=0.0, cold=False, stdout=None):
+    """Report dict: per-method summaries and pairwise overlap"""
+    from django.core.cache import cache
+    from ai_search.llm_cache import get_llm_cache
+
+    report = {
+        'corpus_size': len(queries),
+        'concurrency': concurrency,
+        'top_k': top_k,
+        'llm_latency_ms': round(llm_latency * 1000, 1),
+        'methods': {},
+        'overlap': {},
+    }
+    samples = {}
+    with stubbed_llm(llm_latency):
+        for method in methods:
+            search = METHODS[method]
+            if cold:
+                cache.clear()
+                get_llm_cache().clear_local()
+            # Builds the snapshot, matrices and backend state the first query would otherwise pay for
+            for query in queries[:warmup]:
+                try:
+                    search(query)
+                except Exception:
+                    pass
+            samples[method], wall_seconds = replay(search, queries, concurrency, top_k)
+            report['methods'][method] = summarize(samples[method], wall_seconds)
+            errors = [sample.error for sample in samples[method] if sample.error]
+            if errors:
+                logger.warning(f"Benchmark method '{method}' failed {len(errors)} queries, first: {errors[0]}")
+            if stdout:
+                stdout.write(f"Ran {method}: {report['methods'][method]['qps']} queries/s")
+
+    for index, first in enumerate(methods):
+        for second in methods[index + 1:]:
+            report['overlap'][f'{first}/{second}'] = overlap(samples[first], samples[second])
+    return report
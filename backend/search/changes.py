@@ -0,0 +1,110 @@
+"""
+Shared log of product changes for the per-process in-memory indexes.
+
+The AI catalog snapshot, the product term matrix, the typeahead trie and the
+fuzzy trigram index live in each worker's memory. Patching them from the
+signals of a save only reached the worker that handled the save; the others
+kept serving old rows until their periodic rebuild. Signals now append the
+ids of changed products to ProductChange after commit. Every index holds a
+ChangeCursor on that log and, before it serves a read, patches itself with
+the entries past its position (one indexed query). An entry without a
+product asks every reader for a full rebuild.
+
+An id is allocated at insert but only visible at commit, so a reader can
+see id 12 while id 11 is still in flight. Skipped ids are looked up again
+for PRODUCT_CHANGE_LAG_SECONDS before the cursor gives up on them (a
+rolled back insert leaves a permanent gap). Entries older than
+PRODUCT_CHANGE_RETENTION are deleted; a cursor that has not read the log
+for that long reports a rebuild instead.
+"""
+import time
+from datetime import timedelta
+from django.db.models import Max, Q
+from django.utils import timezone
+
+PRODUCT_CHANGE_LAG_SECONDS = 60
+PRODUCT_CHANGE_RETENTION = 3600  # Longer than every index's rebuild interval
+MAX_TRACKED_GAP = 1000  # A sequence jump beyond this is not an in-flight transaction
+
+
+def record_product_changes(product_ids):
+    """Append changed products to the log; call after commit"""
+    from .models import ProductChange
+
+    ProductChange.objects.bulk_create(
+        [ProductChange(product_id=product_id) for product_id in set(product_ids)], batch_size=1000
+    )
+
+
+def request_index_rebuild():
+    """Ask every process to rebuild its indexes, e.g. after a category rename; call after commit"""
+    from .models import ProductChange
+
+    ProductChange.objects.create(product_id=None)
+
+
+class ChangeCursor:
+    """A reader's position in the product change log"""
+
+    def __init__(self):
+        self.last_id = None
+        self.pending = {}  # Skipped id -> monotonic time it was first missed
+        self.read_at = None
+
+    def start(self):
+        """Position the cursor at the end of the log, before a full build reads the catalog"""
+        from .models import ProductChange
+
+        now = timezone.now()
+        ProductChange.objects.filter(created_at__lt=now - timedelta(seconds=PRODUCT_CHANGE_RETENTION)).delete()
+        recent = ProductChange.objects.filter(created_at__gte=now - timedelta(seconds=PRODUCT_CHANGE_LAG_SECONDS))
+        recent_ids = set(recent.values_list('id', flat=True))
+        floor = ProductChange.objects.filter(
+            created_at__lt=now - timedelta(seconds=PRODUCT_CHANGE_LAG_SECONDS)
+        ).aggregate(last_id=Max('id'))['last_id'] or 0
+        self.last_id = max(recent_ids, default=floor)
+        # Recent ids missing from the log may belong to inserts still in flight
+        missed_at = time.monotonic()
+        self.pending = {
+            change_id: missed_at
+            for change_id in range(max(floor + 1, self.last_id - MAX_TRACKED_GAP), self.last_id)
+            if change_id not in recent_ids
+        }
+        self.read_at = missed_at
+
+    def reset(self):
+        """Forget the position, so the next read() asks for a rebuild"""
+        self.last_id = None
+
+    def read(self):
+        """(ids of products changed since the last read, whether a full rebuild is needed)"""
+        from .models import ProductChange
+
+        now = time.monotonic()
+        if self.last_id is None or now - self.read_at > PRODUCT_CHANGE_RETENTION - PRODUCT_CHANGE_LAG_SECONDS:
+            # Never started, or entries it has not seen may have been deleted
+            return set(), True
+        self.read_at = now
+
+        condition = Q(id__gt=self.last_id)
+        if self.pending:
+            condition |= Q(id__in=list(self.pending))
+        rows = list(ProductChange.objects.filter(condition).order_by('id').values_list('id', 'product_id'))
+
+        product_ids, rebuild = set(), False
+        previous = self.last_id
+        for change_id, product_id in rows:
+            if product_id is None:
+                rebuild = True
+            else:
+                product_ids.add(product_id)
+            if self.pending.pop(change_id, None) is None:
+                for skipped in range(max(previous + 1, change_id - MAX_TRACKED_GAP), change_id):
+                    self.pending[skipped] = now
+                previous = change_id
+        self.last_id = previous
+        self.pending = {
+            change_id: missed_at for change_id, missed_at in self.pending.items()
+            if now - missed_at < PRODUCT_CHANGE_LAG_SECONDS
+        }
+        return product_ids, rebuild
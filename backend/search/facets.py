@@ -0,0 +1,120 @@
+"""
+Facet counts for search results and product listings.
+
+All facets come from one grouped aggregation over the filtered product
+queryset. The query groups by (category, brand, vendor, price bucket, in
+stock) and counts each combination. The per-facet counts are then folded
+together in Python, so the cost does not grow with the number of facet
+values. Category counts are rolled up the category tree from one query of
+(id, name, parent) rows, so a parent category counts the products of all
+its descendants.
+
+Counts are conjunctive: they describe the current result set, including
+any filter on the facet itself.
+"""
+from collections import Counter
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+# Lower bounds of the price histogram buckets; the last bucket is open-ended
+DEFAULT_PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000)
+MAX_FACET_VALUES = 50
+
+
+def wants_facets(request):
+    return request.GET.get('facets', '').lower() in ('1', 'true', 'yes')
+
+
+def price_bucket_bounds():
+    return sorted(getattr(settings, 'FACET_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+
+
+def _price_bucket_expression(bounds):
+    # Highest bound first, so the first matching When is the product's bucket
+    return Case(
+        *[When(price__gte=bound, then=Value(index)) for index, bound in reversed(list(enumerate(bounds)))],
+        default=Value(-1),
+        output_field=IntegerField()
+    )
+
+
+def compute_facets(queryset):
+    """Category, brand, vendor, price and stock counts of the queryset's products"""
+    from categories.models import Category
+
+    bounds = price_bucket_bounds()
+    groups = queryset.order_by().annotate(
+        price_bucket=_price_bucket_expression(bounds),
+        in_stock=Case(When(Q(stock__gt=0), then=Value(1)), default=Value(0), output_field=IntegerField()),
+    ).values(
+        'category_id', 'brand', 'vendor_id', 'vendor__store_name', 'price_bucket', 'in_stock'
+    ).annotate(count=Count('id'))
+
+    categories = Counter()
+    brands = Counter()
+    vendors = Counter()
+    vendor_names = {}
+    prices = Counter()
+    stock = Counter()
+    total = 0
+    for group in groups:
+        count = group['count']
+        total += count
+        if group['category_id'] is not None:
+            categories[group['category_id']] += count
+        if group['brand']:
+            brands[group['brand']] += count
+        vendors[group['vendor_id']] += count
+        vendor_names[group['vendor_id']] = group['vendor__store_name']
+        prices[group['price_bucket']] += count
+        stock[group['in_stock']] += count
+
+    return {
+        'total': total,
+        'categories': _category_facet(categories, Category.objects.values_list('id', 'name', 'parent_category_id')),
+        'brands': [
+            {'value': brand, 'count': count}
+            for brand, count in sorted(brands.items(), key=lambda item: (-item[1], item[0].lower()))[:MAX_FACET_VALUES]
+        ],
+        'vendors': [
+            {'id': vendor_id, 'name': vendor_names[vendor_id], 'count': count}
+            for vendor_id, count in sorted(vendors.items(), key=lambda item: (-item[1], item[0]))[:MAX_FACET_VALUES]
+        ],
+        'price': [
+            {
+                'min': bound,
+                'max': bounds[index + 1] if index + 1 < len(bounds) else None,
+                'count': prices[index],
+            }
+            for index, bound in enumerate(bounds)
+        ],
+        'stock': {'in_stock': stock[1], 'out_of_stock': stock[0]},
+    }
+
+
+def _category_facet(direct_counts, category_rows):
+    """Counts rolled up to every ancestor, for categories with products, largest first"""
+    names = {}
+    parents = {}
+    for category_id, name, parent_id in category_rows:
+        names[category_id] = name
+        parents[category_id] = parent_id
+
+    rolled_up = Counter()
+    for category_id, count in direct_counts.items():
+        seen = set()
+        while category_id is not None and category_id not in seen:
+            seen.add(category_id)
+            rolled_up[category_id] += count
+            category_id = parents.get(category_id)
+
+    return [
+        {
+            'id': category_id,
+            'name': names.get(category_id, ''),
+            'parent': parents.get(category_id),
+            'count': count,
+            'direct_count': direct_counts.get(category_id, 0),
+        }
+        for category_id, count in sorted(rolled_up.items(), key=lambda item: (-item[1], names.get(item[0], '')))
+    ]
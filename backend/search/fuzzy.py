@@ -0,0 +1,292 @@
+"""
+Typo-tolerant product matching on character trigrams.
+
+Exact search only matches whole terms and prefixes, so "iphnoe" or
+"sneekers" find nothing. When an exact search yields fewer than
+FUZZY_SEARCH_MIN_RESULTS products, its results are topped up with products
+whose name, brand or category name contains a word similar to a query word.
+The common path never pays for a fuzzy scan.
+
+Words are compared like pg_trgm's word_similarity. A word is padded with two
+spaces in front and one behind and split into trigrams. Its similarity to a
+query word is the share of the query word's trigrams that it contains.
+Words at or above FUZZY_SEARCH_THRESHOLD match.
+
+On PostgreSQL with the pg_trgm extension, matching runs in the database on
+GIN trigram indexes (see install_trigram_indexes). Elsewhere a per-process
+trigram index is used. It maps every trigram to the words containing it,
+and every word to the in-stock products using it. The product changes made
+by any process are read from the shared change log (search.changes) on
+every lookup and patched in place. The index is rebuilt every
+FUZZY_INDEX_REBUILD_INTERVAL seconds and when a rebuild is logged (a
+renamed category).
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db import connection, transaction
+
+from .changes import ChangeCursor
+from .indexing import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Matches in these fields count this much of the word's similarity
+FIELD_WEIGHTS = {'name': 1.0, 'brand': 0.8, 'category': 0.6}
+MAX_RESULTS = 50
+INCREMENTAL_MAX_PRODUCTS = 500  # More changed products than this are cheaper to rebuild
+
+PRODUCT_TABLE = 'vendors_vendorproduct'
+CATEGORY_TABLE = 'categories_category'
+TRIGRAM_INDEXES = (
+    ('search_product_name_trgm', PRODUCT_TABLE, 'name'),
+    ('search_product_brand_trgm', PRODUCT_TABLE, 'brand'),
+    ('search_category_name_trgm', CATEGORY_TABLE, 'name'),
+)
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def fuzzy_threshold():
+    return getattr(settings, 'FUZZY_SEARCH_THRESHOLD', 0.4)
+
+
+def fuzzy_minimum():
+    return getattr(settings, 'FUZZY_SEARCH_MIN_RESULTS', 5)
+
+
+def _listed_products(product_ids=None):
+    """(id, name, brand, category name) of the in-stock products, all or among product_ids"""
+    from vendors.models import VendorProduct
+
+    products = VendorProduct.objects.filter(stock__gt=0)
+    if product_ids is not None:
+        products = products.filter(id__in=list(product_ids))
+    return products.values_list('id', 'name', 'brand', 'category__name')
+
+
+class TrigramIndex:
+    """trigram -> word ids -> {product id: best field weight}"""
+
+    def __init__(self):
+        self.word_ids = {}
+        self.word_products = []   # word id -> {product id: field weight}
+        self.trigram_words = {}   # trigram -> set of word ids
+        self.product_words = {}   # product id -> word ids it contributes to
+        self.built_at = None
+        self._lock = threading.RLock()
+
+    def build(self):
+        with self._lock:
+            for product_id, name, brand, category in _listed_products().iterator(chunk_size=2000):
+                self._add_product(product_id, name, brand, category)
+            self.built_at = time.monotonic()
+        logger.info(f"Fuzzy trigram index built with {len(self.word_ids)} words")
+
+    def match(self, query, limit=MAX_RESULTS, threshold=None):
+        """[(product id, score)] best first; a product scores the sum of its best match per query word"""
+        threshold = fuzzy_threshold() if threshold is None else threshold
+        scores = Counter()
+        with self._lock:
+            for term in set(tokenize(query)):
+                grams = trigrams(term)
+                shared = Counter()
+                for gram in grams:
+                    shared.update(self.trigram_words.get(gram, ()))
+                best = {}
+                for word_id, count in shared.items():
+                    similarity = count / len(grams)
+                    if similarity < threshold:
+                        continue
+                    for product_id, weight in self.word_products[word_id].items():
+                        if similarity * weight > best.get(product_id, 0.0):
+                            best[product_id] = similarity * weight
+                scores.update(best)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def apply_changes(self, product_ids):
+        """Re-read the given products; deleted and out of stock ones are removed"""
+        rows = {row[0]: row for row in _listed_products(product_ids)}
+        with self._lock:
+            for product_id in product_ids:
+                self._remove_product(product_id)
+                if product_id in rows:
+                    self._add_product(*rows[product_id])
+
+    def _add_product(self, product_id, name, brand, category):
+        words = set()
+        for field, text in (('name', name), ('brand', brand), ('category', category)):
+            for word in tokenize(text):
+                word_id = self._word_id(word)
+                products = self.word_products[word_id]
+                products[product_id] = max(products.get(product_id, 0.0), FIELD_WEIGHTS[field])
+                words.add(word_id)
+        self.product_words[product_id] = words
+
+    def _remove_product(self, product_id):
+        # Words left without products stay in the vocabulary until the next rebuild
+        for word_id in self.product_words.pop(product_id, ()):
+            self.word_products[word_id].pop(product_id, None)
+
+    def _word_id(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.word_products)
+            self.word_products.append({})
+            for gram in trigrams(word):
+                self.trigram_words.setdefault(gram, set()).add(word_id)
+        return word_id
+
+
+class PostgresTrigramMatcher:
+    """The same matching with pg_trgm's word_similarity on GIN trigram indexes"""
+
+    def match(self, query, limit=MAX_RESULTS, threshold=None):
+        threshold = fuzzy_threshold() if threshold is None else threshold
+        terms = list(set(tokenize(query)))
+        if not terms:
+            return []
+        per_term = ' + '.join(
+            f"GREATEST(word_similarity(%s, p.name) * {FIELD_WEIGHTS['name']}, "
+            f"word_similarity(%s, p.brand) * {FIELD_WEIGHTS['brand']}, "
+            f"coalesce(word_similarity(%s, c.name), 0) * {FIELD_WEIGHTS['category']})"
+            for _ in terms
+        )
+        # <% is true when the word similarity reaches pg_trgm.word_similarity_threshold
+        matches = ' OR '.join('%s <%% p.name OR %s <%% p.brand OR %s <%% c.name' for _ in terms)
+        params = [term for term in terms for _ in range(3)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(threshold)])
+            cursor.execute(
+                f"SELECT p.id, {per_term} AS score FROM {PRODUCT_TABLE} p "
+                f"LEFT JOIN {CATEGORY_TABLE} c ON c.id = p.category_id "
+                f"WHERE p.stock > 0 AND ({matches}) ORDER BY score DESC, p.id LIMIT %s",
+                params + params + [limit]
+            )
+            return [(product_id, float(score)) for product_id, score in cursor.fetchall()]
+
+
+def install_trigram_indexes(schema_editor=None):
+    """Enable pg_trgm and index the matched columns; False when the extension cannot be created"""
+    conn = schema_editor.connection if schema_editor else connection
+    try:
+        with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        logger.warning(f"pg_trgm is not available, fuzzy search will use the in-process index: {e}")
+        return False
+    with conn.cursor() as cursor:
+        for index, table, column in TRIGRAM_INDEXES:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN ({column} gin_trgm_ops)")
+    return True
+
+
+def uninstall_trigram_indexes(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        for index, table, column in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+_pg_trgm_available = None
+
+
+def _postgres_trigram_available():
+    global _pg_trgm_available
+    if _pg_trgm_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _pg_trgm_available = cursor.fetchone() is not None
+    return _pg_trgm_available
+
+
+_index = None
+_index_lock = threading.Lock()
+_changes = ChangeCursor()
+
+
+def get_fuzzy_index():
+    """
+    The process-wide trigram index with the product changes logged by any
+    process applied, (re)built when missing, asked for or older than the
+    rebuild interval
+    """
+    global _index
+    interval = getattr(settings, 'FUZZY_INDEX_REBUILD_INTERVAL', 600)
+    with _index_lock:
+        product_ids, rebuild = _changes.read()
+        if (
+            _index is None or rebuild or time.monotonic() - _index.built_at > interval
+            or len(product_ids) > INCREMENTAL_MAX_PRODUCTS
+        ):
+            _changes.start()
+            fresh = TrigramIndex()
+            fresh.build()
+            _index = fresh
+        elif product_ids:
+            try:
+                _index.apply_changes(product_ids)
+            except Exception:
+                # The cursor has moved past these changes; rebuild on the next read
+                _changes.reset()
+                raise
+        return _index
+
+
+def get_fuzzy_matcher():
+    if connection.vendor == 'postgresql' and _postgres_trigram_available():
+        return PostgresTrigramMatcher()
+    return get_fuzzy_index()
+
+
+def fuzzy_rank(queryset, query, limit=MAX_RESULTS):
+    """Typo-tolerant (product id, score) matches among the queryset, best first"""
+    # Over-fetch, the queryset's own filters drop some of the matches
+    candidates = get_fuzzy_matcher().match(query, limit * 4)
+    if not candidates:
+        return []
+    allowed = set(queryset.filter(id__in=[product_id for product_id, score in candidates]).values_list('id', flat=True))
+    return [(product_id, score) for product_id, score in candidates if product_id in allowed][:limit]
+
+
+def with_fuzzy_matches(queryset, query, ranked):
+    """
+    ranked, the queryset's complete exact (product id, score) matches best
+    first, followed by its fuzzy matches when there are too few of them
+    """
+    if len(ranked) >= fuzzy_minimum():
+        return ranked
+    exact = {product_id for product_id, score in ranked}
+    fuzzy = [(product_id, score) for product_id, score in fuzzy_rank(queryset, query) if product_id not in exact]
+    if fuzzy:
+        logger.debug(f"Fuzzy search added {len(fuzzy)} matches for '{query}'")
+    return list(ranked) + fuzzy
+
+
+def widen_with_fuzzy_matches(queryset, matched, query):
+    """
+    matched (the queryset's exact matches for query) unchanged when it has
+    enough products, otherwise the queryset restricted to the exact and fuzzy
+    matches. Exact matches keep a higher relevance_score than fuzzy ones.
+    """
+    from django.db.models import Case, FloatField, Value, When
+
+    exact_ids = list(matched.order_by().values_list('id', flat=True)[:fuzzy_minimum()])
+    ranked = with_fuzzy_matches(queryset, query, [(product_id, 0.0) for product_id in exact_ids])
+    if len(ranked) == len(exact_ids):
+        return matched
+    fuzzy = ranked[len(exact_ids):]
+    exact_score = 1.0 + max(score for product_id, score in fuzzy)
+    return queryset.filter(id__in=[product_id for product_id, score in ranked]).annotate(
+        relevance_score=Case(
+            *[When(id=product_id, then=Value(score)) for product_id, score in fuzzy],
+            default=Value(exact_score),
+            output_field=FloatField()
+        )
+    )
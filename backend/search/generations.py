@@ -0,0 +1,51 @@
+"""
+Generation counters of cached catalog data, kept in the database.
+
+Cached search and listing pages, the ETags of catalog reads and every
+process's in-memory category tree are tagged with a generation, which
+signals bump after each relevant commit. Every worker must see the bump.
+In django.core.cache the counters would only be shared if CACHES points at a
+shared backend: with the default per-process LocMemCache, a write would only
+move the counter of the worker that handled it. The others would go on
+serving stale pages and answering 304s. Reading a counter is one primary key
+lookup, small next to the work it lets a request skip.
+"""
+import time
+from django.db.models import F
+from django.utils import timezone
+
+
+def _initial_generation():
+    # Seeded from the clock, so a lost row never restarts below a generation
+    # that cached entries are still tagged with
+    return int(time.time() * 1000)
+
+
+def get_generation(name):
+    """(generation, timestamp of the latest bump or None) of a named counter"""
+    from .models import CacheGeneration
+
+    counters = CacheGeneration.objects.filter(name=name).values_list('generation', 'modified_at')
+    row = counters.first()
+    if row is None:
+        CacheGeneration.objects.bulk_create(
+            [CacheGeneration(name=name, generation=_initial_generation())], ignore_conflicts=True
+        )
+        row = counters.first()
+    generation, modified_at = row
+    return generation, modified_at.timestamp() if modified_at else None
+
+
+def bump_generation(name):
+    """Move a counter on, for every process at once"""
+    from .models import CacheGeneration
+
+    changes = {'generation': F('generation') + 1, 'modified_at': timezone.now()}
+    counters = CacheGeneration.objects.filter(name=name)
+    if counters.update(**changes):
+        return
+    # A concurrent first bump may create the row in between; the update then moves it on
+    CacheGeneration.objects.bulk_create(
+        [CacheGeneration(name=name, generation=_initial_generation())], ignore_conflicts=True
+    )
+    counters.update(**changes)
@@ -0,0 +1,283 @@
+"""
+Inverted index over VendorProduct text fields.
+
+Every product is tokenized into terms; each term keeps a posting list of the
+products containing it together with per-field term frequencies. Search
+resolves candidates from postings instead of running LIKE scans over the
+product table.
+"""
+import re
+import logging
+from collections import Counter
+from django.db import transaction
+from django.db.models import F, Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from vendors.models import VendorProduct
+from .models import SearchTerm, SearchDocument, SearchPosting
+
+logger = logging.getLogger(__name__)
+
+# Field weights, highest priority first (same order as the old relevance Case/When)
+FIELD_WEIGHTS = {
+    'name': 10.0,
+    'brand': 7.0,
+    'tags': 6.0,
+    'description': 3.0,
+}
+INDEXED_FIELDS = tuple(FIELD_WEIGHTS)
+
+MIN_TERM_LENGTH = 3  # Words of 2 characters or less were never searchable
+MAX_TERM_LENGTH = 64
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase index terms"""
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) >= MIN_TERM_LENGTH
+    ]
+
+
+def analyze_product(product):
+    """Return ({term: {field: tf}}, {field: length}) for a product"""
+    term_fields = {}
+    lengths = {}
+    for field in INDEXED_FIELDS:
+        tokens = tokenize(getattr(product, field, '') or '')
+        lengths[field] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            term_fields.setdefault(term, {})[field] = tf
+    return term_fields, lengths
+
+
+def _posting_values(fields):
+    """Column values of a posting from its per-field frequencies"""
+    values = {f'{field}_tf': fields.get(field, 0) for field in INDEXED_FIELDS}
+    values['weight'] = sum(FIELD_WEIGHTS[field] * tf for field, tf in fields.items())
+    return values
+
+
+def _get_term_ids(terms):
+    """Map terms to SearchTerm ids, creating missing vocabulary entries"""
+    terms = set(terms)
+    if not terms:
+        return {}
+    term_ids = _lookup_term_ids(terms)
+    missing = terms - term_ids.keys()
+    if missing:
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term) for term in missing],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        term_ids.update(_lookup_term_ids(missing))
+    return term_ids
+
+
+def _lookup_term_ids(terms, batch_size=500):
+    term_ids = {}
+    terms = list(terms)
+    for start in range(0, len(terms), batch_size):  # Stay under the SQL parameter limit
+        term_ids.update(SearchTerm.objects.filter(term__in=terms[start:start + batch_size]).values_list('term', 'id'))
+    return term_ids
+
+
+@transaction.atomic
+def index_product(product):
+    """Bring the postings of one product in sync with its current text"""
+    term_fields, lengths = analyze_product(product)
+
+    existing = {
+        posting.term.term: posting
+        for posting in SearchPosting.objects.filter(product_id=product.pk).select_related('term')
+    }
+
+    removed_term_ids = [posting.term_id for term, posting in existing.items() if term not in term_fields]
+    if removed_term_ids:
+        SearchPosting.objects.filter(product_id=product.pk, term_id__in=removed_term_ids).delete()
+        SearchTerm.objects.filter(id__in=removed_term_ids).update(
+            document_frequency=F('document_frequency') - 1
+        )
+
+    changed = []
+    for term, fields in term_fields.items():
+        posting = existing.get(term)
+        if posting is None:
+            continue
+        values = _posting_values(fields)
+        if any(getattr(posting, column) != value for column, value in values.items()):
+            for column, value in values.items():
+                setattr(posting, column, value)
+            changed.append(posting)
+    if changed:
+        SearchPosting.objects.bulk_update(changed, list(_posting_values({})))
+
+    new_terms = [term for term in term_fields if term not in existing]
+    if new_terms:
+        term_ids = _get_term_ids(new_terms)
+        SearchPosting.objects.bulk_create([
+            SearchPosting(product_id=product.pk, term_id=term_ids[term], **_posting_values(term_fields[term]))
+            for term in new_terms
+        ])
+        SearchTerm.objects.filter(id__in=[term_ids[term] for term in new_terms]).update(
+            document_frequency=F('document_frequency') + 1
+        )
+
+    SearchDocument.objects.update_or_create(
+        product_id=product.pk,
+        defaults={f'{field}_length': length for field, length in lengths.items()}
+    )
+
+
+@transaction.atomic
+def remove_product(product_id):
+    """Drop a product from the index"""
+    term_ids = list(SearchPosting.objects.filter(product_id=product_id).values_list('term_id', flat=True))
+    if term_ids:
+        SearchTerm.objects.filter(id__in=term_ids).update(
+            document_frequency=F('document_frequency') - 1
+        )
+        SearchPosting.objects.filter(product_id=product_id).delete()
+    SearchDocument.objects.filter(product_id=product_id).delete()
+
+
+@transaction.atomic
+def reindex_products(products, batch_size=500):
+    """
+    Rewrite the postings of many products at once, after bulk writes that
+    sent no post_save. Document frequencies move by their net change.
+    """
+    products = list(products)
+    frequency_changes = Counter()
+    for start in range(0, len(products), batch_size):
+        batch = products[start:start + batch_size]
+        product_ids = [product.pk for product in batch]
+        postings = SearchPosting.objects.filter(product_id__in=product_ids)
+        frequency_changes.subtract(postings.values_list('term_id', flat=True))
+        postings.delete()
+        SearchDocument.objects.filter(product_id__in=product_ids).delete()
+
+        analyzed = [(product, *analyze_product(product)) for product in batch]
+        term_ids = _get_term_ids({term for _, term_fields, _ in analyzed for term in term_fields})
+        new_postings = []
+        documents = []
+        for product, term_fields, lengths in analyzed:
+            for term, fields in term_fields.items():
+                new_postings.append(
+                    SearchPosting(product_id=product.pk, term_id=term_ids[term], **_posting_values(fields))
+                )
+                frequency_changes[term_ids[term]] += 1
+            documents.append(SearchDocument(
+                product_id=product.pk,
+                **{f'{field}_length': length for field, length in lengths.items()}
+            ))
+        SearchPosting.objects.bulk_create(new_postings, batch_size=1000)
+        SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+    # One UPDATE per distinct change instead of one per term
+    terms_by_change = {}
+    for term_id, change in frequency_changes.items():
+        if change:
+            terms_by_change.setdefault(change, []).append(term_id)
+    for change, term_ids in terms_by_change.items():
+        for start in range(0, len(term_ids), batch_size):
+            SearchTerm.objects.filter(id__in=term_ids[start:start + batch_size]).update(
+                document_frequency=F('document_frequency') + change
+            )
+    return len(products)
+
+
+def rebuild_index(batch_size=500, stdout=None):
+    """Rebuild the whole index from VendorProduct rows, returns the product count"""
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        SearchTerm.objects.all().delete()
+
+        term_ids = {}
+        indexed = 0
+        products = VendorProduct.objects.only('id', *INDEXED_FIELDS).order_by('id')
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                indexed += _index_batch(batch, term_ids)
+                batch = []
+                if stdout:
+                    stdout.write(f'Indexed {indexed} products...')
+        if batch:
+            indexed += _index_batch(batch, term_ids)
+
+        # Document frequencies in one pass instead of per-posting increments
+        SearchTerm.objects.update(document_frequency=Coalesce(Subquery(
+            SearchPosting.objects.filter(term_id=OuterRef('pk'))
+            .values('term_id').annotate(df=Count('id')).values('df')
+        ), 0))
+
+    logger.info(f"Search index rebuilt: {indexed} products, {len(term_ids)} terms")
+    return indexed
+
+
+def _index_batch(products, term_ids):
+    """Bulk-insert postings and documents for a batch of products"""
+    analyzed = [(product, *analyze_product(product)) for product in products]
+
+    new_terms = {term for _, term_fields, _ in analyzed for term in term_fields if term not in term_ids}
+    if new_terms:
+        SearchTerm.objects.bulk_create([SearchTerm(term=term) for term in new_terms], batch_size=1000)
+        new_terms = list(new_terms)
+        for start in range(0, len(new_terms), 500):  # Stay under the SQL parameter limit
+            chunk = new_terms[start:start + 500]
+            term_ids.update(SearchTerm.objects.filter(term__in=chunk).values_list('term', 'id'))
+
+    postings = []
+    documents = []
+    for product, term_fields, lengths in analyzed:
+        postings.extend(
+            SearchPosting(product_id=product.pk, term_id=term_ids[term], **_posting_values(fields))
+            for term, fields in term_fields.items()
+        )
+        documents.append(SearchDocument(
+            product_id=product.pk,
+            **{f'{field}_length': length for field, length in lengths.items()}
+        ))
+    SearchPosting.objects.bulk_create(postings, batch_size=1000)
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+    return len(products)
+
+
+def query_terms(query):
+    """Distinct index terms of a search query, in query order"""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def term_prefix_filter(terms, field='term__term'):
+    """
+    Q matching vocabulary terms that start with any of the given words.
+
+    Written as a range (term >= word AND term < word + U+FFFF) so the unique
+    index on SearchTerm.term is used on every database, unlike LIKE 'word%'.
+    """
+    condition = Q()
+    for term in terms:
+        condition |= Q(**{f'{field}__gte': term, f'{field}__lt': term + '\uffff'})
+    return condition
+
+
+def matching_postings(query):
+    """Postings of all products matching any word of the query"""
+    terms = query_terms(query)
+    if not terms:
+        return SearchPosting.objects.none()
+    return SearchPosting.objects.filter(term_prefix_filter(terms))
+
+
+def candidate_product_ids(query):
+    """Subquery of product ids matching the query, for use in id__in filters"""
+    return matching_postings(query).values('product_id')
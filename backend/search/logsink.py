@@ -0,0 +1,179 @@
+"""
+Buffered, asynchronous writer for search log rows.
+
+Search views used to INSERT a log row on every request, which puts write
+contention on the read path (and on SQLite blocks readers). Log rows are
+now queued in-process and written by a background thread with bulk_create,
+either when a batch fills up or when the flush interval elapses. Pending
+rows are flushed at interpreter exit. When the queue is full new events
+are dropped and counted instead of blocking the request.
+
+Rows are stamped when they are queued, so log models must default their
+timestamp to timezone.now; auto_now_add would take the flush time.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class SearchLogSink:
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None, asynchronous=None):
+        self.batch_size = batch_size or getattr(settings, 'SEARCH_LOG_BATCH_SIZE', 200)
+        self.flush_interval = flush_interval or getattr(settings, 'SEARCH_LOG_FLUSH_INTERVAL', 2.0)
+        self.max_queue = max_queue or getattr(settings, 'SEARCH_LOG_MAX_QUEUE', 10000)
+        if asynchronous is None:
+            asynchronous = getattr(settings, 'SEARCH_LOG_ASYNC', True)
+        self.asynchronous = asynchronous
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0  # Rejected because the queue was full
+        self.failed = 0   # Lost because their bulk insert raised
+
+    def log(self, model, **fields):
+        """Queue one log row; returns False if it had to be dropped"""
+        # Built now so its timestamp default records the request, not the flush
+        instance = model(**fields)
+        if not self.asynchronous:
+            self._write([instance])
+            return True
+
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(instance)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Search log queue full, {self.dropped} events dropped so far")
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the worker and flush pending rows"""
+        self._stop.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'asynchronous': self.asynchronous,
+                'pending': self._queue.qsize(),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != pid:
+                # Forked worker process: the parent's queue and thread are not ours
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._stop = threading.Event()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='search-log-sink', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def _drain(self, limit, timeout=None):
+        """Take up to limit queued rows, waiting up to timeout for the first one"""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+        except queue.Empty:
+            return batch
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            batch = []
+            # Collect until the batch is full or the flush interval elapses
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.extend(self._drain(self.batch_size - len(batch), timeout=remaining))
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        by_model = {}
+        for instance in batch:
+            by_model.setdefault(type(instance), []).append(instance)
+
+        in_worker = threading.current_thread() is self._thread
+        if in_worker:
+            close_old_connections()
+        for model, instances in by_model.items():
+            try:
+                model.objects.bulk_create(instances, batch_size=self.batch_size)
+            except Exception as e:
+                logger.error(f"Failed to write {len(instances)} {model.__name__} rows: {str(e)}")
+                with self._lock:
+                    self.failed += len(instances)
+            else:
+                with self._lock:
+                    self.written += len(instances)
+        if in_worker:
+            # The worker holds no request, so release its connection between batches
+            close_old_connections()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_search_log_sink():
+    """The process-wide log sink"""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = SearchLogSink()
+    return _sink
+
+
+def log_search(model, **fields):
+    """Queue a search log row of the given model (search or ai_search SearchLog)"""
+    return get_search_log_sink().log(model, **fields)
@@ -0,0 +1,146 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from search.benchmark import (
+    DEFAULT_METHODS, METHODS, load_corpus, remove_synthetic_catalog, run_benchmark, seed_synthetic_catalog,
+)
+
+
+class Command(BaseCommand):
+    help = 'Replay a query corpus against the search methods with a stubbed LLM and report latency, throughput, DB queries and result overlap'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            type=str,
+            default=None,
+            help='File with one query per line (default: the search logs, or queries drawn from product names)'
+        )
+        parser.add_argument(
+            '--from-logs',
+            action='store_true',
+            help='Replay the most recent queries of search.SearchLog and ai_search.SearchLog'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=200,
+            help='Number of queries to replay (default: 200)'
+        )
+        parser.add_argument(
+            '--methods',
+            type=str,
+            default=','.join(DEFAULT_METHODS),
+            help=f"Comma-separated methods among {', '.join(METHODS)} (default: {','.join(DEFAULT_METHODS)})"
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Concurrent workers per method (default: 1)'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=20,
+            help='Results compared between methods (default: 20)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help='Queries run unmeasured before each method (default: 10)'
+        )
+        parser.add_argument(
+            '--llm-latency',
+            type=float,
+            default=0.0,
+            help='Simulated latency of the stubbed LLM in milliseconds (default: 0)'
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Clear the result and LLM caches before each method'
+        )
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Seed this many synthetic products before the run'
+        )
+        parser.add_argument(
+            '--keep-synthetic',
+            action='store_true',
+            help='Keep the synthetic products after the run (later runs reuse them)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed of the synthetic catalog and corpus (default: 0)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Also write the report as JSON to this file, to compare runs'
+        )
+
+    def handle(self, *args, **options):
+        methods = [method.strip() for method in options['methods'].split(',') if method.strip()]
+        unknown = [method for method in methods if method not in METHODS]
+        if unknown or not methods:
+            raise CommandError(f"Unknown methods: {', '.join(unknown) or '(none)'}; choose from {', '.join(METHODS)}")
+
+        if options['synthetic']:
+            created = seed_synthetic_catalog(options['synthetic'], seed=options['seed'], stdout=self.stdout)
+            self.stdout.write(f'Seeded {created} synthetic products')
+
+        try:
+            queries = load_corpus(
+                path=options['queries'],
+                from_logs=options['from_logs'],
+                limit=options['limit'],
+                seed=options['seed']
+            )
+            if not queries:
+                raise CommandError('The query corpus is empty')
+            self.stdout.write(
+                f"Replaying {len(queries)} queries against {', '.join(methods)} "
+                f"with {options['concurrency']} workers..."
+            )
+            report = run_benchmark(
+                queries,
+                methods=methods,
+                concurrency=options['concurrency'],
+                top_k=options['top_k'],
+                warmup=options['warmup'],
+                llm_latency=options['llm_latency'] / 1000,
+                cold=options['cold'],
+                stdout=self.stdout
+            )
+        finally:
+            if options['synthetic'] and not options['keep_synthetic']:
+                remove_synthetic_catalog()
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def print_report(self, report):
+        header = f"{'method':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'qps':>9}{'db q/req':>10}{'max':>6}{'empty':>7}{'errors':>8}"
+        self.stdout.write('')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for method, stats in report['methods'].items():
+            self.stdout.write(
+                f"{method:<10}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                f"{stats['mean_ms']:>10.2f}{stats['qps']:>9.1f}{stats['db_queries_mean']:>10.2f}"
+                f"{stats['db_queries_max']:>6}{stats['zero_results']:>7}{stats['errors']:>8}"
+            )
+        if report['overlap']:
+            self.stdout.write(f"\nTop-{report['top_k']} overlap (|A & B| / min(|A|, |B|)):")
+            for pair, stats in report['overlap'].items():
+                value = 'n/a' if stats['overlap'] is None else f"{stats['overlap']:.3f}"
+                self.stdout.write(f"  {pair:<20}{value:>8}  over {stats['compared']} queries")
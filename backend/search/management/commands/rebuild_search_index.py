@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from search.indexing import rebuild_index
+from search.ranking import invalidate_index_statistics
+from search.backends import get_search_backend, reset_search_backend, PostingsSearchBackend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search inverted index and the native full-text index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products indexed per bulk insert (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding product search index...')
+        indexed = rebuild_index(batch_size=options['batch_size'], stdout=self.stdout)
+        invalidate_index_statistics()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt for {indexed} products'))
+
+        reset_search_backend()
+        backend = get_search_backend()
+        if not isinstance(backend, PostingsSearchBackend):
+            backend.rebuild(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Active search backend: {backend.name}'))
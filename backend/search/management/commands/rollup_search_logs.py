@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from search.rollups import ROLLUP_BATCH_SIZE, ROLLUP_LAG_SECONDS, rollup_search_logs
+
+
+class Command(BaseCommand):
+    help = 'Fold new search log rows into the hourly and daily analytics rollups (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag-seconds',
+            type=int,
+            default=ROLLUP_LAG_SECONDS,
+            help=f'Leave rows younger than this for the next run (default: {ROLLUP_LAG_SECONDS})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help=f'Search log ids folded per transaction (default: {ROLLUP_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        processed = rollup_search_logs(
+            lag_seconds=options['lag_seconds'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {processed} search log rows'))
@@ -0,0 +1,287 @@
+"""
+Sparse product x term matrix for vectorized tag and keyword scoring.
+
+For every text field the matrix stores, per vocabulary term, the rows of
+the in-stock products containing it (compressed sparse columns: indptr and
+indices arrays as in a CSR matrix of the transpose). A query word is
+resolved to the vocabulary terms containing it once (matching the old
+substring tests), and its rows are gathered from those columns. Ratings,
+hot flags and stock live in dense vectors. Scoring a query is a handful of vector operations plus
+argpartition for the top k instead of Python loops over the catalog.
+
+Product changes made by any process are read from the shared change log
+(search.changes) on every access. They are applied as an overlay of rows
+re-analyzed from the catalog snapshot on top of the immutable base arrays
+(each change yields a new matrix object, so readers never see a half-applied
+update). The base is rebuilt when the overlay grows large, a rebuild is
+logged or PRODUCT_MATRIX_REBUILD_INTERVAL elapses.
+
+NumPy is optional: without it get_product_matrix() returns None and callers
+keep their per-product scoring loops.
+"""
+import bisect
+import logging
+import threading
+import time
+from django.conf import settings
+
+from .changes import ChangeCursor
+from .indexing import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MATRIX_FIELDS = ('name', 'brand', 'description', 'tags', 'category')
+OVERLAY_MIN_ROWS = 500  # Rebuild once more rows than this (or 5% of the catalog) are overlaid
+
+
+def normalize_tag(tag):
+    return ' '.join((tag or '').lower().split())
+
+
+def product_record(name, brand, description, tags, category, ai_tags=()):
+    """Analyzed form of one product: term sets per field, its exact tags and category"""
+    tag_list = [tag.strip() for tag in (tags or '').split(',') if tag.strip()]
+    tag_list.extend(ai_tags)
+    return {
+        'fields': {
+            'name': frozenset(tokenize(name)),
+            'brand': frozenset(tokenize(brand)),
+            'description': frozenset(tokenize(description)),
+            'tags': frozenset(tokenize(' '.join([tags or ''] + list(ai_tags)))),
+            'category': frozenset(tokenize(category)),
+        },
+        'tags': frozenset(normalize_tag(tag) for tag in tag_list if normalize_tag(tag)),
+        'category': normalize_tag(category),
+    }
+
+
+def _columns(pairs, vocabulary_size):
+    """Term-major (indptr, indices) arrays from (column, row) pairs"""
+    if pairs:
+        columns, rows = (np.asarray(values, dtype=np.int32) for values in zip(*pairs))
+    else:
+        columns = rows = np.zeros(0, dtype=np.int32)
+    order = np.argsort(columns, kind='stable')
+    indptr = np.zeros(vocabulary_size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(columns, minlength=vocabulary_size), out=indptr[1:])
+    return indptr, rows[order]
+
+
+class ProductTermMatrix:
+    def __init__(self, product_ids, records, rating, is_hot, stock):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.rows = {product_id: row for row, product_id in enumerate(product_ids)}
+        self.alive = np.ones(len(product_ids), dtype=bool)
+        self.rating = np.asarray(rating, dtype=np.float32)
+        self.is_hot = np.asarray(is_hot, dtype=bool)
+        self.stock = np.asarray(stock, dtype=np.int32)
+        self.overlay = {}  # row -> record of products changed since the build
+        self.built_at = time.monotonic()
+
+        self.terms = sorted({term for record in records for terms in record['fields'].values() for term in terms})
+        term_columns = {term: column for column, term in enumerate(self.terms)}
+        self.postings = {
+            field: _columns(
+                [(term_columns[term], row) for row, record in enumerate(records) for term in record['fields'][field]],
+                len(self.terms)
+            )
+            for field in MATRIX_FIELDS
+        }
+
+        self._substring_columns = {}  # word -> vocabulary columns of terms containing it
+
+        categories = {}
+        for row, record in enumerate(records):
+            categories.setdefault(record['category'], []).append(row)
+        self.category_rows = {name: np.asarray(rows, dtype=np.int32) for name, rows in categories.items()}
+
+        self.tag_names = sorted({tag for record in records for tag in record['tags']})
+        tag_columns = {tag: column for column, tag in enumerate(self.tag_names)}
+        self.tag_postings = _columns(
+            [(tag_columns[tag], row) for row, record in enumerate(records) for tag in record['tags']],
+            len(self.tag_names)
+        )
+
+    @property
+    def size(self):
+        return len(self.product_ids)
+
+    def substring_mask(self, field, word):
+        """Rows whose field has a term containing word, like a substring test on the text"""
+        columns = self._substring_columns.get(word)
+        if columns is None:
+            # One pass over the vocabulary per distinct word, not over the catalog
+            columns = [column for column, term in enumerate(self.terms) if word in term]
+            if len(self._substring_columns) > 10000:
+                self._substring_columns.clear()
+            self._substring_columns[word] = columns
+        mask = np.zeros(self.size, dtype=bool)
+        indptr, indices = self.postings[field]
+        if columns:
+            mask[np.concatenate([indices[indptr[column]:indptr[column + 1]] for column in columns])] = True
+        for row, record in self.overlay.items():
+            mask[row] = any(word in term for term in record['fields'][field])
+        return mask
+
+    def text_mask(self, field, text):
+        """Rows whose field contains every word of text"""
+        words = tokenize(text)
+        if not words:
+            return np.zeros(self.size, dtype=bool)
+        mask = self.substring_mask(field, words[0])
+        for word in words[1:]:
+            mask &= self.substring_mask(field, word)
+        return mask
+
+    def tag_mask(self, tag):
+        """Rows carrying exactly this tag (product tag or AI tag)"""
+        tag = normalize_tag(tag)
+        mask = np.zeros(self.size, dtype=bool)
+        column = bisect.bisect_left(self.tag_names, tag)
+        if column < len(self.tag_names) and self.tag_names[column] == tag:
+            indptr, indices = self.tag_postings
+            mask[indices[indptr[column]:indptr[column + 1]]] = True
+        for row, record in self.overlay.items():
+            mask[row] = tag in record['tags']
+        return mask
+
+    def category_mask(self, name):
+        """Rows whose category is exactly this name"""
+        name = normalize_tag(name)
+        mask = np.zeros(self.size, dtype=bool)
+        if name in self.category_rows:
+            mask[self.category_rows[name]] = True
+        for row, record in self.overlay.items():
+            mask[row] = bool(name) and record['category'] == name
+        return mask
+
+    def top(self, scores, k):
+        """Up to k (row, product_id, score) with a positive score, best first"""
+        scores = np.where(self.alive, scores, 0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        # Highest score first, ties in catalog order
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(row), int(self.product_ids[row]), float(scores[row])) for row in candidates]
+
+    def with_product(self, product_id, record, rating, is_hot, stock):
+        """Copy of the matrix with one product added or re-analyzed"""
+        matrix = self._copy()
+        row = matrix.rows.get(product_id)
+        if row is None:
+            row = matrix.size
+            matrix.rows = {**matrix.rows, product_id: row}
+            matrix.product_ids = np.append(matrix.product_ids, product_id)
+            matrix.alive = np.append(matrix.alive, True)
+            matrix.rating = np.append(matrix.rating, np.float32(rating))
+            matrix.is_hot = np.append(matrix.is_hot, bool(is_hot))
+            matrix.stock = np.append(matrix.stock, np.int32(stock))
+        else:
+            for name, value in (('alive', True), ('rating', rating), ('is_hot', is_hot), ('stock', stock)):
+                array = getattr(matrix, name).copy()
+                array[row] = value
+                setattr(matrix, name, array)
+        matrix.overlay = {**matrix.overlay, row: record}
+        return matrix
+
+    def without_product(self, product_id):
+        """Copy of the matrix with one product hidden"""
+        row = self.rows.get(product_id)
+        if row is None:
+            return self
+        matrix = self._copy()
+        matrix.alive = matrix.alive.copy()
+        matrix.alive[row] = False
+        return matrix
+
+    def is_stale(self):
+        interval = getattr(settings, 'PRODUCT_MATRIX_REBUILD_INTERVAL', 900)
+        return (
+            time.monotonic() - self.built_at > interval
+            or len(self.overlay) > max(OVERLAY_MIN_ROWS, self.size // 20)
+        )
+
+    def _copy(self):
+        matrix = object.__new__(ProductTermMatrix)
+        matrix.__dict__.update(self.__dict__)
+        return matrix
+
+
+def _snapshot_record(snapshot, product):
+    return product_record(
+        product.name, product.brand, product.description, '', product.category, snapshot.tags_of(product)
+    )
+
+
+def build_product_matrix():
+    from ai_search.catalog import get_catalog_snapshot
+
+    # Built from the AI search catalog snapshot instead of loading the catalog again
+    snapshot = get_catalog_snapshot()
+    product_ids, records, rating, is_hot, stock = [], [], [], [], []
+    for product in sorted(snapshot.get(), key=lambda product: product.id):
+        product_ids.append(product.id)
+        records.append(_snapshot_record(snapshot, product))
+        rating.append(float(product.rating or 0))
+        is_hot.append(bool(product.is_hot))
+        stock.append(product.stock)
+
+    matrix = ProductTermMatrix(product_ids, records, rating, is_hot, stock)
+    logger.info(f"Product term matrix built: {matrix.size} products, {len(matrix.terms)} terms")
+    return matrix
+
+
+def apply_changes(matrix, product_ids):
+    """Matrix with the given products re-analyzed from the catalog snapshot"""
+    from ai_search.catalog import get_catalog_snapshot
+
+    # The snapshot reads the change log after the matrix did, so it has these changes
+    snapshot = get_catalog_snapshot()
+    for product_id in product_ids:
+        product = snapshot.products.get(product_id)
+        if product is None:
+            # Deleted or out of stock
+            matrix = matrix.without_product(product_id)
+        else:
+            matrix = matrix.with_product(
+                product_id, _snapshot_record(snapshot, product),
+                float(product.rating or 0), product.is_hot, product.stock
+            )
+    return matrix
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+_changes = ChangeCursor()
+
+
+def get_product_matrix():
+    """
+    The process-wide matrix with the product changes logged by any process
+    applied, rebuilt when stale; None when NumPy is not installed
+    """
+    global _matrix
+    if np is None:
+        return None
+    with _matrix_lock:
+        product_ids, rebuild = _changes.read()
+        if (
+            _matrix is None or rebuild or _matrix.is_stale()
+            or len(product_ids) > max(OVERLAY_MIN_ROWS, _matrix.size // 20)
+        ):
+            _changes.start()
+            _matrix = build_product_matrix()
+        elif product_ids:
+            try:
+                _matrix = apply_changes(_matrix, product_ids)
+            except Exception:
+                # The cursor has moved past these changes; rebuild on the next read
+                _changes.reset()
+                raise
+        return _matrix
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 06:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0010_vendorproduct_tags'),
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True)),
+                ('document_frequency', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['term'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_length', models.PositiveIntegerField(default=0)),
+                ('brand_length', models.PositiveIntegerField(default=0)),
+                ('tags_length', models.PositiveIntegerField(default=0)),
+                ('description_length', models.PositiveIntegerField(default=0)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='vendors.vendorproduct')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_tf', models.PositiveIntegerField(default=0)),
+                ('brand_tf', models.PositiveIntegerField(default=0)),
+                ('tags_tf', models.PositiveIntegerField(default=0)),
+                ('description_tf', models.PositiveIntegerField(default=0)),
+                ('weight', models.FloatField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='vendors.vendorproduct')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='search.searchterm')),
+            ],
+            options={
+                'unique_together': {('term', 'product')},
+            },
+        ),
+    ]
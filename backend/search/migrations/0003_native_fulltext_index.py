@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def install_native_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        from search.backends import sqlite_fts
+        sqlite_fts.install(schema_editor)
+    elif vendor == 'postgresql':
+        from search.backends import postgres
+        postgres.install(schema_editor)
+
+
+def uninstall_native_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        from search.backends import sqlite_fts
+        sqlite_fts.uninstall(schema_editor)
+    elif vendor == 'postgresql':
+        from search.backends import postgres
+        postgres.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0010_vendorproduct_tags'),
+        ('search', '0002_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_native_index, uninstall_native_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_native_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchQueryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('query', models.CharField(max_length=255)),
+                ('search_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', '-search_count'],
+                'unique_together': {('day', 'query')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('search_type', models.CharField(max_length=20)),
+                ('search_count', models.PositiveIntegerField(default=0)),
+                ('zero_result_count', models.PositiveIntegerField(default=0)),
+                ('results_total', models.BigIntegerField(default=0)),
+                ('processing_time_total', models.FloatField(default=0)),
+                ('processing_time_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+                'unique_together': {('granularity', 'period_start', 'search_type')},
+            },
+        ),
+    ]
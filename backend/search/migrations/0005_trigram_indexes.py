@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def install_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        from search.fuzzy import install_trigram_indexes
+        install_trigram_indexes(schema_editor)
+
+
+def uninstall_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        from search.fuzzy import uninstall_trigram_indexes
+        uninstall_trigram_indexes(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('search', '0004_search_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_trigram_indexes, uninstall_trigram_indexes),
+    ]
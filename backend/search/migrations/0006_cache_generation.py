@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0005_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('generation', models.BigIntegerField()),
+                ('modified_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
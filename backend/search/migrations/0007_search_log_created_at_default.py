@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0006_cache_generation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='searchlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -16,7 +16,9 @@ class SearchLog(models.Model):
     ], default='keyword')
     results_count = models.IntegerField(default=0)
     processing_time = models.FloatField(null=True, blank=True)  # in seconds
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the row is built, i.e. when the search is logged; auto_now_add
+    # would stamp it only when the log sink flushes the batch
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-created_at']
@@ -39,3 +41,108 @@ class SearchResult(models.Model):
     
     def __str__(self):
         return f"#{self.rank} - {self.product.name} (score: {self.relevance_score})"
+
+class SearchTerm(models.Model):
+    """Vocabulary entry of the product inverted index"""
+    term = models.CharField(max_length=64, unique=True)
+    document_frequency = models.PositiveIntegerField(default=0)  # Number of products containing the term
+    
+    class Meta:
+        ordering = ['term']
+    
+    def __str__(self):
+        return f"{self.term} ({self.document_frequency} products)"
+
+class SearchDocument(models.Model):
+    """Per-product statistics of the inverted index"""
+    product = models.OneToOneField(VendorProduct, on_delete=models.CASCADE, related_name='search_document')
+    name_length = models.PositiveIntegerField(default=0)  # Token counts per indexed field
+    brand_length = models.PositiveIntegerField(default=0)
+    tags_length = models.PositiveIntegerField(default=0)
+    description_length = models.PositiveIntegerField(default=0)
+    indexed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Index document for product #{self.product_id}"
+
+class SearchPosting(models.Model):
+    """Occurrence of a term in a product, with per-field term frequencies"""
+    term = models.ForeignKey(SearchTerm, on_delete=models.CASCADE, related_name='postings')
+    product = models.ForeignKey(VendorProduct, on_delete=models.CASCADE, related_name='search_postings')
+    name_tf = models.PositiveIntegerField(default=0)
+    brand_tf = models.PositiveIntegerField(default=0)
+    tags_tf = models.PositiveIntegerField(default=0)
+    description_tf = models.PositiveIntegerField(default=0)
+    weight = models.FloatField(default=0)  # Field-weighted term frequency
+    
+    class Meta:
+        unique_together = ['term', 'product']
+    
+    def __str__(self):
+        return f"{self.term.term} -> product #{self.product_id} ({self.weight})"
+
+class SearchLogRollup(models.Model):
+    """Search counts and timings per hour or day and search type, built from SearchLog"""
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    period_start = models.DateTimeField()
+    search_type = models.CharField(max_length=20)
+    search_count = models.PositiveIntegerField(default=0)
+    zero_result_count = models.PositiveIntegerField(default=0)
+    results_total = models.BigIntegerField(default=0)
+    processing_time_total = models.FloatField(default=0)  # in seconds
+    processing_time_count = models.PositiveIntegerField(default=0)  # Rows that recorded a time
+    
+    class Meta:
+        ordering = ['-period_start']
+        unique_together = ['granularity', 'period_start', 'search_type']
+    
+    def __str__(self):
+        return f"{self.granularity} {self.period_start:%Y-%m-%d %H:%M} {self.search_type}: {self.search_count}"
+
+class SearchQueryRollup(models.Model):
+    """Daily count of each normalized query, for popular query analytics"""
+    day = models.DateField()
+    query = models.CharField(max_length=255)
+    search_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-day', '-search_count']
+        unique_together = ['day', 'query']
+    
+    def __str__(self):
+        return f"{self.day} {self.query[:50]}: {self.search_count}"
+
+class RollupWatermark(models.Model):
+    """Last source row folded into a rollup, so each run only reads new rows"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+class CacheGeneration(models.Model):
+    """Generation counter of a cached dataset, shared by every worker process (see search.generations)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    generation = models.BigIntegerField()
+    modified_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.generation}"
+
+class ProductChange(models.Model):
+    """
+    One committed product change, read by every process's in-memory indexes
+    (see search.changes). product_id is empty for a change that affects
+    any product, such as a renamed category or tag.
+    """
+    product_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"{self.id}: {self.product_id or 'all products'}"
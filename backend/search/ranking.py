@@ -0,0 +1,157 @@
+"""
+BM25F relevance ranking over the inverted index.
+
+Scores are computed from precomputed statistics only: per-field term
+frequencies stored on the postings, term document frequencies on
+SearchTerm, and per-product field lengths on SearchDocument. Only the
+postings of the query terms are read, and the best k candidates are
+selected with a bounded heap instead of sorting every match.
+
+This is the only backend that ranks with BM25F proper. The native
+backends approximate it with per-field weights: sqlite_fts passes
+FIELD_WEIGHTS to bm25() per column, postgres maps the fields to tsvector
+weights A-D for ts_rank_cd.
+"""
+import heapq
+import math
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q, Sum
+
+from .indexing import FIELD_WEIGHTS, INDEXED_FIELDS, matching_postings, query_terms, term_prefix_filter
+from .models import SearchDocument, SearchTerm
+
+# Saturation and per-field length normalisation; short fields are normalised less
+BM25_K1 = 1.2
+FIELD_B = {
+    'name': 0.5,
+    'brand': 0.3,
+    'tags': 0.5,
+    'description': 0.75,
+}
+# Terms only reached through prefix expansion ("diam" -> "diamond") count less
+PREFIX_MATCH_WEIGHT = 0.5
+
+STATS_CACHE_KEY = 'search:index_statistics'
+STATS_CACHE_TIMEOUT = 300  # 5 minutes
+
+
+def get_index_statistics():
+    """Document count (in all and in stock) and average field lengths of the index (cached)"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        aggregates = SearchDocument.objects.aggregate(
+            document_count=Count('id'),
+            in_stock_count=Count('id', filter=Q(product__stock__gt=0)),
+            **{f'avg_{field}': Avg(f'{field}_length') for field in INDEXED_FIELDS}
+        )
+        stats = {
+            'document_count': aggregates['document_count'],
+            'in_stock_count': aggregates['in_stock_count'],
+            'avg_lengths': {
+                field: aggregates[f'avg_{field}'] or 1.0 for field in INDEXED_FIELDS
+            },
+        }
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_index_statistics():
+    cache.delete(STATS_CACHE_KEY)
+
+
+def idf(document_count, document_frequency):
+    """Probabilistic IDF; the +1 keeps it positive even for very common terms"""
+    return math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def bm25f_scores(query, candidates=None):
+    """
+    Score products matching the query with BM25F.
+
+    candidates is an optional queryset of VendorProduct restricting which
+    products may be scored (e.g. already filtered by stock and category).
+    Returns {product_id: score}.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return {}
+
+    stats = get_index_statistics()
+    document_count = max(stats['document_count'], 1)
+    avg_lengths = stats['avg_lengths']
+
+    postings = matching_postings(query)
+    if candidates is not None:
+        postings = postings.filter(product_id__in=candidates.values('id'))
+
+    columns = ['product_id', 'term__term', 'term__document_frequency']
+    columns += [f'{field}_tf' for field in INDEXED_FIELDS]
+    columns += [f'product__search_document__{field}_length' for field in INDEXED_FIELDS]
+
+    field_count = len(INDEXED_FIELDS)
+    best = {}  # (product_id, query word) -> score of its best matching term
+    for row in postings.values_list(*columns).iterator(chunk_size=2000):
+        product_id, term, document_frequency = row[0], row[1], row[2]
+        frequencies = row[3:3 + field_count]
+        lengths = row[3 + field_count:]
+
+        # Field-weighted, length-normalised pseudo term frequency
+        pseudo_tf = 0.0
+        for field, tf, length in zip(INDEXED_FIELDS, frequencies, lengths):
+            if tf:
+                b = FIELD_B[field]
+                norm = 1 - b + b * (length or 0) / avg_lengths[field]
+                pseudo_tf += FIELD_WEIGHTS[field] * tf / norm
+        if not pseudo_tf:
+            continue
+
+        score = idf(document_count, document_frequency) * pseudo_tf / (BM25_K1 + pseudo_tf)
+        # A query word counts once, with its best expansion; summing them
+        # would add the IDF again for every vocabulary term sharing the prefix
+        for word in terms:
+            if not term.startswith(word):
+                continue
+            word_score = score if term == word else score * PREFIX_MATCH_WEIGHT
+            key = (product_id, word)
+            if word_score > best.get(key, 0.0):
+                best[key] = word_score
+
+    scores = {}
+    for (product_id, _), score in best.items():
+        scores[product_id] = scores.get(product_id, 0.0) + score
+    return scores
+
+
+def estimate_match_count(query, in_stock_only=False):
+    """
+    Approximate number of products matching any query word, read from the
+    vocabulary's document frequencies without touching the postings.
+    in_stock_only scales it by the share of indexed products in stock.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return 0
+    total = SearchTerm.objects.filter(term_prefix_filter(terms, field='term')).aggregate(
+        total=Sum('document_frequency')
+    )['total'] or 0
+    stats = get_index_statistics()
+    # Products matching several words are counted once per word; cap at the index size
+    total = min(total, stats['document_count'])
+    if in_stock_only and stats['document_count']:
+        in_stock = stats.get('in_stock_count', stats['document_count'])
+        total = round(total * in_stock / stats['document_count'])
+    return total
+
+
+def top_k(scores, k, after=None):
+    """
+    The k best (product_id, score) pairs, best first; ties go to the lower id.
+    after is an optional (score, product_id) position to continue below.
+    """
+    items = scores.items()
+    if after is not None:
+        boundary = (-after[0], after[1])
+        items = [item for item in items if (-item[1], item[0]) > boundary]
+    if k is None:
+        k = len(items)
+    return heapq.nsmallest(k, items, key=lambda item: (-item[1], item[0]))
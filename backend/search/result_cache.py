@@ -0,0 +1,90 @@
+"""
+Result cache for product listings and search.
+
+Entries store the ids of one result page (plus its totals), never
+serialized payloads, so cached pages always render current product data.
+Keys embed a catalog generation counter that is bumped whenever a product,
+category or review is saved or deleted; bumping it makes every older entry
+unreachable at once, so a cached page can never outlive an edit. The counter
+lives in the database (search.generations), so a bump reaches every worker
+even when the pages themselves sit in a per-process cache.
+"""
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+
+from .generations import bump_generation, get_generation
+
+GENERATION_NAME = 'catalog'
+STATS_KEYS = {
+    'hits': 'search:result_cache:hits',
+    'misses': 'search:result_cache:misses',
+}
+
+
+def get_catalog_generation():
+    return get_generation(GENERATION_NAME)[0]
+
+
+def bump_catalog_generation():
+    """Invalidate all cached result pages, in every process"""
+    bump_generation(GENERATION_NAME)
+
+
+def get_catalog_last_modified():
+    """Time of the latest catalog edit, None when unknown"""
+    return get_generation(GENERATION_NAME)[1]
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+def result_cache_key(namespace, **params):
+    """Cache key for a result page from its normalized parameters"""
+    if 'q' in params:
+        params['q'] = normalize_query(params['q'])
+    signature = json.dumps(
+        {key: value for key, value in params.items() if value not in (None, '')},
+        sort_keys=True, default=str
+    )
+    digest = hashlib.sha1(signature.encode()).hexdigest()
+    return f'search:results:{namespace}:{get_catalog_generation()}:{digest}'
+
+
+def get_cached_result(key):
+    result = cache.get(key)
+    _increment('hits' if result is not None else 'misses')
+    return result
+
+
+def set_cached_result(key, result):
+    cache.set(key, result, getattr(settings, 'SEARCH_RESULT_CACHE_TIMEOUT', 300))
+
+
+def fetch_in_order(queryset, ids):
+    """Model instances for ids, in the order of ids, skipping any that vanished"""
+    objects = queryset.in_bulk(ids)
+    return [objects[object_id] for object_id in ids if object_id in objects]
+
+
+def result_cache_stats():
+    counts = cache.get_many(list(STATS_KEYS.values()))
+    hits = counts.get(STATS_KEYS['hits'], 0)
+    misses = counts.get(STATS_KEYS['misses'], 0)
+    return {
+        'generation': get_catalog_generation(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+    }
+
+
+def _increment(name):
+    key = STATS_KEYS[name]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
@@ -0,0 +1,250 @@
+"""
+Hourly and daily rollups of SearchLog for analytics.
+
+rollup_search_logs() folds only the rows added since the last run (tracked
+by a RollupWatermark on the SearchLog id) into SearchLogRollup and
+SearchQueryRollup. search_summary() answers any date range from whole-day
+rollups plus hourly rollups for the partial days at its edges, and adds the
+few rows newer than the watermark directly from SearchLog.
+"""
+import logging
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Lower, Trim, TruncDate, TruncDay, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import RollupWatermark, SearchLog, SearchLogRollup, SearchQueryRollup
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'search_log'
+# Rows younger than this are left for the next run, so a log row whose
+# transaction commits late is not skipped behind the watermark
+ROLLUP_LAG_SECONDS = 120
+ROLLUP_BATCH_SIZE = 20000
+MAX_QUERY_LENGTH = 255
+
+ROLLUP_SUM_FIELDS = (
+    'search_count', 'zero_result_count', 'results_total',
+    'processing_time_total', 'processing_time_count',
+)
+
+
+def rollup_search_logs(lag_seconds=ROLLUP_LAG_SECONDS, batch_size=ROLLUP_BATCH_SIZE, stdout=None):
+    """Fold SearchLog rows newer than the watermark into the rollups, returns the row count"""
+    watermark, created = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    cutoff = timezone.now() - timedelta(seconds=lag_seconds)
+    upper = SearchLog.objects.filter(
+        id__gt=watermark.last_id, created_at__lte=cutoff
+    ).aggregate(upper=Max('id'))['upper']
+    if upper is None:
+        return 0
+
+    processed = 0
+    start = watermark.last_id
+    while start < upper:
+        end = min(start + batch_size, upper)
+        with transaction.atomic():
+            # Lock the watermark so concurrent runs cannot fold the same rows twice
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            if watermark.last_id != start:
+                logger.warning("Search log rollup watermark moved by another run, stopping")
+                break
+            processed += _rollup_range(start, end)
+            watermark.last_id = end
+            watermark.save(update_fields=['last_id', 'updated_at'])
+        start = end
+        if stdout:
+            stdout.write(f'Rolled up search logs through id {end}')
+    return processed
+
+
+def _rollup_range(start_id, end_id):
+    rows = SearchLog.objects.filter(id__gt=start_id, id__lte=end_id)
+
+    for granularity, trunc in (('hour', TruncHour), ('day', TruncDay)):
+        aggregates = rows.annotate(period=trunc('created_at')).values('period', 'search_type').annotate(
+            search_count=Count('id'),
+            zero_result_count=Count('id', filter=Q(results_count=0)),
+            results_total=Sum('results_count'),
+            processing_time_total=Sum('processing_time'),
+            processing_time_count=Count('processing_time'),
+        )
+        _merge_log_rollups(granularity, aggregates)
+
+    query_counts = {}
+    daily_queries = rows.annotate(
+        day=TruncDate('created_at'), normalized=Trim(Lower('query'))
+    ).values('day', 'normalized').annotate(search_count=Count('id'))
+    for item in daily_queries:
+        key = (item['day'], item['normalized'][:MAX_QUERY_LENGTH])
+        if key[1]:
+            query_counts[key] = query_counts.get(key, 0) + item['search_count']
+    _merge_query_rollups(query_counts)
+
+    return rows.count()
+
+
+def _merge_log_rollups(granularity, aggregates):
+    aggregates = list(aggregates)
+    if not aggregates:
+        return
+    existing = {
+        (rollup.period_start, rollup.search_type): rollup
+        for rollup in SearchLogRollup.objects.filter(
+            granularity=granularity,
+            period_start__in={item['period'] for item in aggregates}
+        )
+    }
+    to_create, to_update = [], []
+    for item in aggregates:
+        rollup = existing.get((item['period'], item['search_type']))
+        if rollup is None:
+            rollup = SearchLogRollup(granularity=granularity, period_start=item['period'], search_type=item['search_type'])
+            to_create.append(rollup)
+        else:
+            to_update.append(rollup)
+        for field in ROLLUP_SUM_FIELDS:
+            setattr(rollup, field, getattr(rollup, field) + (item[field] or 0))
+    SearchLogRollup.objects.bulk_create(to_create, batch_size=500)
+    SearchLogRollup.objects.bulk_update(to_update, ROLLUP_SUM_FIELDS, batch_size=500)
+
+
+def _merge_query_rollups(query_counts):
+    if not query_counts:
+        return
+    existing = {}
+    keys = list(query_counts)
+    for offset in range(0, len(keys), 500):  # Stay under the SQL parameter limit
+        chunk = keys[offset:offset + 500]
+        for rollup in SearchQueryRollup.objects.filter(
+            day__in={day for day, query in chunk}, query__in={query for day, query in chunk}
+        ):
+            existing[(rollup.day, rollup.query)] = rollup
+    to_create, to_update = [], []
+    for (day, query), count in query_counts.items():
+        rollup = existing.get((day, query))
+        if rollup is None:
+            to_create.append(SearchQueryRollup(day=day, query=query, search_count=count))
+        else:
+            rollup.search_count += count
+            to_update.append(rollup)
+    SearchQueryRollup.objects.bulk_create(to_create, batch_size=500)
+    SearchQueryRollup.objects.bulk_update(to_update, ['search_count'], batch_size=500)
+
+
+def _floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_day(value):
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day if day == value else day + timedelta(days=1)
+
+
+def _rollup_filter(start, end):
+    """Q over SearchLogRollup covering [start, end): whole days plus edge hours"""
+    hour_start = _floor_hour(start) if start else None
+    hour_end = None
+    if end:
+        hour_end = _floor_hour(end)
+        if hour_end < end:
+            hour_end += timedelta(hours=1)
+    day_start = _ceil_day(start) if start else None
+    day_end = end.replace(hour=0, minute=0, second=0, microsecond=0) if end else None
+
+    if day_start is not None and day_end is not None and day_start >= day_end:
+        # Less than one whole day: hours only
+        return Q(granularity='hour', period_start__gte=hour_start, period_start__lt=hour_end)
+
+    days = Q(granularity='day')
+    if day_start is not None:
+        days &= Q(period_start__gte=day_start)
+    if day_end is not None:
+        days &= Q(period_start__lt=day_end)
+    condition = days
+    if hour_start is not None:
+        condition |= Q(granularity='hour', period_start__gte=hour_start, period_start__lt=day_start)
+    if hour_end is not None:
+        condition |= Q(granularity='hour', period_start__gte=day_end, period_start__lt=hour_end)
+    return condition
+
+
+def search_summary(start=None, end=None, popular_limit=20):
+    """
+    Search analytics for [start, end) (either bound may be None) from the
+    rollups, plus the rows not rolled up yet
+    """
+    watermark = RollupWatermark.objects.filter(name=WATERMARK_NAME).first()
+    last_id = watermark.last_id if watermark else 0
+
+    by_type = {}
+    rolled_up = SearchLogRollup.objects.filter(_rollup_filter(start, end)).values('search_type').annotate(
+        search_count=Sum('search_count'),
+        processing_time_total=Sum('processing_time_total'),
+        processing_time_count=Sum('processing_time_count'),
+    )
+    tail = SearchLog.objects.filter(id__gt=last_id)
+    if start:
+        tail = tail.filter(created_at__gte=start)
+    if end:
+        tail = tail.filter(created_at__lt=end)
+    recent = tail.values('search_type').annotate(
+        search_count=Count('id'),
+        processing_time_total=Sum('processing_time'),
+        processing_time_count=Count('processing_time'),
+    )
+    for item in list(rolled_up) + list(recent):
+        totals = by_type.setdefault(item['search_type'], dict.fromkeys(
+            ('search_count', 'processing_time_total', 'processing_time_count'), 0
+        ))
+        for field in totals:
+            totals[field] += item[field] or 0
+
+    queries = SearchQueryRollup.objects.all()
+    if start:
+        queries = queries.filter(day__gte=start.date())
+    if end:
+        queries = queries.filter(day__lt=_ceil_day(end).date())
+    popular_queries = queries.values('query').annotate(count=Sum('search_count')).filter(
+        count__gt=1
+    ).order_by('-count')[:popular_limit]
+
+    search_types = sorted(
+        ({'search_type': search_type, 'count': totals['search_count']} for search_type, totals in by_type.items()),
+        key=lambda item: -item['count']
+    )
+    average_processing_times = [
+        {
+            'search_type': search_type,
+            'avg_time': (totals['processing_time_total'] / totals['processing_time_count'])
+            if totals['processing_time_count'] else None
+        }
+        for search_type, totals in sorted(by_type.items())
+    ]
+    return {
+        'total_searches': sum(item['count'] for item in search_types),
+        'search_types': search_types,
+        'popular_queries': list(popular_queries),
+        'average_processing_times': average_processing_times,
+        'rolled_up_through_id': last_id,
+    }
+
+
+def parse_range_bound(value, end_of_day=False):
+    """Date or datetime query parameter as an aware datetime; dates cover the whole day"""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, dt_time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    # Rollup hours and days are UTC periods
+    return parsed.astimezone(dt_timezone.utc)
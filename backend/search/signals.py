@@ -0,0 +1,112 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+from vendors.models import ProductImage, Vendor, VendorProduct
+from vendors.signals import products_bulk_saved
+from ai_search.models import ProductTagAssociation
+from categories.models import Category
+from reviews.models import Review
+from .indexing import INDEXED_FIELDS, index_product, reindex_products, remove_product
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=VendorProduct)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the inverted index in sync when a product is created or edited.
+    Saves that only touch non-text fields (e.g. thumbnail) are skipped.
+    """
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return
+    try:
+        index_product(instance)
+    except Exception as e:
+        logger.error(f"Failed to index product {instance.pk}: {e}")
+
+
+@receiver(pre_delete, sender=VendorProduct)
+def product_deleted(sender, instance, **kwargs):
+    """
+    Remove a product from the inverted index.
+    Runs before the delete so term document frequencies can be decremented
+    while the postings still exist.
+    """
+    try:
+        remove_product(instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to remove product {instance.pk} from search index: {e}")
+
+
+# The in-memory indexes of every process follow the shared change log
+# (search.changes); entries are written after commit, like the index reads
+
+@receiver(post_save, sender=VendorProduct)
+@receiver(post_delete, sender=VendorProduct)
+def product_changed_log(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: _record_changes([product_id]))
+
+
+@receiver(products_bulk_saved, sender=VendorProduct)
+def products_bulk_changed_log(sender, products, **kwargs):
+    product_ids = [product.pk for product in products]
+    transaction.on_commit(lambda: _record_changes(product_ids))
+
+
+@receiver(post_save, sender=ProductTagAssociation)
+@receiver(post_delete, sender=ProductTagAssociation)
+def product_tags_changed_log(sender, instance, **kwargs):
+    product_id = instance.product_id
+    transaction.on_commit(lambda: _record_changes([product_id]))
+
+
+def _record_changes(product_ids):
+    from .changes import record_product_changes
+    try:
+        record_product_changes(product_ids)
+    except Exception as e:
+        logger.error(f"Failed to log changes of {len(product_ids)} products: {e}")
+
+
+@receiver(products_bulk_saved, sender=VendorProduct)
+def products_bulk_saved_search(sender, products, **kwargs):
+    """Bulk writes send no post_save: reindex their products in one pass"""
+    try:
+        reindex_products(products)
+    except Exception as e:
+        logger.error(f"Failed to index {len(products)} bulk-saved products: {e}")
+
+
+@receiver(post_save, sender=VendorProduct)
+@receiver(post_delete, sender=VendorProduct)
+@receiver(products_bulk_saved, sender=VendorProduct)
+@receiver(m2m_changed, sender=VendorProduct.frequently_bought_together.through)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def catalog_changed(sender, **kwargs):
+    """
+    Any catalog edit invalidates every cached search/listing result page,
+    and the catalog ETags of utils.conditional
+    """
+    if kwargs.get('action', '').startswith('pre_'):
+        return
+
+    from .result_cache import bump_catalog_generation
+    
+    def bump():
+        try:
+            bump_catalog_generation()
+        except Exception as e:
+            logger.error(f"Failed to invalidate search result cache: {e}")
+    
+    # After commit, so a page computed from the old rows meanwhile cannot be
+    # cached under the new generation
+    transaction.on_commit(bump)
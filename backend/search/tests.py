@@ -1,3 +1,409 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipIf
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from vendors.models import Vendor, VendorProduct
+from ai_search.gpt_service import gpt_ai_search_service
+from categories.models import Category
+from .changes import ChangeCursor, record_product_changes
+from .facets import compute_facets
+from . import fuzzy, matrix as product_matrix, typeahead
+from .backends.base import BaseSearchBackend
+from .backends.sqlite_fts import SQLiteFTSSearchBackend
+from .indexing import candidate_product_ids, rebuild_index, reindex_products
+from .logsink import SearchLogSink
+from .models import ProductChange, RollupWatermark, SearchLog, SearchPosting, SearchTerm
+from .ranking import PREFIX_MATCH_WEIGHT, bm25f_scores, invalidate_index_statistics
+from .rollups import WATERMARK_NAME, rollup_search_logs, search_summary
 
-# Create your tests here.
+
+class InvertedIndexTests(TransactionTestCase):
+    def setUp(self):
+        self.vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.galaxy = VendorProduct.objects.create(
+            vendor=self.vendor, name='Galaxy Phone', brand='Samsung', description='A galaxy camera', price=1
+        )
+
+    def postings(self):
+        return {
+            (term, product_id): weight
+            for term, product_id, weight in SearchPosting.objects.values_list('term__term', 'product_id', 'weight')
+        }
+
+    def document_frequencies(self):
+        return dict(SearchTerm.objects.filter(document_frequency__gt=0).values_list('term', 'document_frequency'))
+
+    def test_saves_and_deletes_keep_postings_in_sync(self):
+        galaxy = self.galaxy.pk
+        self.assertEqual(self.postings(), {
+            ('galaxy', galaxy): 13.0, ('phone', galaxy): 10.0, ('samsung', galaxy): 7.0, ('camera', galaxy): 3.0,
+        })
+
+        self.galaxy.name = 'Pixel Phone'
+        self.galaxy.save()
+        pixel = VendorProduct.objects.create(vendor=self.vendor, name='Phone case', price=1)
+        self.assertEqual(self.postings(), {
+            ('pixel', galaxy): 10.0, ('phone', galaxy): 10.0, ('samsung', galaxy): 7.0,
+            ('galaxy', galaxy): 3.0, ('camera', galaxy): 3.0,
+            ('phone', pixel.pk): 10.0, ('case', pixel.pk): 10.0,
+        })
+        self.assertEqual(self.document_frequencies(), {
+            'pixel': 1, 'phone': 2, 'samsung': 1, 'galaxy': 1, 'camera': 1, 'case': 1,
+        })
+
+        self.galaxy.delete()
+        self.assertEqual(self.postings(), {('phone', pixel.pk): 10.0, ('case', pixel.pk): 10.0})
+        self.assertEqual(self.document_frequencies(), {'phone': 1, 'case': 1})
+
+    def test_bulk_reindex_and_rebuild_match_incremental_updates(self):
+        VendorProduct.objects.create(vendor=self.vendor, name='Galaxy Watch', price=1)
+        # Queryset updates send no post_save
+        VendorProduct.objects.filter(pk=self.galaxy.pk).update(name='Nova Phone')
+        reindex_products(VendorProduct.objects.filter(pk=self.galaxy.pk))
+        postings, frequencies = self.postings(), self.document_frequencies()
+        self.assertEqual(postings[('nova', self.galaxy.pk)], 10.0)
+        self.assertEqual(postings[('galaxy', self.galaxy.pk)], 3.0)
+        self.assertEqual(frequencies['galaxy'], 2)
+        self.assertEqual(frequencies['nova'], 1)
+
+        self.assertEqual(rebuild_index(), 2)
+        self.assertEqual(self.postings(), postings)
+        self.assertEqual(self.document_frequencies(), frequencies)
+
+    def test_candidates_match_word_prefixes(self):
+        def candidates(query):
+            return set(VendorProduct.objects.filter(id__in=candidate_product_ids(query)).values_list('id', flat=True))
+
+        self.assertEqual(candidates('gal'), {self.galaxy.pk})
+        self.assertEqual(candidates('tablet SAMS'), {self.galaxy.pk})
+        self.assertEqual(candidates('laxy'), set())
+        self.assertEqual(candidates('a'), set())
+
+
+class FacetTests(TransactionTestCase):
+    def test_counts_every_facet_in_one_aggregation(self):
+        electronics = Category.objects.create(name='Electronics')
+        phones = Category.objects.create(name='Phones', parent_category=electronics)
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        VendorProduct.objects.bulk_create([
+            VendorProduct(vendor=vendor, name='Phone', brand='Acme', price=30, stock=1, category=phones),
+            VendorProduct(vendor=vendor, name='Phone', brand='Acme', price=40, stock=0, category=phones),
+            VendorProduct(vendor=vendor, name='Radio', brand='Zeta', price=120, stock=2, category=electronics),
+            VendorProduct(vendor=vendor, name='Cable', brand='', price=5, stock=3),
+        ])
+
+        # One grouped query over the products, one over the category tree
+        with self.assertNumQueries(2):
+            facets = compute_facets(VendorProduct.objects.all())
+        self.assertEqual(facets['total'], 4)
+        self.assertEqual(
+            [(item['name'], item['count'], item['direct_count']) for item in facets['categories']],
+            [('Electronics', 3, 1), ('Phones', 2, 2)]
+        )
+        self.assertEqual(facets['brands'], [{'value': 'Acme', 'count': 2}, {'value': 'Zeta', 'count': 1}])
+        self.assertEqual(facets['vendors'], [{'id': vendor.pk, 'name': 'Store', 'count': 4}])
+        self.assertEqual(
+            {(bucket['min'], bucket['max']): bucket['count'] for bucket in facets['price'] if bucket['count']},
+            {(0, 25): 1, (25, 50): 2, (100, 250): 1}
+        )
+        self.assertEqual(facets['stock'], {'in_stock': 3, 'out_of_stock': 1})
+
+        in_stock = compute_facets(VendorProduct.objects.filter(stock__gt=0))
+        self.assertEqual(in_stock['total'], 3)
+        self.assertEqual(in_stock['categories'][1]['count'], 1)
+
+    def test_listing_facets_cover_every_page(self):
+        cache.clear()
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        VendorProduct.objects.bulk_create([
+            VendorProduct(vendor=vendor, name=f'Product {i}', brand='Acme', price=10, stock=1) for i in range(5)
+        ])
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        response = APIClient().get('/api/vendors/products/?facets=true&page_size=2', secure=True)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['facets']['total'], 5)
+        self.assertEqual(response.data['facets']['brands'], [{'value': 'Acme', 'count': 5}])
+
+
+class BM25FScoreTests(TransactionTestCase):
+    def setUp(self):
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.product = VendorProduct.objects.create(
+            vendor=vendor, name='phonebook phoneline phones', price=1
+        )
+        VendorProduct.objects.create(vendor=vendor, name='laptop', price=1)
+        invalidate_index_statistics()
+
+    def test_prefix_expansions_count_once_per_query_word(self):
+        """A word scores its best expansion, not the sum over every term sharing the prefix"""
+        best = max(
+            bm25f_scores(term)[self.product.pk] * PREFIX_MATCH_WEIGHT
+            for term in ('phonebook', 'phoneline', 'phones')
+        )
+        self.assertAlmostEqual(bm25f_scores('phon')[self.product.pk], best)
+
+
+class SearchLogSinkTests(TransactionTestCase):
+    def test_rows_are_stamped_when_queued(self):
+        sink = SearchLogSink(asynchronous=True, flush_interval=0.2)
+        queued_from = timezone.now()
+        sink.log(SearchLog, query='phone', session_key='test')
+        queued_until = timezone.now()
+        time.sleep(0.05)
+        sink.shutdown()
+
+        created_at = SearchLog.objects.get(query='phone').created_at
+        self.assertTrue(queued_from <= created_at <= queued_until)
+
+
+class SearchRollupTests(TransactionTestCase):
+    def setUp(self):
+        self.day = datetime.now(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=5)
+
+    def log(self, hours, query='phone', search_type='keyword', processing_time=1.0):
+        return SearchLog.objects.create(
+            query=query, search_type=search_type, results_count=1, processing_time=processing_time,
+            created_at=self.day + timedelta(hours=hours)
+        )
+
+    def watermark(self):
+        return RollupWatermark.objects.get(name=WATERMARK_NAME).last_id
+
+    def test_rolls_up_only_rows_past_the_watermark_and_the_lag(self):
+        first = self.log(1)
+        self.assertEqual(rollup_search_logs(), 1)
+        self.assertEqual(self.watermark(), first.pk)
+        self.assertEqual(rollup_search_logs(), 0)
+
+        second = self.log(2)
+        recent = SearchLog.objects.create(query='phone', search_type='keyword')
+        # The recent row may still have uncommitted neighbours: it waits for the next run
+        self.assertEqual(rollup_search_logs(), 1)
+        self.assertEqual(self.watermark(), second.pk)
+        self.assertEqual(search_summary()['total_searches'], 3)
+
+        self.assertEqual(rollup_search_logs(lag_seconds=0), 1)
+        self.assertEqual(self.watermark(), recent.pk)
+        self.assertEqual(search_summary()['total_searches'], 3)
+
+    def test_summary_of_a_range_matches_the_logs(self):
+        self.log(9, search_type='ai', processing_time=4.0)  # Before the range
+        self.log(10.5, search_type='ai', processing_time=2.0)  # Edge hour
+        self.log(29, query='Laptop ')  # Whole day
+        self.log(47.2, query='laptop', processing_time=3.0)
+        self.log(48.2, search_type='ai')  # Edge hour of the last day
+        self.log(49, search_type='ai')  # After the range
+        rollup_search_logs(batch_size=2)
+        self.log(30, query='laptop', search_type='tag', processing_time=5.0)  # Not rolled up yet
+
+        summary = search_summary(self.day + timedelta(hours=10), self.day + timedelta(hours=48.5))
+        self.assertEqual(summary['total_searches'], 5)
+        self.assertEqual(
+            {item['search_type']: item['count'] for item in summary['search_types']},
+            {'ai': 2, 'keyword': 2, 'tag': 1}
+        )
+        self.assertEqual(
+            {item['search_type']: item['avg_time'] for item in summary['average_processing_times']},
+            {'ai': 1.5, 'keyword': 2.0, 'tag': 5.0}
+        )
+        # Queries are rolled up per day, so the edge days count whole; the
+        # rows past the watermark are left out
+        self.assertEqual(summary['popular_queries'], [{'query': 'phone', 'count': 4}, {'query': 'laptop', 'count': 2}])
+
+
+class AISearchStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        patcher = mock.patch.object(
+            gpt_ai_search_service, 'keyword_search_fallback', return_value=[{'id': 1, 'name': 'Phone'}]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search_products(self, **kwargs):
+        self.release.wait(5)
+        return {
+            'results': [{'id': 2, 'name': 'Smartphone', 'match_score': 0.9}],
+            'total_count': 1, 'search_method': 'gpt4o', 'relevant_tags': ['phone'], 'response_time_ms': 12,
+        }
+
+    def stream(self, query='phone'):
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        response = APIClient().post('/api/search/ai/stream/', {'query': query}, format='json', secure=True)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return (json.loads(line) for line in response.streaming_content)
+
+    def test_keyword_results_come_before_the_ai_answer(self):
+        with mock.patch.object(gpt_ai_search_service, 'search_products', side_effect=self.search_products):
+            frames = self.stream()
+            keyword = next(frames)
+            self.assertEqual((keyword['type'], keyword['stage']), ('results', 'keyword'))
+            self.assertEqual([product['name'] for product in keyword['results']], ['Phone'])
+
+            self.release.set()
+            ai, done = list(frames)
+        self.assertEqual((ai['stage'], ai['search_type'], ai['extracted_tags']), ('ai', 'gpt4o', ['phone']))
+        self.assertEqual([product['name'] for product in ai['results']], ['Smartphone'])
+        self.assertEqual(done['type'], 'done')
+        self.assertEqual(done['timings']['ai_search_ms'], 12)
+
+    @override_settings(AI_SEARCH_STREAM_TIMEOUT=0.1)
+    def test_slow_ai_stage_ends_with_an_error_frame(self):
+        with mock.patch.object(gpt_ai_search_service, 'search_products', side_effect=self.search_products):
+            frames = list(self.stream())
+            self.release.set()
+        self.assertEqual([frame['type'] for frame in frames], ['results', 'error', 'done'])
+        self.assertEqual(frames[1]['message'], 'AI search timed out')
+
+    def test_query_is_required(self):
+        response = APIClient().post('/api/search/ai/stream/', {'query': ' '}, format='json', secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class ChangeCursorTests(TransactionTestCase):
+    def test_reads_entries_that_commit_out_of_order(self):
+        cursor = ChangeCursor()
+        cursor.start()
+        self.assertEqual(cursor.read(), (set(), False))
+
+        for product_id in (1, 2, 3):
+            record_product_changes([product_id])
+        first, late, last = ProductChange.objects.order_by('id')
+        # The middle entry's transaction has not committed yet
+        late.delete()
+        self.assertEqual(cursor.read(), ({1, 3}, False))
+
+        ProductChange.objects.create(id=late.id, product_id=2)
+        self.assertEqual(cursor.read(), ({2}, False))
+        self.assertEqual(cursor.read(), (set(), False))
+
+    def test_unstarted_cursor_asks_for_a_rebuild(self):
+        self.assertEqual(ChangeCursor().read(), (set(), True))
+
+
+@skipIf(product_matrix.np is None, 'NumPy is not installed')
+class ProductMatrixTests(TransactionTestCase):
+    def setUp(self):
+        from ai_search import catalog
+        catalog._snapshot = None
+        product_matrix._matrix = None
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.phone = VendorProduct.objects.create(vendor=vendor, name='Phone', tags='android', price=1, stock=5)
+
+    def tag_matches(self, tag):
+        matrix = product_matrix.get_product_matrix()
+        return [product_id for row, product_id, score in matrix.top(matrix.tag_mask(tag).astype(float), 10)]
+
+    def test_follows_changes_logged_by_other_processes(self):
+        self.assertEqual(self.tag_matches('android'), [self.phone.pk])
+        VendorProduct.objects.filter(pk=self.phone.pk).update(stock=0)
+        record_product_changes([self.phone.pk])
+        self.assertEqual(self.tag_matches('android'), [])
+
+    def test_ignores_rolled_back_saves(self):
+        self.assertEqual(self.tag_matches('android'), [self.phone.pk])
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.phone.tags = 'ios'
+            self.phone.save()
+            raise RuntimeError
+        self.assertEqual(self.tag_matches('android'), [self.phone.pk])
+        self.assertEqual(self.tag_matches('ios'), [])
+
+        self.phone.save()
+        self.assertEqual(self.tag_matches('android'), [])
+        self.assertEqual(self.tag_matches('ios'), [self.phone.pk])
+
+
+class TypeaheadIndexTests(TransactionTestCase):
+    def setUp(self):
+        typeahead._index = None
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.product = VendorProduct.objects.create(vendor=vendor, name='Galaxy Phone', price=1, stock=5)
+
+    def suggestions(self, prefix):
+        return [text for weight, text, kind in typeahead.get_typeahead_index().complete(prefix)]
+
+    def test_follows_renames_and_deletes_logged_by_other_processes(self):
+        self.assertEqual(self.suggestions('gal'), ['Galaxy Phone'])
+
+        VendorProduct.objects.filter(pk=self.product.pk).update(name='Pixel Phone')
+        record_product_changes([self.product.pk])
+        self.assertEqual(self.suggestions('gal'), [])
+        self.assertEqual(self.suggestions('pix'), ['Pixel Phone'])
+
+        VendorProduct.objects.filter(pk=self.product.pk).delete()
+        self.assertEqual(self.suggestions('pix'), [])
+
+
+class FuzzyIndexTests(TransactionTestCase):
+    def setUp(self):
+        fuzzy._index = None
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.product = VendorProduct.objects.create(vendor=vendor, name='Sneakers', price=1, stock=5)
+
+    def matches(self, query):
+        return [product_id for product_id, score in fuzzy.get_fuzzy_index().match(query)]
+
+    def test_follows_changes_logged_by_other_processes(self):
+        self.assertEqual(self.matches('sneekers'), [self.product.pk])
+
+        VendorProduct.objects.filter(pk=self.product.pk).update(name='Sandals')
+        record_product_changes([self.product.pk])
+        self.assertEqual(self.matches('sneekers'), [])
+        self.assertEqual(self.matches('sandels'), [self.product.pk])
+
+        VendorProduct.objects.filter(pk=self.product.pk).update(stock=0)
+        record_product_changes([self.product.pk])
+        self.assertEqual(self.matches('sandels'), [])
+
+
+class SQLiteFTSRankTests(TransactionTestCase):
+    def setUp(self):
+        self.backend = SQLiteFTSSearchBackend()
+        if not self.backend.is_available():
+            self.skipTest('SQLite FTS5 index not installed')
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        VendorProduct.objects.bulk_create([
+            VendorProduct(vendor=vendor, name=name, brand=brand, description=description, price=1, stock=stock)
+            for name, brand, description, stock in [
+                ('Phone case', 'Acme', 'Slim case for your phone', 5),
+                ('Smart phone', 'Phonix', 'Android phone', 5),
+                ('Phone charger', '', 'Charges any phone quickly', 5),
+                ('Laptop', 'Acme', 'Comes with a phone app', 5),
+                ('Old phone', '', '', 0),
+            ]
+        ])
+        self.products = VendorProduct.objects.filter(stock__gt=0)
+
+    def test_rank_matches_the_database_ordering(self):
+        """The one-pass top-k gives the same pages as ordering the annotated queryset"""
+        expected, total = BaseSearchBackend.rank(self.backend, self.products, 'phone')
+        self.assertEqual(total, 4)
+        self.assertEqual(self.backend.rank(self.products, 'phone'), (expected, 4))
+
+        top, total = self.backend.rank(self.products, 'phone', limit=2, with_total=False)
+        self.assertEqual((top, total), (expected[:2], None))
+        after = (top[-1][1], top[-1][0])
+        self.assertEqual(self.backend.rank(self.products, 'phone', limit=2, after=after)[0], expected[2:])
+
+    def test_triggers_follow_inserts_updates_and_deletes(self):
+        def matching(query):
+            return set(self.backend.filter(VendorProduct.objects.all(), query).values_list('name', flat=True))
+
+        self.assertEqual(matching('charger'), {'Phone charger'})
+        VendorProduct.objects.filter(name='Phone charger').update(name='Phone dock')
+        self.assertEqual(matching('charger'), set())
+        self.assertEqual(matching('dock'), {'Phone dock'})
+        VendorProduct.objects.filter(name='Phone dock').delete()
+        self.assertEqual(matching('dock'), set())
+
+    def test_rank_of_nothing(self):
+        self.assertEqual(self.backend.rank(self.products.none(), 'phone'), ([], 0))
+        self.assertEqual(self.backend.rank(self.products, '!!'), ([], 0))
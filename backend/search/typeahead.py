@@ -0,0 +1,319 @@
+"""
+In-memory typeahead over product names, brands, category names and popular
+search queries.
+
+Suggestions live in a compressed prefix (radix) trie. Every node keeps the
+top completions of its subtree, so a lookup only walks the characters of
+the typed prefix and never visits the subtree below it. The trie is built
+per process from the database and rebuilt every TYPEAHEAD_REBUILD_INTERVAL
+seconds to pick up category weights and popular queries. In between, the
+product changes made by any process are read from the shared change log
+(search.changes) on every lookup and patched in place; a logged rebuild
+request (a renamed category) rebuilds it.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from .changes import ChangeCursor
+
+logger = logging.getLogger(__name__)
+
+MAX_COMPLETIONS = 15  # Completions precomputed per trie node
+MAX_KEY_LENGTH = 100
+POPULAR_QUERY_DAYS = 30
+INCREMENTAL_MAX_PRODUCTS = 500  # More changed products than this are cheaper to rebuild
+
+
+def normalize(text):
+    """Trie key of a suggestion or typed prefix: lowercase, single spaces"""
+    return ' '.join((text or '').lower().split())[:MAX_KEY_LENGTH]
+
+
+def _rank(suggestion):
+    # (weight, text, kind) tuples; heaviest first, then alphabetical
+    return (-suggestion[0], suggestion[1])
+
+
+class _Node:
+    __slots__ = ('edges', 'entry', 'best')
+
+    def __init__(self):
+        self.edges = {}   # first character -> (label, child node)
+        self.entry = None  # (weight, text, kind) when a suggestion ends here
+        self.best = []     # Top completions in this subtree, best first
+
+    def refresh(self):
+        candidates = [self.entry] if self.entry else []
+        for label, child in self.edges.values():
+            candidates.extend(child.best)
+        self.best = heapq.nsmallest(MAX_COMPLETIONS, candidates, key=_rank)
+
+
+class RadixTrie:
+    """Compressed prefix trie with precomputed top-k completions per node"""
+
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    def set(self, key, suggestion, refresh=True):
+        """Store (weight, text, kind) under key; refresh=False defers finalize()"""
+        path = self._insert_path(key)
+        if path[-1].entry is None:
+            self.size += 1
+        path[-1].entry = suggestion
+        if refresh:
+            for node in reversed(path):
+                node.refresh()
+
+    def remove(self, key):
+        node = self.root
+        path = [(None, None, node)]
+        position = 0
+        while position < len(key):
+            edge = node.edges.get(key[position])
+            if edge is None or not key.startswith(edge[0], position):
+                return
+            path.append((node, key[position], edge[1]))
+            node = edge[1]
+            position += len(edge[0])
+        if node.entry is None:
+            return
+        node.entry = None
+        self.size -= 1
+
+        # Prune empty nodes and merge pass-through nodes back into one edge
+        for index in range(len(path) - 1, 0, -1):
+            parent, char, current = path[index]
+            if current.entry is not None:
+                continue
+            if not current.edges:
+                del parent.edges[char]
+            elif len(current.edges) == 1:
+                label = parent.edges[char][0]
+                (child_label, child), = current.edges.values()
+                parent.edges[char] = (label + child_label, child)
+        for parent, char, current in reversed(path):
+            current.refresh()
+
+    def finalize(self):
+        """Compute every node's completions after bulk set(..., refresh=False)"""
+        stack = [(self.root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                node.refresh()
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for label, child in node.edges.values())
+
+    def complete(self, prefix, limit=MAX_COMPLETIONS):
+        """Best completions of prefix as (weight, text, kind) tuples"""
+        node = self.root
+        position = 0
+        while position < len(prefix):
+            edge = node.edges.get(prefix[position])
+            if edge is None:
+                return []
+            label, child = edge
+            remaining = prefix[position:]
+            if remaining.startswith(label):
+                position += len(label)
+            elif not label.startswith(remaining):
+                return []
+            else:
+                position = len(prefix)
+            node = child
+        return node.best[:limit]
+
+    def _insert_path(self, key):
+        node = self.root
+        path = [node]
+        position = 0
+        while position < len(key):
+            char = key[position]
+            edge = node.edges.get(char)
+            if edge is None:
+                child = _Node()
+                node.edges[char] = (key[position:], child)
+                path.append(child)
+                return path
+            label, child = edge
+            common = 0
+            limit = min(len(label), len(key) - position)
+            while common < limit and label[common] == key[position + common]:
+                common += 1
+            if common < len(label):
+                # Split the edge at the end of the shared part
+                middle = _Node()
+                middle.edges[label[common]] = (label[common:], child)
+                middle.best = list(child.best)
+                node.edges[char] = (label[:common], middle)
+                child = middle
+            position += common
+            node = child
+            path.append(node)
+        return path
+
+
+class TypeaheadIndex:
+    """
+    Suggestion weights by source, folded into a RadixTrie.
+
+    A key can be contributed by several sources (a brand shared by many
+    products, a product name that is also a popular query); its weight is
+    the sum and its type the one of the largest contribution.
+    """
+
+    def __init__(self):
+        self.trie = RadixTrie()
+        self.built_at = None
+        self._contributions = {}  # key -> {source: (weight, text, kind)}
+        self._product_keys = {}   # product id -> keys it contributes to
+        self._lock = threading.RLock()
+
+    def build(self):
+        from vendors.models import VendorProduct
+        from categories.models import Category
+        from .models import SearchLog
+
+        with self._lock:
+            self._contributions = {}
+            self._product_keys = {}
+
+            products = VendorProduct.objects.filter(stock__gt=0).values_list('id', 'name', 'brand', 'rating')
+            for product_id, name, brand, rating in products.iterator(chunk_size=2000):
+                self._add_product(product_id, name, brand, rating)
+
+            # Category weight is the number of in-stock products in its subtree
+            direct_counts = dict(
+                VendorProduct.objects.filter(stock__gt=0).values_list('category_id')
+                .annotate(count=Count('id')).values_list('category_id', 'count')
+            )
+            categories = list(Category.objects.values_list('id', 'name', 'parent_category_id'))
+            subtree_counts = Counter()
+            parents = {category_id: parent_id for category_id, name, parent_id in categories}
+            for category_id, count in direct_counts.items():
+                seen = set()
+                while category_id is not None and category_id not in seen:
+                    seen.add(category_id)
+                    subtree_counts[category_id] += count
+                    category_id = parents.get(category_id)
+            for category_id, name, parent_id in categories:
+                self._contribute(('category', category_id), name, 'category', float(subtree_counts[category_id]))
+
+            popular_queries = SearchLog.objects.filter(
+                created_at__gte=timezone.now() - timezone.timedelta(days=POPULAR_QUERY_DAYS)
+            ).values('query').annotate(count=Count('id')).filter(count__gt=1)
+            for item in popular_queries:
+                self._contribute(('query', normalize(item['query'])), item['query'], 'popular_search', float(item['count']))
+
+            trie = RadixTrie()
+            for key in self._contributions:
+                suggestion = self._suggestion(key)
+                if suggestion:
+                    trie.set(key, suggestion, refresh=False)
+            trie.finalize()
+            self.trie = trie
+            self.built_at = time.monotonic()
+        logger.info(f"Typeahead index built with {trie.size} suggestions")
+
+    def complete(self, prefix, limit=MAX_COMPLETIONS):
+        key = normalize(prefix)
+        return self.trie.complete(key, limit) if key else self.trie.root.best[:limit]
+
+    def apply_changes(self, product_ids):
+        """Re-read the given products; deleted and out of stock ones are removed"""
+        from vendors.models import VendorProduct
+
+        rows = VendorProduct.objects.filter(id__in=list(product_ids), stock__gt=0).values_list(
+            'id', 'name', 'brand', 'rating'
+        )
+        listed = {row[0]: row for row in rows}
+        with self._lock:
+            keys = set()
+            for product_id in product_ids:
+                keys |= self._remove_product_contributions(product_id)
+                if product_id in listed:
+                    keys |= self._add_product(*listed[product_id])
+            for key in keys:
+                self._refresh_key(key)
+
+    def _add_product(self, product_id, name, brand, rating):
+        keys = set()
+        if name:
+            keys.add(self._contribute(('product', product_id), name, 'product', 1.0 + float(rating or 0)))
+        if brand:
+            keys.add(self._contribute(('brand', product_id), brand, 'brand', 1.0))
+        keys.discard(None)
+        self._product_keys[product_id] = keys
+        return set(keys)
+
+    def _remove_product_contributions(self, product_id):
+        keys = self._product_keys.pop(product_id, set())
+        for key in keys:
+            contributions = self._contributions.get(key, {})
+            contributions.pop(('product', product_id), None)
+            contributions.pop(('brand', product_id), None)
+            if not contributions:
+                self._contributions.pop(key, None)
+        return set(keys)
+
+    def _contribute(self, source, text, kind, weight):
+        key = normalize(text)
+        if not key or weight <= 0:
+            return None
+        self._contributions.setdefault(key, {})[source] = (weight, text.strip(), kind)
+        return key
+
+    def _suggestion(self, key):
+        contributions = self._contributions.get(key)
+        if not contributions:
+            return None
+        weight, text, kind = max(contributions.values())
+        return (sum(item[0] for item in contributions.values()), text, kind)
+
+    def _refresh_key(self, key):
+        suggestion = self._suggestion(key)
+        if suggestion:
+            self.trie.set(key, suggestion)
+        else:
+            self.trie.remove(key)
+
+
+_index = None
+_index_lock = threading.Lock()
+_changes = ChangeCursor()
+
+
+def get_typeahead_index():
+    """
+    The process-wide index with the product changes logged by any process
+    applied, (re)built when missing, asked for or older than the rebuild interval
+    """
+    global _index
+    interval = getattr(settings, 'TYPEAHEAD_REBUILD_INTERVAL', 600)
+    with _index_lock:
+        product_ids, rebuild = _changes.read()
+        if (
+            _index is None or rebuild or time.monotonic() - _index.built_at > interval
+            or len(product_ids) > INCREMENTAL_MAX_PRODUCTS
+        ):
+            _changes.start()
+            fresh = TypeaheadIndex()
+            fresh.build()
+            _index = fresh
+        elif product_ids:
+            try:
+                _index.apply_changes(product_ids)
+            except Exception:
+                # The cursor has moved past these changes; rebuild on the next read
+                _changes.reset()
+                raise
+        return _index
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.regular_search, name='regular_search'),  # GET /api/search/?q=query
     path('ai/', views.ai_search, name='ai_search'),
+    path('ai/stream/', views.ai_search_stream, name='ai_search_stream'),  # POST, NDJSON frames
     path('suggestions/', views.search_suggestions, name='search_suggestions'),
+    path('typeahead/', views.typeahead, name='typeahead'),  # GET /api/search/typeahead/?q=prefix
     path('analytics/', views.search_analytics, name='search_analytics'),
 ]
@@ -2,10 +2,13 @@ import json
 import time
 import re
 import logging
+from concurrent.futures import TimeoutError as FutureTimeout
 from decimal import Decimal
 from django.shortcuts import render
-from django.db import models
-from django.db.models import Q, Case, When, FloatField, Value
+from django.conf import settings
+from django.db import close_old_connections, models
+from django.http import StreamingHttpResponse
+from django.db.models import Q, FloatField, Value
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
@@ -14,14 +17,39 @@ from rest_framework.response import Response
 from vendors.models import VendorProduct
 from vendors.serializers import ProductListSerializer
 from .models import SearchLog, SearchResult
+from .backends import get_search_backend
+from .facets import compute_facets, wants_facets
+from .fuzzy import widen_with_fuzzy_matches, with_fuzzy_matches
+from .logsink import get_search_log_sink, log_search
+from .matrix import get_product_matrix, np
+from .result_cache import (
+    fetch_in_order, get_cached_result, result_cache_key, result_cache_stats, set_cached_result
+)
+from .rollups import parse_range_bound, search_summary
+from .typeahead import MAX_COMPLETIONS, get_typeahead_index
+from utils.conditional import catalog_conditional_get
+from utils.pagination import (
+    InvalidCursor, count_results, decode_cursor, encode_cursor, keyset_page, wants_cursor_pagination
+)
 from ai_search.gpt_service import gpt_ai_search_service
-import requests
+from ai_search.llm_cache import cached_llm_call, get_llm_cache
+from ai_search.llm_client import LLMUnavailable, get_llm_client
+from ai_search.models import ProductTagAssociation
+from ai_search.tags import tag_ids_matching
 
 logger = logging.getLogger(__name__)
 
 # Configuration for Ollama
-OLLAMA_URL = "http://localhost:11434/api/generate"
-OLLAMA_MODEL = "gemma:7b"
+OLLAMA_URL = getattr(settings, 'OLLAMA_API_URL', "http://localhost:11434/api/generate")
+OLLAMA_MODEL = getattr(settings, 'OLLAMA_MODEL', "gemma:7b")
+
+# Keyset sort keys for cursor pagination of regular_search (relevance uses the ranking stage)
+CURSOR_SORT_KEYS = {
+    'price_low': 'price',
+    'price_high': '-price',
+    'rating': '-rating',
+    'newest': '-id',
+}
 
 # Predefined tags for fallback
 DEFAULT_PRODUCT_TAGS = [
@@ -70,34 +98,28 @@ DEFAULT_PRODUCT_TAGS = [
 
 def query_ollama(prompt):
     """Query Ollama AI model and return the response"""
-    try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.3,
-                "max_tokens": 200
-            }
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": False,
+        "options": {
+            "temperature": 0.3,
+            "max_tokens": 200
         }
-        
-        response = requests.post(OLLAMA_URL, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', '').strip()
-        else:
-            logger.error(f"Ollama API error: {response.status_code} - {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ollama connection error: {str(e)}")
-        return None
-    except Exception as e:
+    }
+    try:
+        result = get_llm_client().post_json('ollama', OLLAMA_URL, payload)
+    except LLMUnavailable as e:
         logger.error(f"Ollama query error: {str(e)}")
         return None
+    return result.get('response', '').strip()
 
 def extract_tags_with_ai(query):
-    """Use AI to extract relevant tags from search query"""
+    """Use AI to extract relevant tags from search query (cached, one call per query at a time)"""
+    tags = cached_llm_call(f'ollama_extract:{OLLAMA_MODEL}', query, lambda: _extract_tags_with_ollama(query))
+    return list(tags or [])
+
+def _extract_tags_with_ollama(query):
     prompt = f"""
     Analyze this product search query and extract relevant product tags or keywords that would help find products in an e-commerce store.
 
@@ -166,10 +188,14 @@ def search_products_by_tags(tags, limit=20):
     if not tags:
         return VendorProduct.objects.none(), {}
     
-    # Build Q objects for tag matching
-    tag_queries = []
+    matrix = get_product_matrix()
+    if matrix is not None:
+        return _search_products_by_tags_vectorized(matrix, tags, limit)
+    
+    # Build Q objects for tag matching; tags match exactly, through the indexed tag associations
+    tag_ids = tag_ids_matching(tags)
+    tag_queries = [Q(ai_tags__tag_id__in=tag_ids)]
     for tag in tags:
-        tag_queries.append(Q(tags__icontains=tag))
         tag_queries.append(Q(name__icontains=tag))
         tag_queries.append(Q(description__icontains=tag))
         tag_queries.append(Q(brand__icontains=tag))
@@ -186,6 +212,13 @@ def search_products_by_tags(tags, limit=20):
         stock__gt=0  # Only in-stock products
     ).distinct()
     
+    # Lowercased tag names of the candidates carrying any of the tags
+    product_tags = {}
+    for product_id, tag_name in ProductTagAssociation.objects.filter(
+        product__in=products, tag_id__in=tag_ids
+    ).values_list('product_id', 'tag__name'):
+        product_tags.setdefault(product_id, set()).add(tag_name.lower())
+    
     # Calculate relevance scores
     product_scores = {}
     for product in products:
@@ -196,8 +229,8 @@ def search_products_by_tags(tags, limit=20):
         for tag in tags:
             tag_lower = tag.lower()
             
-            # Tag field match (highest weight)
-            if tag_lower in product.tags.lower():
+            # Tag match (highest weight)
+            if tag_lower in product_tags.get(product.id, ()):
                 score += 10
                 matched_tags.append(tag)
             
@@ -241,6 +274,57 @@ def search_products_by_tags(tags, limit=20):
     
     return sorted_products[:limit], product_scores
 
+# Field weights of a tag match in search_products_by_tags
+TAG_FIELD_WEIGHTS = (
+    ('tags', 10),
+    ('name', 8),
+    ('brand', 6),
+    ('description', 3),
+    ('category', 7),
+)
+
+def _search_products_by_tags_vectorized(matrix, tags, limit):
+    """search_products_by_tags over the product term matrix: masks and top-k instead of loops"""
+    scores = np.zeros(matrix.size, dtype=np.float32)
+    tag_masks = []
+    for tag in tags:
+        matched = np.zeros(matrix.size, dtype=bool)
+        for field, weight in TAG_FIELD_WEIGHTS:
+            # Tags match whole tags; the text fields match substrings
+            mask = matrix.tag_mask(tag) if field == 'tags' else matrix.text_mask(field, tag)
+            scores += weight * mask
+            matched |= mask
+        tag_masks.append((tag, matched))
+    
+    # Popularity boosts only apply to products that matched a tag
+    scores += (scores > 0) * (2 * (matrix.rating > 4.0) + 3 * matrix.is_hot)
+    
+    top = matrix.top(scores, limit)
+    products = VendorProduct.objects.select_related('vendor', 'category', 'rating_summary').in_bulk([product_id for row, product_id, score in top])
+    product_scores = {
+        product_id: {
+            'score': score,
+            'matched_tags': [tag for tag, matched in tag_masks if matched[row]]
+        }
+        for row, product_id, score in top
+    }
+    return [products[product_id] for row, product_id, score in top if product_id in products], product_scores
+
+def _ai_result_data(result):
+    """An AI search service result in the format the frontend expects"""
+    return {
+        'id': result.get('id'),
+        'name': result.get('name'),
+        'description': result.get('description', ''),
+        'brand': result.get('brand', ''),
+        'price': result.get('price', 0),
+        'rating': result.get('rating', 0),
+        'vendor_name': result.get('vendor', ''),
+        'category': result.get('category', ''),
+        'match_score': result.get('match_score', 0),
+        'tags': result.get('tags', [])
+    }
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def ai_search(request):
@@ -260,30 +344,16 @@ def ai_search(request):
         
         logger.info(f"AI Search query: '{query}' from IP: {user_ip}")
         
-        # Use the new GPT AI search service
+        # Use the new GPT AI search service ('semantic' searches the local vector index instead)
         search_results = gpt_ai_search_service.search_products(
             query=query,
             user_ip=user_ip,
-            user_agent=user_agent
+            user_agent=user_agent,
+            method=data.get('method')
         )
         
         # Convert results to the expected format for frontend
-        products = []
-        for result in search_results.get('results', []):
-            # Ensure we have the expected fields
-            product_data = {
-                'id': result.get('id'),
-                'name': result.get('name'),
-                'description': result.get('description', ''),
-                'brand': result.get('brand', ''),
-                'price': result.get('price', 0),
-                'rating': result.get('rating', 0),
-                'vendor_name': result.get('vendor', ''),
-                'category': result.get('category', ''),
-                'match_score': result.get('match_score', 0),
-                'tags': result.get('tags', [])
-            }
-            products.append(product_data)
+        products = [_ai_result_data(result) for result in search_results.get('results', [])]
         
         response_data = {
             'query': search_results.get('query', query),
@@ -308,77 +378,168 @@ def ai_search(request):
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _ndjson_frame(data):
+    return json.dumps(data, default=str) + '\n'
+
+def _run_ai_search(query, user_ip, user_agent, method):
+    """The AI search on an LLM client worker thread, which must not keep its DB connection past the call"""
+    try:
+        return gpt_ai_search_service.search_products(
+            query=query, user_ip=user_ip, user_agent=user_agent, method=method
+        )
+    finally:
+        close_old_connections()
+
+def _ai_search_frames(query, user_ip, user_agent, method):
+    """
+    NDJSON frames of a streamed AI search: keyword results at once, the AI
+    results once the LLM has answered, then the timings
+    """
+    start_time = time.time()
+    # Start the slow path first so the LLM works while the keyword results are sent
+    ai_future = get_llm_client().submit(_run_ai_search, query, user_ip, user_agent, method)
+    
+    try:
+        keyword_results = gpt_ai_search_service.keyword_search_fallback(query)
+    except Exception as e:
+        logger.error(f"Streaming AI search keyword stage failed: {str(e)}")
+        keyword_results = []
+    keyword_ms = round((time.time() - start_time) * 1000)
+    yield _ndjson_frame({
+        'type': 'results',
+        'stage': 'keyword',
+        'query': query,
+        'results': [_ai_result_data(result) for result in keyword_results],
+        'results_count': len(keyword_results),
+        'elapsed_ms': keyword_ms
+    })
+    
+    try:
+        search_results = ai_future.result(timeout=getattr(settings, 'AI_SEARCH_STREAM_TIMEOUT', 60))
+    except FutureTimeout:
+        logger.error(f"Streaming AI search for '{query}' timed out")
+        search_results = {'error': 'AI search timed out'}
+    ai_ms = round((time.time() - start_time) * 1000)
+    if search_results.get('error'):
+        yield _ndjson_frame({
+            'type': 'error',
+            'stage': 'ai',
+            'error': 'Search failed',
+            'message': search_results['error']
+        })
+    else:
+        products = [_ai_result_data(result) for result in search_results.get('results', [])]
+        yield _ndjson_frame({
+            'type': 'results',
+            'stage': 'ai',
+            'query': query,
+            'results': products,
+            'results_count': search_results.get('total_count', len(products)),
+            'search_type': search_results.get('search_method', 'gpt4o'),
+            'extracted_tags': search_results.get('relevant_tags', []),
+            'elapsed_ms': ai_ms
+        })
+    
+    yield _ndjson_frame({
+        'type': 'done',
+        'search_type': search_results.get('search_method'),
+        'timings': {
+            'keyword_ms': keyword_ms,
+            'ai_ms': ai_ms,
+            'ai_search_ms': search_results.get('response_time_ms', 0),
+            'total_ms': round((time.time() - start_time) * 1000)
+        }
+    })
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def ai_search_stream(request):
+    """
+    Streaming variant of ai_search: newline-delimited JSON frames, keyword
+    results first, then the AI results, then a final frame with timings
+    """
+    query = request.data.get('query', '').strip()
+    if not query:
+        return Response({
+            'error': 'Search query is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    logger.info(f"Streaming AI Search query: '{query}' from IP: {request.META.get('REMOTE_ADDR')}")
+    response = StreamingHttpResponse(
+        _ai_search_frames(
+            query,
+            request.META.get('REMOTE_ADDR'),
+            request.META.get('HTTP_USER_AGENT', ''),
+            request.data.get('method')
+        ),
+        content_type='application/x-ndjson'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the frames until the stream ends
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def search_suggestions(request):
-    """Get search suggestions based on popular queries and products"""
+    """Get search suggestions based on popular queries, products, brands and categories"""
+    # Popular searches only change when the index is rebuilt, so the version
+    # also rolls over once per rebuild interval
+    interval = getattr(settings, 'TYPEAHEAD_REBUILD_INTERVAL', 600)
+    conditional = catalog_conditional_get(request, 'suggestions', versions=[int(time.time() // interval)])
+    not_modified = conditional.not_modified()
+    if not_modified is not None:
+        return not_modified
     try:
-        # Get popular search terms from logs
-        popular_queries = SearchLog.objects.values('query').annotate(
-            count=models.Count('query')
-        ).filter(
-            count__gt=1,
-            created_at__gte=timezone.now() - timezone.timedelta(days=30)
-        ).order_by('-count')[:10]
-        
-        # Get popular product names and brands
-        popular_products = VendorProduct.objects.filter(
-            stock__gt=0,
-            rating__gte=4.0
-        ).values('name', 'brand').distinct()[:10]
-        
-        # Combine suggestions
+        index = get_typeahead_index()
         suggestions = []
+        for weight, text, kind in index.complete(request.GET.get('q', ''), limit=15):
+            suggestion = {
+                'text': text,
+                'type': kind
+            }
+            if kind == 'popular_search':
+                suggestion['count'] = int(weight)
+            suggestions.append(suggestion)
         
-        # Add popular search queries
-        for item in popular_queries:
-            suggestions.append({
-                'text': item['query'],
-                'type': 'popular_search',
-                'count': item['count']
-            })
-        
-        # Add product-based suggestions
-        for product in popular_products:
-            if product['name']:
-                suggestions.append({
-                    'text': product['name'],
-                    'type': 'product'
-                })
-            if product['brand']:
-                suggestions.append({
-                    'text': product['brand'],
-                    'type': 'brand'
-                })
-        
-        # Add some category suggestions
-        category_suggestions = [
-            'smartphones', 'laptops', 'clothing', 'shoes', 'home decor',
-            'kitchen appliances', 'beauty products', 'sports equipment'
-        ]
-        
-        for category in category_suggestions:
-            suggestions.append({
-                'text': category,
-                'type': 'category'
-            })
+        return conditional.apply(Response({
+            'suggestions': suggestions
+        }, status=status.HTTP_200_OK))
         
-        # Remove duplicates and limit
-        seen = set()
-        unique_suggestions = []
-        for suggestion in suggestions:
-            if suggestion['text'].lower() not in seen:
-                seen.add(suggestion['text'].lower())
-                unique_suggestions.append(suggestion)
-                if len(unique_suggestions) >= 15:
-                    break
+    except Exception as e:
+        logger.error(f"Search suggestions error: {str(e)}")
+        return Response({
+            'error': 'Failed to get suggestions',
+            'suggestions': []
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def typeahead(request):
+    """Top completions for a typed prefix from the in-memory suggestion trie"""
+    prefix = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), MAX_COMPLETIONS)
+    except ValueError:
+        limit = 8
+    
+    try:
+        index = get_typeahead_index()
+        start_time = time.perf_counter()
+        completions = index.complete(prefix, limit=limit)
+        lookup_time = (time.perf_counter() - start_time) * 1000
         
         return Response({
-            'suggestions': unique_suggestions
+            'query': prefix,
+            'suggestions': [
+                {'text': text, 'type': kind, 'weight': round(weight, 2)}
+                for weight, text, kind in completions
+            ],
+            'lookup_time_ms': round(lookup_time, 3)
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
-        logger.error(f"Search suggestions error: {str(e)}")
+        logger.error(f"Typeahead error: {str(e)}")
         return Response({
             'error': 'Failed to get suggestions',
             'suggestions': []
@@ -393,21 +554,20 @@ def search_analytics(request):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
-        # Get analytics data
-        total_searches = SearchLog.objects.count()
-        
-        # Searches by type
-        search_types = SearchLog.objects.values('search_type').annotate(
-            count=models.Count('search_type')
-        ).order_by('-count')
-        
-        # Popular queries
-        popular_queries = SearchLog.objects.values('query').annotate(
-            count=models.Count('query')
-        ).filter(count__gt=1).order_by('-count')[:20]
+        start = parse_range_bound(request.GET.get('start'))
+        end = parse_range_bound(request.GET.get('end'), end_of_day=True)
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # Totals, per-type counts, popular queries and timings come from the
+        # hourly/daily rollups (see the rollup_search_logs command)
+        summary = search_summary(start, end)
         
         # Recent searches
-        recent_searches = SearchLog.objects.select_related('user').order_by('-created_at')[:20]
+        recent_searches = SearchLog.objects.select_related('user').order_by('-id')[:20]
         recent_data = []
         for search in recent_searches:
             recent_data.append({
@@ -419,17 +579,18 @@ def search_analytics(request):
                 'created_at': search.created_at
             })
         
-        # Average processing times by search type
-        avg_times = SearchLog.objects.values('search_type').annotate(
-            avg_time=models.Avg('processing_time')
-        ).order_by('search_type')
-        
         return Response({
-            'total_searches': total_searches,
-            'search_types': search_types,
-            'popular_queries': popular_queries,
+            'total_searches': summary['total_searches'],
+            'search_types': summary['search_types'],
+            'popular_queries': summary['popular_queries'],
             'recent_searches': recent_data,
-            'average_processing_times': avg_times
+            'average_processing_times': summary['average_processing_times'],
+            'range': {'start': start, 'end': end},
+            'rolled_up_through_id': summary['rolled_up_through_id'],
+            'log_sink': get_search_log_sink().stats(),
+            'result_cache': result_cache_stats(),
+            'llm_cache': get_llm_cache().stats(),
+            'llm_backends': get_llm_client().stats()
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -438,6 +599,144 @@ def search_analytics(request):
             'error': 'Failed to get analytics'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _regular_search_products(category):
+    """In-stock products of regular_search, restricted to the category filter"""
+    # Start with active products that have stock
+    products = VendorProduct.objects.filter(
+        stock__gt=0
+    ).select_related('vendor', 'category', 'rating_summary')
+    
+    # Apply category filter - includes all descendant categories
+    if category:
+        from categories.models import Category, CategoryClosure
+        try:
+            # If category is a digit, treat it as ID
+            if category.isdigit():
+                category_obj = Category.objects.get(id=category)
+            else:
+                # If category is a name, find by name and include descendants
+                category_obj = Category.objects.filter(name__icontains=category).first()
+            if category_obj:
+                products = products.filter(category_id__in=CategoryClosure.descendants_of([category_obj.id]))
+            else:
+                # Fallback to original name-based filtering if no exact match
+                products = products.filter(category__name__icontains=category)
+        except Category.DoesNotExist:
+            # Fallback to original name-based filtering
+            products = products.filter(category__name__icontains=category)
+    return products
+
+def _regular_search_facets(query, category):
+    """Facet counts of every regular_search match, not just the page"""
+    products = _regular_search_products(category)
+    if any(len(word.strip()) > 2 for word in query.split()):
+        products = widen_with_fuzzy_matches(products, get_search_backend().filter(products, query), query)
+    return compute_facets(products)
+
+def _regular_search_page(request, query, category, sort_by, page, per_page, use_cursor):
+    """
+    Compute one page of regular_search.
+    Returns (products, total_count, count_is_estimate, next_cursor).
+    """
+    # Split query into words for better matching
+    search_words = [word.strip() for word in query.split() if len(word.strip()) > 2]
+    products = _regular_search_products(category)
+    
+    # Pagination window
+    cursor = request.GET.get('cursor')
+    start_index = (page - 1) * per_page
+    end_index = start_index + per_page
+    next_cursor = None
+    count_is_estimate = False
+    count_strategy = request.GET.get('count')
+    
+    backend = get_search_backend()
+    
+    if search_words and sort_by == 'relevance':
+        # Ranking stage: score the filtered candidates in the index and keep
+        # only the top of them instead of sorting every match
+        if use_cursor:
+            after = None
+            if cursor:
+                position = decode_cursor(cursor)
+                if position.get('o') != 'relevance':
+                    raise InvalidCursor('Cursor does not match the requested sort')
+                after = (position['v'], position['id'])
+            ranked, total_count = backend.rank(
+                products, query, limit=per_page + 1, after=after, with_total=False
+            )
+            if len(ranked) > per_page:
+                ranked = ranked[:per_page]
+                last_id, last_score = ranked[-1]
+                next_cursor = encode_cursor({'o': 'relevance', 'v': last_score, 'id': last_id})
+            elif after is None:
+                # A single page of exact matches; top it up with typo-tolerant ones if too short
+                ranked = with_fuzzy_matches(products, query, ranked)[:per_page]
+        else:
+            ranked, total_count = backend.rank(products, query, limit=end_index, with_total=False)
+            if total_count is None:
+                if len(ranked) < end_index:
+                    # Every match fit in the window, so it is the exact count
+                    total_count = len(ranked)
+                else:
+                    total_count, count_is_estimate = count_results(
+                        backend.filter(products, query), count_strategy,
+                        # The index cannot estimate within a category
+                        estimate=None if category else lambda: backend.estimate_count(query, in_stock_only=True)
+                    )
+            if len(ranked) == total_count:
+                # Every exact match is known; top them up with typo-tolerant ones if too few
+                ranked = with_fuzzy_matches(products, query, ranked)
+                total_count = len(ranked)
+            ranked = ranked[start_index:end_index]
+        page_ids = [product_id for product_id, score in ranked]
+        page_products = products.in_bulk(page_ids)
+        products_page = [page_products[product_id] for product_id in page_ids if product_id in page_products]
+    else:
+        # Match and rank through the configured full-text search backend
+        if search_words:
+            products = widen_with_fuzzy_matches(products, backend.search(products, query), query)
+        else:
+            # No search words, set default relevance
+            products = products.annotate(relevance_score=Value(0.0, output_field=FloatField()))
+        
+        if use_cursor:
+            # Keyset page over (sort key, id): no OFFSET and no COUNT
+            products_page, next_cursor = keyset_page(
+                products, CURSOR_SORT_KEYS.get(sort_by, '-rating'), per_page, cursor
+            )
+            total_count = None
+        else:
+            # Apply sorting
+            if sort_by == 'price_low':
+                products = products.order_by('price')
+            elif sort_by == 'price_high':
+                products = products.order_by('-price')
+            elif sort_by == 'rating':
+                products = products.order_by('-rating', '-relevance_score')
+            elif sort_by == 'newest':
+                products = products.order_by('-id')
+            else:  # relevance (default)
+                products = products.order_by('-relevance_score', '-rating', 'price')
+            
+            # Apply pagination
+            products_page = list(products[start_index:end_index])
+            
+            # A short first page already is the whole result; otherwise
+            # count through the configured count strategy
+            if page == 1 and len(products_page) < per_page:
+                total_count = len(products_page)
+            else:
+                total_count, count_is_estimate = count_results(
+                    products, count_strategy,
+                    estimate=(
+                        (lambda: backend.estimate_count(query, in_stock_only=True))
+                        if search_words and not category else None
+                    )
+                )
+    
+    return products_page, total_count, count_is_estimate, next_cursor
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def regular_search(request):
@@ -462,158 +761,103 @@ def regular_search(request):
         
         logger.info(f"Regular search query: '{query}' category: '{category}' from user: {user or session_key}")
         
-        # Build the search query
-        search_query = Q()
-        
-        # Split query into words for better matching
-        search_words = [word.strip() for word in query.split() if len(word.strip()) > 2]
-        
-        if search_words:
-            # Search in product name (highest priority)
-            name_query = Q()
-            for word in search_words:
-                name_query |= Q(name__icontains=word)
-            
-            # Search in description
-            desc_query = Q()
-            for word in search_words:
-                desc_query |= Q(description__icontains=word)
-            
-            # Search in tags
-            tags_query = Q()
-            for word in search_words:
-                tags_query |= Q(tags__icontains=word)
-            
-            # Search in brand
-            brand_query = Q()
-            for word in search_words:
-                brand_query |= Q(brand__icontains=word)
-            
-            # Combine all search conditions
-            search_query = name_query | desc_query | tags_query | brand_query
-        
-        # Start with active products that have stock
-        products = VendorProduct.objects.filter(
-            stock__gt=0
-        ).select_related('vendor', 'category')
-        
-        # Apply search filter
-        if search_query:
-            products = products.filter(search_query)
-        
-        # Apply category filter - includes all descendant categories
-        if category:
-            from categories.models import Category
-            try:
-                # If category is a digit, treat it as ID
-                if category.isdigit():
-                    category_obj = Category.objects.get(id=category)
-                    descendant_ids = category_obj.get_descendants_and_self()
-                    products = products.filter(category__id__in=descendant_ids)
-                else:
-                    # If category is a name, find by name and include descendants
-                    category_obj = Category.objects.filter(name__icontains=category).first()
-                    if category_obj:
-                        descendant_ids = category_obj.get_descendants_and_self()
-                        products = products.filter(category__id__in=descendant_ids)
-                    else:
-                        # Fallback to original name-based filtering if no exact match
-                        products = products.filter(category__name__icontains=category)
-            except Category.DoesNotExist:
-                # Fallback to original name-based filtering
-                products = products.filter(category__name__icontains=category)
-        
-        # Calculate relevance score for sorting
-        if search_words:
-            # Annotate with relevance score
-            relevance_cases = []
-            
-            for i, word in enumerate(search_words):
-                # Name matches get highest score
-                relevance_cases.append(
-                    When(name__icontains=word, then=Value(10.0 - i))
-                )
-                # Brand matches get medium score  
-                relevance_cases.append(
-                    When(brand__icontains=word, then=Value(7.0 - i))
-                )
-                # Tags matches get medium score
-                relevance_cases.append(
-                    When(tags__icontains=word, then=Value(6.0 - i))
-                )
-                # Description matches get lower score
-                relevance_cases.append(
-                    When(description__icontains=word, then=Value(3.0 - i))
-                )
-            
-            products = products.annotate(
-                relevance_score=Case(
-                    *relevance_cases,
-                    default=Value(0.0),
-                    output_field=FloatField()
-                )
+        # Identical searches are served from the result cache, which keeps only
+        # the page's product ids and is invalidated by any catalog edit
+        use_cursor = wants_cursor_pagination(request)
+        cache_key = result_cache_key(
+            'regular_search',
+            q=query,
+            category=category.lower(),
+            sort=sort_by,
+            page=None if use_cursor else page,
+            per_page=per_page,
+            cursor=request.GET.get('cursor') if use_cursor else None,
+            pagination='cursor' if use_cursor else None,
+            count=request.GET.get('count')
+        )
+        cached_page = get_cached_result(cache_key)
+        if cached_page is not None:
+            products_page = fetch_in_order(
+                VendorProduct.objects.select_related('vendor', 'category', 'rating_summary'), cached_page['ids']
             )
+            total_count = cached_page['total_count']
+            count_is_estimate = cached_page['count_is_estimate']
+            next_cursor = cached_page['next_cursor']
         else:
-            # No search words, set default relevance
-            products = products.annotate(relevance_score=Value(0.0, output_field=FloatField()))
+            products_page, total_count, count_is_estimate, next_cursor = _regular_search_page(
+                request, query, category, sort_by, page, per_page, use_cursor
+            )
+            set_cached_result(cache_key, {
+                'ids': [product.id for product in products_page],
+                'total_count': total_count,
+                'count_is_estimate': count_is_estimate,
+                'next_cursor': next_cursor,
+            })
         
-        # Apply sorting
-        if sort_by == 'price_low':
-            products = products.order_by('price')
-        elif sort_by == 'price_high':
-            products = products.order_by('-price')
-        elif sort_by == 'rating':
-            products = products.order_by('-rating', '-relevance_score')
-        elif sort_by == 'newest':
-            products = products.order_by('-id')
-        else:  # relevance (default)
-            products = products.order_by('-relevance_score', '-rating', 'price')
-        
-        # Get total count before pagination
-        total_count = products.count()
-        
-        # Apply pagination
-        start_index = (page - 1) * per_page
-        end_index = start_index + per_page
-        products_page = products[start_index:end_index]
+        # Facets do not depend on the page or sort, so every page shares one cache entry
+        facets = None
+        if wants_facets(request):
+            facets_key = result_cache_key('regular_search_facets', q=query, category=category.lower())
+            facets = get_cached_result(facets_key)
+            if facets is None:
+                facets = _regular_search_facets(query, category)
+                set_cached_result(facets_key, facets)
         
         # Serialize the products
         serializer = ProductListSerializer(products_page, many=True, context={'request': request})
         
         # Calculate pagination info
-        total_pages = (total_count + per_page - 1) // per_page
-        has_next = page < total_pages
-        has_previous = page > 1
+        if use_cursor:
+            pagination = {
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None,
+                'total_count': total_count,  # Only known when ranking produced it for free
+                'per_page': per_page
+            }
+        else:
+            total_pages = (total_count + per_page - 1) // per_page
+            pagination = {
+                'current_page': page,
+                'total_pages': total_pages,
+                'total_count': total_count,
+                'count_is_estimate': count_is_estimate,
+                'per_page': per_page,
+                'has_next': page < total_pages,
+                'has_previous': page > 1
+            }
         
-        # Log the search
-        SearchLog.objects.create(
+        # Calculate response time
+        response_time = int((time.time() - start_time) * 1000)
+        
+        # Log the search (buffered, written in bulk off the request path)
+        log_search(
+            SearchLog,
             query=query,
             user=user,
             session_key=session_key,
-            results_count=total_count,
+            results_count=total_count if total_count is not None else len(products_page),
+            processing_time=response_time / 1000,
             search_type='regular'
         )
         
-        # Calculate response time
-        response_time = int((time.time() - start_time) * 1000)
-        
-        return Response({
+        response_data = {
             'query': query,
             'category': category,
             'results': serializer.data,
-            'pagination': {
-                'current_page': page,
-                'total_pages': total_pages,
-                'total_count': total_count,
-                'per_page': per_page,
-                'has_next': has_next,
-                'has_previous': has_previous
-            },
+            'pagination': pagination,
             'search_type': 'regular',
             'sort_by': sort_by,
             'response_time_ms': response_time
-        }, status=status.HTTP_200_OK)
+        }
+        if facets is not None:
+            response_data['facets'] = facets
+        
+        return Response(response_data, status=status.HTTP_200_OK)
         
+    except InvalidCursor as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Regular search error: {str(e)}")
         return Response({
@@ -0,0 +1,111 @@
+"""
+Conditional GET for catalog reads.
+
+Catalog data is versioned by generation counters in the database
+(search.generations), which signals bump on every relevant edit:
+
+- the search catalog generation covers products, their vendors, images,
+  reviews and categories;
+- the category tree generation covers categories, their attribute groups
+  and product counts.
+
+An ETag derived from those counters and the request is known after one
+primary key lookup. A client or edge cache that sends it back in
+If-None-Match (or a matching If-Modified-Since) gets a 304 straight away.
+Every worker reads the same counters, so none can validate an ETag that an
+edit handled by another worker has made stale. Any other version mixed into
+an ETag must be just as global, e.g. derived from the clock.
+
+Full responses carry:
+
+- ETag: strong; a hash of the versions, the host, the path with its query
+  string and the Accept header.
+- Last-Modified: the time of the latest bump, when known.
+- Cache-Control: public. Clients revalidate after CATALOG_CACHE_MAX_AGE
+  seconds. Shared caches, such as the Cloudflare edge in front of the API,
+  keep responses for CATALOG_EDGE_MAX_AGE seconds.
+- Surrogate-Key (space separated) and Cache-Tag (Cloudflare's comma
+  separated equivalent). Edge purges by key, e.g. 'categories' or
+  'product-42', then drop exactly the affected responses.
+"""
+import hashlib
+import json
+import math
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+
+class ConditionalGet:
+    """Validators and caching headers of one read, from versions known without querying"""
+
+    def __init__(self, request, versions, surrogate_keys=(), last_modified=None):
+        self.request = request
+        signature = json.dumps(
+            [list(versions), request.get_host(), request.get_full_path(), request.META.get('HTTP_ACCEPT', '')],
+            default=str
+        )
+        self.etag = quote_etag(hashlib.sha1(signature.encode()).hexdigest())
+        # HTTP dates have a one-second resolution
+        self.last_modified = math.ceil(last_modified) if last_modified else None
+        self.surrogate_keys = list(surrogate_keys)
+
+    def not_modified(self):
+        """A 304 response when the client's copy is current, None otherwise"""
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # Weak comparison, as If-None-Match requires
+            etags = parse_etags(if_none_match)
+            matched = '*' in etags or any(etag.removeprefix('W/') == self.etag for etag in etags)
+        else:
+            since = parse_http_date_safe(self.request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            matched = since is not None and self.last_modified is not None and self.last_modified <= since
+        return self.apply(HttpResponseNotModified()) if matched else None
+
+    def apply(self, response):
+        """Add the validators and caching headers to a successful response"""
+        if response.status_code not in (200, 304):
+            return response
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, 'CATALOG_CACHE_MAX_AGE', 0),
+            s_maxage=getattr(settings, 'CATALOG_EDGE_MAX_AGE', 60)
+        )
+        patch_vary_headers(response, ('Accept',))
+        if self.surrogate_keys:
+            response['Surrogate-Key'] = ' '.join(self.surrogate_keys)
+            response['Cache-Tag'] = ','.join(self.surrogate_keys)
+        return response
+
+
+def catalog_conditional_get(request, *surrogate_keys, versions=()):
+    """ConditionalGet of a read of products (and anything else under the search catalog generation)"""
+    from search.generations import get_generation
+    from search.result_cache import GENERATION_NAME
+    generation, last_modified = get_generation(GENERATION_NAME)
+    return ConditionalGet(
+        request,
+        ['catalog', generation, *versions],
+        surrogate_keys=['catalog', *surrogate_keys],
+        last_modified=last_modified
+    )
+
+
+def category_conditional_get(request, *surrogate_keys):
+    """ConditionalGet of a read of the category tree"""
+    from categories.tree import GENERATION_NAME
+    from search.generations import get_generation
+    generation, last_modified = get_generation(GENERATION_NAME)
+    return ConditionalGet(
+        request,
+        ['categories', generation],
+        surrogate_keys=['categories', *surrogate_keys],
+        last_modified=last_modified
+    )
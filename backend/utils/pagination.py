@@ -1,9 +1,25 @@
 """
 Enhanced pagination for skeleton loader support
 """
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import hashlib
+import json
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
 from rest_framework.response import Response
-from collections import OrderDict
+from rest_framework.utils.urls import replace_query_param
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
 
 
 class SkeletonAwarePagination(PageNumberPagination):
@@ -18,7 +34,7 @@ class SkeletonAwarePagination(PageNumberPagination):
         """
         Return a paginated response with additional metadata for skeleton loaders
         """
-        return Response(OrderDict([
+        return Response(OrderedDict([
             ('count', self.page.paginator.count),
             ('next', self.get_next_link()),
             ('previous', self.get_previous_link()),
@@ -139,7 +155,7 @@ class CategoryAwarePagination(PageNumberPagination):
         """
         Include category metadata for skeleton loaders
         """
-        response_data = OrderDict([
+        response_data = OrderedDict([
             ('count', self.page.paginator.count),
             ('next', self.get_next_link()),
             ('previous', self.get_previous_link()),
@@ -152,3 +168,297 @@ class CategoryAwarePagination(PageNumberPagination):
         ])
         
         return Response(response_data)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded or does not fit the request"""
+    pass
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping the microseconds of datetimes and times, which it cuts to milliseconds"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(position):
+    """Encode a keyset position dict as an opaque URL-safe token"""
+    # Sort keys are stored at full precision: a truncated one would skip the
+    # rows sharing its millisecond on the next page
+    payload = json.dumps(position, cls=CursorJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(position, dict) or 'id' not in position or 'v' not in position:
+        raise InvalidCursor('Invalid cursor')
+    return position
+
+
+def wants_cursor_pagination(request):
+    """Cursor mode is opted into with ?pagination=cursor or by sending a cursor"""
+    params = getattr(request, 'query_params', request.GET)
+    return params.get('pagination') == 'cursor' or 'cursor' in params
+
+
+def keyset_page(queryset, ordering, page_size, cursor=None):
+    """
+    Return (items, next_cursor) for one page of a keyset-paginated queryset.
+
+    Rows are ordered by (ordering, id) in the same direction and the cursor
+    stores the last row's (sort key, id), so every page is a bounded index
+    range scan: no OFFSET and no COUNT, whatever the depth.
+    """
+    field = ordering.lstrip('-')
+    descending = ordering.startswith('-')
+    lookup = 'lt' if descending else 'gt'
+    queryset = queryset.order_by(ordering, '-id' if descending else 'id')
+
+    if cursor:
+        position = decode_cursor(cursor)
+        if position.get('o') != ordering:
+            raise InvalidCursor('Cursor does not match the requested ordering')
+        value, last_id = position['v'], position['id']
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': last_id})
+        )
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor({'o': ordering, 'v': getattr(last, field), 'id': last.pk})
+    return items, next_cursor
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Constant-cost cursor pagination over (sort key, id) for infinite scroll.
+    The sort key is the queryset's first ordering field.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    default_ordering = '-created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_used = self.get_page_size(request)
+        try:
+            items, self.next_cursor = keyset_page(
+                queryset,
+                self.get_ordering(queryset),
+                self.page_size_used,
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return items
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        order_by = queryset.query.order_by
+        if order_by and isinstance(order_by[0], str):
+            return order_by[0]
+        return self.default_ordering
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('next_cursor', self.next_cursor),
+            ('has_next', self.next_cursor is not None),
+            ('page_size', self.page_size_used),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'has_next': {'type': 'boolean'},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+# Result count strategies for listings: an exact COUNT(*) on every request,
+# an exact count cached per filter signature for a short TTL, or an estimate
+# from the search index / query planner that avoids the COUNT entirely. When
+# neither can estimate (e.g. a plain listing on SQLite), the estimate is an
+# exact count remembered per filter signature for a longer TTL
+COUNT_EXACT = 'exact'
+COUNT_CACHED = 'cached'
+COUNT_ESTIMATE = 'estimate'
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_CACHED, COUNT_ESTIMATE)
+
+
+def get_count_strategy(requested=None, default=None):
+    """The requested strategy if valid, else the view's or the project default"""
+    if requested in COUNT_STRATEGIES:
+        return requested
+    return default or getattr(settings, 'LISTING_COUNT_STRATEGY', COUNT_CACHED)
+
+
+def count_signature(queryset):
+    """Stable cache key for the filters of a queryset, ordering ignored"""
+    query = queryset.order_by().query
+    sql, params = query.sql_with_params()
+    raw = f'{queryset.db}:{queryset.model._meta.label}:{sql}:{params!r}'
+    return 'listing_count:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def planner_estimate(queryset):
+    """Row estimate of the PostgreSQL planner for the queryset, None elsewhere"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_results(queryset, strategy=None, estimate=None):
+    """
+    Return (count, count_is_estimate) for a queryset.
+
+    estimate is an optional callable giving a cheap approximate count (e.g.
+    from the search index); the estimate strategy tries it, then the planner,
+    then an exact count kept for LISTING_COUNT_ESTIMATE_TIMEOUT seconds
+    whatever changes in between, flagged as an estimate once it is reused.
+    """
+    strategy = get_count_strategy(strategy)
+    if queryset.query.is_empty():
+        return 0, False
+
+    if strategy == COUNT_ESTIMATE:
+        for estimator in (estimate, lambda: planner_estimate(queryset)):
+            if estimator is None:
+                continue
+            try:
+                approximate = estimator()
+            except Exception as e:
+                logger.warning(f"Count estimate failed, using exact count: {e}")
+                continue
+            if approximate is not None:
+                return max(int(approximate), 0), True
+        key = count_signature(queryset) + ':estimate'
+        count = cache.get(key)
+        if count is not None:
+            return count, True
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, 'LISTING_COUNT_ESTIMATE_TIMEOUT', 900))
+        return count, False
+
+    if strategy == COUNT_CACHED:
+        key = count_signature(queryset)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, getattr(settings, 'LISTING_COUNT_CACHE_TIMEOUT', 60))
+        return count, False
+
+    return queryset.count(), False
+
+
+class CountStrategyPaginator(Paginator):
+    """Django paginator whose count comes from count_results()"""
+
+    def __init__(self, *args, count_strategy=None, estimate=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_strategy = count_strategy
+        self.estimate = estimate
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimate = count_results(self.object_list, self.count_strategy, self.estimate)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # An estimated count may be short; let the page itself come back empty
+            if self.count_is_estimate and int(number) >= 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        # Paginator.page() would cut the slice at the estimated count
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class CountStrategyPagination(PageNumberPagination):
+    """
+    Page-number pagination with a configurable count strategy, selectable
+    per request with ?count=exact|cached|estimate
+    """
+    count_strategy = None  # None means settings.LISTING_COUNT_STRATEGY
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_strategy_used = get_count_strategy(
+            request.query_params.get(self.count_query_param), self.count_strategy
+        )
+        # Views may offer a cheap estimate of the queryset's count with estimate_count(queryset)
+        estimate_count = getattr(view, 'estimate_count', None)
+        self.count_estimate = (lambda: estimate_count(queryset)) if estimate_count else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        return CountStrategyPaginator(
+            object_list, per_page, count_strategy=self.count_strategy_used, estimate=self.count_estimate
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_estimate', self.page.paginator.count_is_estimate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimate'] = {'type': 'boolean'}
+        return response_schema
@@ -0,0 +1,380 @@
+"""
+Streaming bulk import and export of vendor products.
+
+Imports read CSV or JSON lines (one object per line) as a stream, so only
+one chunk of PRODUCT_IMPORT_CHUNK_SIZE rows is held in memory at a time.
+Each chunk is:
+
+- validated row by row with ProductImportRowSerializer. A bad row is
+  reported with its line number and skipped, the rest of the file goes on;
+- resolved against maps loaded once per import: categories by id, slug or
+  name, and (when no vendor is given) vendors by id or store name;
+- matched to existing products by id, else by the vendor's sku, in one
+  query;
+- written in a transaction: one bulk_create for the new products, and one
+  bulk_create(update_conflicts=True) on the primary key that rewrites the
+  updated ones (bulk_update where upserts are not supported).
+
+A row with an id or a known sku updates that product, changing only the
+columns it gives. Any other row creates a product. Empty CSV cells count as
+missing columns.
+
+Upserting on (vendor, sku) directly would need a unique constraint that
+existing catalogs do not satisfy: skus may be blank or repeated. The import
+therefore matches rows to products itself, and only upserts on ids.
+
+Bulk writes send no post_save. Each chunk sends products_bulk_saved instead,
+and its receivers reindex the products, write their tags through and
+invalidate the catalog caches once per chunk.
+
+Exports stream a vendor's products from an iterator (a server-side cursor on
+PostgreSQL) in the import's columns, so an export can be edited and
+imported back.
+"""
+import codecs
+import csv
+import json
+import logging
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+COLUMNS = (
+    'id', 'sku', 'name', 'brand', 'price', 'old_price', 'stock', 'description',
+    'category', 'tags', 'is_hot', 'display_order'
+)
+REQUIRED_FOR_NEW = ('name', 'price')
+MAX_REPORTED_ERRORS = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+
+def import_chunk_size():
+    return getattr(settings, 'PRODUCT_IMPORT_CHUNK_SIZE', 1000)
+
+
+def detect_format(name='', content_type=''):
+    """'csv' or 'jsonl' from a file name or content type, None when unknown"""
+    name = (name or '').lower()
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if name.endswith(('.jsonl', '.ndjson')) or content_type in ('application/x-ndjson', 'application/jsonl'):
+        return 'jsonl'
+    if name.endswith('.csv') or content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    return None
+
+
+def read_rows(stream, file_format):
+    """(line number, row, error) for every row of a binary stream of UTF-8 CSV or JSON lines"""
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if file_format == 'jsonl':
+        return _read_jsonl(lines)
+    return _read_csv(lines)
+
+
+def _read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {
+            key.strip(): value
+            for key, value in row.items()
+            if key and isinstance(value, str) and value.strip()
+        }, None
+
+
+def _read_jsonl(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, row, None
+
+
+def _category_map():
+    """{id, slug or lowercase name: category id}; a name shared by several categories maps to None"""
+    from categories.models import Category
+
+    names = {}
+    keys = {}
+    for category_id, slug, name in Category.objects.values_list('id', 'slug', 'name'):
+        keys[str(category_id)] = category_id
+        if slug:
+            keys[slug.lower()] = category_id
+        name = ' '.join(name.split()).lower()
+        names[name] = None if names.get(name, category_id) != category_id else category_id
+    # Ids and slugs win over names
+    return {**names, **keys}
+
+
+def _vendor_map():
+    """{id or lowercase store name: vendor id}; a name shared by several vendors maps to None"""
+    from .models import Vendor
+
+    names = {}
+    keys = {}
+    for vendor_id, store_name in Vendor.objects.values_list('id', 'store_name'):
+        keys[str(vendor_id)] = vendor_id
+        name = ' '.join((store_name or '').split()).lower()
+        if name:
+            names[name] = None if names.get(name, vendor_id) != vendor_id else vendor_id
+    return {**names, **keys}
+
+
+def _resolve(mapping, value, label):
+    """(id, error) of a category or vendor given by id, slug or name"""
+    key = ' '.join(str(value).split()).lower()
+    if key not in mapping:
+        return None, f'Unknown {label} "{value}".'
+    if mapping[key] is None:
+        return None, f'Several {label} names match "{value}", give its id instead.'
+    return mapping[key], None
+
+
+class ImportReport:
+    """Counts of an import and the errors of its rejected rows (the first MAX_REPORTED_ERRORS)"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors, sku=''):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({
+                'line': line,
+                'sku': sku,
+                'errors': {field: [str(message) for message in messages] for field, messages in errors.items()},
+            })
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+class ProductImporter:
+    """Creates and updates the products of one vendor, or of the vendor named on each row"""
+
+    def __init__(self, vendor=None, chunk_size=None, dry_run=False):
+        from .serializers import ProductImportRowSerializer
+
+        self.vendor = vendor
+        self.chunk_size = chunk_size or import_chunk_size()
+        self.dry_run = dry_run
+        self.categories = _category_map()
+        self.vendors = None if vendor is not None else _vendor_map()
+        self.report = ImportReport(dry_run)
+        # One serializer validates every row, instead of copying its fields per row
+        self.row_serializer = ProductImportRowSerializer()
+
+    def run(self, rows, stdout=None):
+        """Import (line number, row, error) tuples as read_rows yields them; returns the ImportReport"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+                if stdout:
+                    stdout.write(f'{self.report.rows} rows imported...')
+        if chunk:
+            self._import_chunk(chunk)
+        logger.info(
+            f"Product import{' (dry run)' if self.dry_run else ''}: {self.report.rows} rows, "
+            f"{self.report.created} created, {self.report.updated} updated, {self.report.failed} failed"
+        )
+        return self.report
+
+    def _validate(self, line, data, error):
+        """(vendor id, values) of a valid row; reports the row and returns None otherwise"""
+        from rest_framework.exceptions import ValidationError
+
+        if error:
+            self.report.add_error(line, {'non_field_errors': [error]})
+            return None
+        sku = str(data.get('sku') or '')
+        try:
+            values = dict(self.row_serializer.run_validation(data))
+        except ValidationError as e:
+            self.report.add_error(line, e.detail, sku)
+            return None
+        errors = {}
+
+        vendor = values.pop('vendor', None)
+        if self.vendor is not None:
+            vendor_id = self.vendor.pk
+        elif vendor is None:
+            vendor_id = None
+            errors['vendor'] = ['This field is required when no vendor is given.']
+        else:
+            vendor_id, message = _resolve(self.vendors, vendor, 'vendor')
+            if message:
+                errors['vendor'] = [message]
+
+        if 'category' in values:
+            category = values.pop('category')
+            values['category_id'] = None
+            if category:
+                values['category_id'], message = _resolve(self.categories, category, 'category')
+                if message:
+                    errors['category'] = [message]
+
+        if errors:
+            self.report.add_error(line, errors, sku)
+            return None
+        return vendor_id, values
+
+    def _import_chunk(self, chunk):
+        from .models import VendorProduct
+
+        self.report.rows += len(chunk)
+        valid = []
+        for line, data, error in chunk:
+            validated = self._validate(line, data, error)
+            if validated is not None:
+                valid.append((line, *validated))
+        if not valid:
+            return
+
+        # Existing products of the chunk, by id and by (vendor, sku), in one query
+        ids = {values['id'] for _, _, values in valid if 'id' in values}
+        skus = {values['sku'] for _, _, values in valid if 'id' not in values and values.get('sku')}
+        by_id = {}
+        by_sku = {}
+        existing = VendorProduct.objects.filter(vendor_id__in={vendor_id for _, vendor_id, _ in valid}).filter(
+            Q(id__in=ids) | Q(sku__in=skus)
+        )
+        for product in existing:
+            by_id[product.pk] = product
+            if product.sku:
+                key = (product.vendor_id, product.sku)
+                by_sku[key] = None if key in by_sku else product
+
+        created = []
+        updated = {}
+        update_fields = set()
+        pending = {}  # (vendor id, sku) -> product created earlier in this chunk
+        lines = []
+        for line, vendor_id, values in valid:
+            product_id = values.pop('id', None)
+            sku = values.get('sku') or ''
+            key = (vendor_id, sku)
+            if product_id is not None:
+                product = by_id.get(product_id)
+                if product is None or product.vendor_id != vendor_id:
+                    self.report.add_error(line, {'id': ['No product of the vendor has this id.']}, sku)
+                    continue
+            elif sku and key in pending:
+                product = pending[key]
+            elif sku and key in by_sku:
+                product = by_sku[key]
+                if product is None:
+                    self.report.add_error(
+                        line, {'sku': ['Several products of the vendor have this sku, give their id instead.']}, sku
+                    )
+                    continue
+            else:
+                missing = [field for field in REQUIRED_FOR_NEW if field not in values]
+                if missing:
+                    self.report.add_error(
+                        line, {field: ['This field is required for new products.'] for field in missing}, sku
+                    )
+                    continue
+                product = VendorProduct(vendor_id=vendor_id)
+                created.append(product)
+                if sku:
+                    pending[key] = product
+
+            for field, value in values.items():
+                setattr(product, field, value)
+            if product.pk is not None:
+                updated[product.pk] = product
+                update_fields.update('category' if field == 'category_id' else field for field in values)
+            lines.append(line)
+
+        if not self.dry_run:
+            try:
+                self._save(created, list(updated.values()), update_fields)
+            except DatabaseError as e:
+                logger.error(f"Product import chunk of {len(lines)} rows failed: {e}")
+                for line in lines:
+                    self.report.add_error(line, {'non_field_errors': [f'Not saved: {e}']})
+                return
+        self.report.created += len(created)
+        self.report.updated += len(updated)
+
+    def _save(self, created, updated, update_fields):
+        from .models import VendorProduct
+        from .signals import products_bulk_saved
+
+        with transaction.atomic():
+            saved_ids = []
+            if connection.features.can_return_rows_from_bulk_insert:
+                VendorProduct.objects.bulk_create(created, batch_size=500)
+                saved_ids.extend(product.pk for product in created)
+            else:
+                # Without primary keys back from a bulk insert, save one by one (post_save then does the rest)
+                for product in created:
+                    product.save()
+            if updated and update_fields:
+                if connection.features.supports_update_conflicts_with_target:
+                    # The products are loaded in full, so an upsert on the primary
+                    # key rewrites them without bulk_update's CASE per column
+                    VendorProduct.objects.bulk_create(
+                        updated, batch_size=500,
+                        update_conflicts=True, unique_fields=['id'], update_fields=sorted(update_fields)
+                    )
+                else:
+                    VendorProduct.objects.bulk_update(updated, sorted(update_fields), batch_size=500)
+                saved_ids.extend(product.pk for product in updated)
+            if saved_ids:
+                products_bulk_saved.send(
+                    sender=VendorProduct,
+                    products=list(VendorProduct.objects.filter(pk__in=saved_ids).select_related('category'))
+                )
+
+
+def export_products(vendor, file_format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """Lines of the vendor's products in the import columns, streamed from the database"""
+    from .models import VendorProduct
+
+    rows = VendorProduct.objects.filter(vendor=vendor).order_by('id').values_list(
+        'id', 'sku', 'name', 'brand', 'price', 'old_price', 'stock', 'description',
+        'category_id', 'tags', 'is_hot', 'display_order'
+    ).iterator(chunk_size=chunk_size)
+    if file_format == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(COLUMNS, row)), cls=DjangoJSONEncoder) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+class _Echo:
+    """File-like object whose write returns the line, so csv.writer can feed a generator"""
+
+    def write(self, value):
+        return value
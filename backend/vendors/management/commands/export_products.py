@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from vendors.bulk import FORMATS, detect_format, export_products
+from vendors.models import Vendor
+
+
+class Command(BaseCommand):
+    help = "Export a vendor's products as CSV or JSON lines, in the columns import_products reads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('vendor', help='Id or store name of the vendor')
+        parser.add_argument('--format', choices=FORMATS, help='File format (default: guessed from --output, else csv)')
+        parser.add_argument('--output', default='-', help="File to write, '-' for standard output (default)")
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['vendor']} if options['vendor'].isdigit() else {'store_name': options['vendor']}
+        try:
+            vendor = Vendor.objects.get(**lookup)
+        except (Vendor.DoesNotExist, Vendor.MultipleObjectsReturned):
+            raise CommandError(f"No single vendor matches '{options['vendor']}'")
+
+        path = options['output']
+        file_format = options['format'] or detect_format(path) or 'csv'
+        if path == '-':
+            for line in export_products(vendor, file_format):
+                self.stdout.write(line, ending='')
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            output.writelines(export_products(vendor, file_format))
+        self.stderr.write(self.style.SUCCESS(f"Products of {vendor.store_name} exported to {path}"))
@@ -0,0 +1,55 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from vendors.bulk import FORMATS, ProductImporter, detect_format, read_rows
+from vendors.models import Vendor
+
+
+class Command(BaseCommand):
+    help = 'Create and update vendor products in bulk from a CSV or JSON lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, '-' for standard input")
+        parser.add_argument(
+            '--vendor',
+            help='Id or store name of the vendor owning every row (default: the vendor column of each row)'
+        )
+        parser.add_argument('--format', choices=FORMATS, help='File format (default: guessed from the file name, else csv)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows validated and written per transaction (default: PRODUCT_IMPORT_CHUNK_SIZE)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate the rows without writing anything')
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            lookup = {'pk': options['vendor']} if options['vendor'].isdigit() else {'store_name': options['vendor']}
+            try:
+                vendor = Vendor.objects.get(**lookup)
+            except (Vendor.DoesNotExist, Vendor.MultipleObjectsReturned):
+                raise CommandError(f"No single vendor matches '{options['vendor']}'")
+
+        path = options['path']
+        file_format = options['format'] or detect_format(path) or 'csv'
+        importer = ProductImporter(vendor=vendor, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        if path == '-':
+            report = importer.run(read_rows(sys.stdin.buffer, file_format), stdout=self.stdout)
+        else:
+            try:
+                with open(path, 'rb') as stream:
+                    report = importer.run(read_rows(stream, file_format), stdout=self.stdout)
+            except OSError as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error['line']}: {json.dumps(error['errors'])}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... {report.failed - len(report.errors)} more rows failed')
+        summary = (
+            f"{'Dry run: ' if report.dry_run else ''}{report.rows} rows, {report.created} products created, "
+            f"{report.updated} updated, {report.failed} rows failed"
+        )
+        self.stdout.write(self.style.WARNING(summary) if report.failed else self.style.SUCCESS(summary))
@@ -101,10 +101,12 @@ class VendorProduct(models.Model):
         return total
     
     def get_tags_list(self):
-        """Return tags as a list"""
-        if self.tags:
-            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
-        return []
+        """
+        Return tags as a list, read from the normalized tag associations.
+        Listings prefetch them with ai_search.tags.product_tags_prefetch().
+        """
+        from ai_search.tags import product_tag_names
+        return product_tag_names(self)
     
     def set_tags_from_list(self, tags_list):
         """Set tags from a list of strings"""
@@ -113,20 +115,28 @@ class VendorProduct(models.Model):
         else:
             self.tags = ''
     
+    def get_rating_summary(self):
+        """
+        The product's reviews.ProductRatingSummary, or None before its first
+        review. Listings select_related('rating_summary') to read it without a query.
+        """
+        from django.core.exceptions import ObjectDoesNotExist
+        try:
+            return self.rating_summary
+        except ObjectDoesNotExist:
+            return None
+
     @property
     def average_rating(self):
-        """Calculate average rating from all reviews for this product"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            from django.db.models import Avg
-            avg = reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-            return round(float(avg or 0), 1)
-        return 0.0
+        """Average rating of the product's reviews"""
+        summary = self.get_rating_summary()
+        return summary.average_rating if summary else 0.0
     
     @property
     def review_count(self):
         """Get total number of reviews for this product"""
-        return self.reviews.count()
+        summary = self.get_rating_summary()
+        return summary.review_count if summary else 0
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -347,3 +347,24 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     def get_tags_list(self, obj):
         """Return tags as a list"""
         return obj.get_tags_list()
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    One row of a bulk product import. Every column is optional: updates only
+    change the columns given, new products need at least name and price.
+    category and vendor are resolved by vendors.bulk (id, slug or name).
+    """
+    id = serializers.IntegerField(required=False, min_value=1)
+    sku = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    name = serializers.CharField(max_length=100, required=False)
+    brand = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    old_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False, allow_null=True)
+    stock = serializers.IntegerField(min_value=0, required=False)
+    description = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    category = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    vendor = serializers.CharField(required=False)
+    tags = serializers.CharField(required=False, allow_blank=True)
+    is_hot = serializers.BooleanField(required=False)
+    display_order = serializers.IntegerField(min_value=0, required=False)
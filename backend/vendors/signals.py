@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# Sent (sender=VendorProduct) after products were written with bulk_create or
+# bulk_update, which send no post_save. Receivers bring the state derived
+# from products (search index, tags, caches) up to date in bulk.
+#
+# Arguments: products, the saved products with their category selected.
+products_bulk_saved = Signal()
@@ -1,3 +1,263 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from categories.models import Category
+from utils.pagination import (
+    COUNT_CACHED, COUNT_ESTIMATE, COUNT_EXACT, CountStrategyPaginator, InvalidCursor, count_results, decode_cursor, encode_cursor,
+    keyset_page
+)
+from .bulk import COLUMNS, ProductImporter, export_products, read_rows
+from .models import Vendor, VendorProduct
 
-# Create your tests here.
+
+class KeysetPaginationTests(TransactionTestCase):
+    def test_pages_over_rows_sharing_a_millisecond(self):
+        """Cursors keep microseconds, so no row of the same millisecond is skipped"""
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        base = timezone.now().replace(microsecond=123000)
+        VendorProduct.objects.bulk_create([
+            VendorProduct(
+                vendor=vendor, name=f'Product {i}', price=1,
+                created_at=base + datetime.timedelta(microseconds=i * 10)
+            )
+            for i in range(30)
+        ])
+
+        for ordering in ('-created_at', 'created_at'):
+            seen = []
+            cursor = None
+            while True:
+                items, cursor = keyset_page(VendorProduct.objects.all(), ordering, 7, cursor)
+                seen.extend(product.pk for product in items)
+                if cursor is None:
+                    break
+            self.assertEqual(len(seen), 30)
+            self.assertEqual(set(seen), set(VendorProduct.objects.values_list('id', flat=True)))
+
+    def test_ties_on_the_sort_key_page_in_id_order(self):
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        VendorProduct.objects.bulk_create([
+            VendorProduct(vendor=vendor, name=f'Product {i}', price=i % 3) for i in range(10)
+        ])
+
+        for ordering, tiebreak in (('price', 'id'), ('-price', '-id')):
+            pages = []
+            cursor = None
+            while True:
+                items, cursor = keyset_page(VendorProduct.objects.all(), ordering, 4, cursor)
+                pages.append([product.pk for product in items])
+                if cursor is None:
+                    break
+            expected = list(VendorProduct.objects.order_by(ordering, tiebreak).values_list('id', flat=True))
+            self.assertEqual(pages, [expected[:4], expected[4:8], expected[8:]])
+
+    def test_cursors_round_trip_and_reject_other_orderings(self):
+        position = {'o': '-created_at', 'v': timezone.now(), 'id': 7}
+        decoded = decode_cursor(encode_cursor(position))
+        self.assertEqual(decoded['id'], 7)
+        self.assertEqual(datetime.datetime.fromisoformat(decoded['v']), position['v'])
+
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not a cursor')
+        with self.assertRaises(InvalidCursor):
+            keyset_page(VendorProduct.objects.all(), 'price', 5, encode_cursor(position))
+
+
+class ProductCursorPaginationApiTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        VendorProduct.objects.bulk_create([
+            VendorProduct(vendor=vendor, name=f'Product {i}', price=i % 4, stock=1) for i in range(8)
+        ])
+
+    def test_next_links_walk_the_whole_listing(self):
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        response = self.client.get('/api/vendors/products/?pagination=cursor&page_size=3&ordering=price', secure=True)
+        seen = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(product['id'] for product in response.data['results'])
+            if not response.data['has_next']:
+                break
+            response = self.client.get(response.data['next'], secure=True)
+        self.assertEqual(seen, list(VendorProduct.objects.order_by('price', 'id').values_list('id', flat=True)))
+
+    def test_bad_cursor_is_not_found(self):
+        response = self.client.get('/api/vendors/products/?cursor=garbage', secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+class CountStrategyTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.add_products(3)
+
+    def add_products(self, count):
+        VendorProduct.objects.bulk_create([
+            VendorProduct(vendor=self.vendor, name='Product', price=1, stock=1) for _ in range(count)
+        ])
+
+    def test_exact_and_cached_counts(self):
+        products = VendorProduct.objects.filter(stock__gt=0)
+        self.assertEqual(count_results(products, COUNT_CACHED), (3, False))
+        self.add_products(2)
+        # Cached per filter signature, whatever the ordering
+        self.assertEqual(count_results(products.order_by('-price'), COUNT_CACHED), (3, False))
+        self.assertEqual(count_results(products, COUNT_EXACT), (5, False))
+        self.assertEqual(count_results(products.none(), COUNT_EXACT), (0, False))
+
+    def test_estimates(self):
+        products = VendorProduct.objects.filter(stock__gt=0)
+        self.assertEqual(count_results(products, COUNT_ESTIMATE, estimate=lambda: 40), (40, True))
+        # Without an estimator the exact count is remembered and flagged once reused
+        self.assertEqual(count_results(products, COUNT_ESTIMATE, estimate=lambda: None), (3, False))
+        self.add_products(1)
+        self.assertEqual(count_results(products, COUNT_ESTIMATE), (3, True))
+
+    def test_pages_past_a_short_estimate_are_empty(self):
+        paginator = CountStrategyPaginator(
+            VendorProduct.objects.order_by('id'), 2, count_strategy=COUNT_ESTIMATE, estimate=lambda: 1
+        )
+        self.assertEqual(paginator.num_pages, 1)
+        self.assertEqual(len(paginator.page(1)), 2)
+        self.assertEqual(len(paginator.page(2)), 1)
+        self.assertEqual(len(paginator.page(3)), 0)
+
+    def test_listing_reports_the_strategy_count(self):
+        client = APIClient()
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        response = client.get('/api/vendors/products/?count=exact&page_size=2', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['count'], response.data['count_is_estimate']), (3, False))
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.add_products(3)
+        cache.clear()  # Drop the cached result pages, keep testing the count
+        response = client.get('/api/vendors/products/?count=estimate&page_size=2', secure=True)
+        self.assertEqual((response.data['count'], response.data['count_is_estimate']), (6, False))
+
+
+class BulkImportExportTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='vendor')
+        self.vendor = Vendor.objects.create(user=self.user, store_name='Store')
+        self.phones = Category.objects.create(name='Phones')
+        self.existing = VendorProduct.objects.create(vendor=self.vendor, sku='A1', name='Phone', price=10, stock=1)
+
+    def run_import(self, text, file_format='csv', **options):
+        importer = ProductImporter(vendor=self.vendor, chunk_size=2, **options)
+        return importer.run(read_rows(io.BytesIO(text.encode()), file_format)).as_dict()
+
+    def test_csv_import_upserts_valid_rows_and_reports_the_rest(self):
+        report = self.run_import(
+            'sku,name,price,category,stock\n'
+            f'A1,,15,{self.phones.slug},\n'
+            'B2,Case,5,phones,3\n'
+            'C3,,9,,\n'
+            'D4,Cable,cheap,,\n'
+            'E5,Charger,7,Chargers,\n'
+        )
+        self.assertEqual(
+            {key: report[key] for key in ('rows', 'created', 'updated', 'failed')},
+            {'rows': 5, 'created': 1, 'updated': 1, 'failed': 3}
+        )
+        self.assertEqual(
+            sorted((error['line'], error['sku'], list(error['errors'])) for error in report['errors']),
+            [(4, 'C3', ['name']), (5, 'D4', ['price']), (6, 'E5', ['category'])]
+        )
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.name, self.existing.price, self.existing.stock), ('Phone', Decimal('15'), 1))
+        self.assertEqual(self.existing.category, self.phones)
+        case = VendorProduct.objects.get(vendor=self.vendor, sku='B2')
+        self.assertEqual((case.name, case.price, case.stock, case.category), ('Case', Decimal('5'), 3, self.phones))
+
+    def test_dry_run_writes_nothing(self):
+        report = self.run_import('{"sku": "B2", "name": "Case", "price": 5}\nnot json\n', 'jsonl', dry_run=True)
+        self.assertEqual((report['created'], report['failed'], report['errors'][0]['line']), (1, 1, 2))
+        self.assertFalse(VendorProduct.objects.filter(sku='B2').exists())
+
+    def test_exports_import_back(self):
+        self.existing.category = self.phones
+        self.existing.save()
+        lines = list(export_products(self.vendor, 'jsonl'))
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual((row['id'], row['category'], row['price']), (self.existing.pk, self.phones.pk, '10.00'))
+
+        row['price'] = '12.50'
+        report = self.run_import(json.dumps(row) + '\n', 'jsonl')
+        self.assertEqual((report['updated'], report['failed']), (1, 0))
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price, self.existing.category), (Decimal('12.50'), self.phones))
+
+        csv_export = ''.join(export_products(self.vendor, 'csv'))
+        self.assertTrue(csv_export.startswith(','.join(COLUMNS)))
+        self.assertEqual(self.run_import(csv_export)['updated'], 1)
+
+    def test_api_imports_an_upload_and_streams_the_export(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = io.BytesIO(b'sku,name,price\nB2,Case,5\n')
+        upload.name = 'products.csv'
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        response = client.post('/api/vendors/products/bulk_import/', {'file': upload}, format='multipart', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+
+        response = client.get('/api/vendors/products/export/?file_format=jsonl', secure=True)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        skus = [json.loads(line)['sku'] for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(skus, ['A1', 'B2'])
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        vendor = Vendor.objects.create(user=User.objects.create(username='vendor'), store_name='Store')
+        self.product = VendorProduct.objects.create(vendor=vendor, name='Phone', price=10, stock=1)
+
+    def get(self, path, **headers):
+        # SECURE_SSL_REDIRECT would answer plain HTTP with a 301
+        return self.client.get(path, secure=True, **headers)
+
+    def test_listing_revalidates_with_its_etag_until_the_catalog_changes(self):
+        response = self.get('/api/vendors/products/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('catalog', response['Surrogate-Key'].split())
+
+        response = self.get('/api/vendors/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # The ETag covers the query string too
+        self.assertEqual(self.get('/api/vendors/products/?ordering=price', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.product.price = 12
+        self.product.save()
+        response = self.get('/api/vendors/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_revalidates_with_last_modified(self):
+        path = f'/api/vendors/products/{self.product.pk}/'
+        response = self.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'product-{self.product.pk}', response['Surrogate-Key'].split())
+        last_modified = response['Last-Modified']
+
+        self.assertEqual(self.get(path, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get(path, HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
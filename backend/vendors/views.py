@@ -11,9 +11,11 @@ from .serializers import VendorSerializer, ProductSerializer, ProductListSeriali
 from users.models import UserProfile
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from .authentication import MasterTokenAuthentication
-from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
+from ai_search.tags import product_tags_prefetch
+from utils.conditional import catalog_conditional_get
+from utils.pagination import CountStrategyPagination, KeysetCursorPagination, wants_cursor_pagination
 
 logger = logging.getLogger(__name__)
 
@@ -318,19 +320,109 @@ class VendorViewSet(viewsets.ModelViewSet):
     def products(self, request, pk=None):
         """Get products for a specific vendor"""
         vendor = self.get_object()
-        products = vendor.vendor_products.all()
+        products = vendor.vendor_products.select_related('category', 'rating_summary').prefetch_related(
+            product_tags_prefetch()
+        )
+        
+        # Infinite-scroll clients page through the catalog with a cursor;
+        # without one the full list is returned as before
+        if wants_cursor_pagination(request):
+            paginator = ProductCursorPagination()
+            page = paginator.paginate_queryset(products.order_by('-created_at'), request, view=self)
+            serializer = ProductSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+        
         serializer = ProductSerializer(products, many=True)
         return Response(serializer.data)
 
-class ProductPagination(PageNumberPagination):
+class ProductPagination(CountStrategyPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class ProductCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over (ordering field, id) for product listings"""
+    page_size = 10
+    max_page_size = 100
+
 class ProductViewSet(viewsets.ModelViewSet):
     authentication_classes = [JWTAuthentication, MasterTokenAuthentication]
     pagination_class = ProductPagination
     
+    @property
+    def paginator(self):
+        """Page-number pagination by default, keyset cursors when requested"""
+        if not hasattr(self, '_paginator'):
+            if wants_cursor_pagination(self.request):
+                self._paginator = ProductCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        """
+        Product listing served from the search result cache when possible.
+        Only the page's ids and its pagination envelope are cached; products
+        are re-read and re-serialized on every hit. A client holding the
+        current catalog version gets a 304 before anything is queried.
+        """
+        from search.facets import compute_facets, wants_facets
+        from search.result_cache import fetch_in_order, get_cached_result, result_cache_key, set_cached_result
+        conditional = catalog_conditional_get(request, 'products')
+        not_modified = conditional.not_modified()
+        if not_modified is not None:
+            return not_modified
+        cache_key = result_cache_key(
+            'product_list',
+            host=request.get_host(),
+            **{key: request.query_params.getlist(key) for key in request.query_params}
+        )
+        cached_page = get_cached_result(cache_key)
+        if cached_page is not None:
+            products = fetch_in_order(
+                VendorProduct.objects.select_related('vendor', 'category', 'rating_summary').defer('description', 'video'),
+                cached_page['ids']
+            )
+            data = dict(cached_page['envelope'])
+            data['results'] = self.get_serializer(products, many=True).data
+            return conditional.apply(Response(data))
+        
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200 and wants_facets(request):
+            # Over every filtered product, not just the page; cached with the envelope
+            response.data['facets'] = compute_facets(self.filter_queryset(self.get_queryset()))
+        page_ids = getattr(self, '_page_ids', None)
+        if response.status_code == 200 and page_ids is not None:
+            set_cached_result(cache_key, {'ids': page_ids, 'envelope': {**response.data, 'results': None}})
+        return conditional.apply(response)
+
+    def retrieve(self, request, *args, **kwargs):
+        conditional = catalog_conditional_get(request, 'products', f"product-{kwargs.get('pk')}")
+        not_modified = conditional.not_modified()
+        if not_modified is not None:
+            return not_modified
+        return conditional.apply(super().retrieve(request, *args, **kwargs))
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            self._page_ids = [product.pk for product in page]
+        return page
+
+    def estimate_count(self, queryset):
+        """
+        Listing count estimate from the search index, for ?count=estimate.
+        The index only knows the search words and stock, so other filters
+        get None and count_results falls back to its own estimate.
+        """
+        params = self.request.query_params
+        search = params.get('search') or params.get('q')
+        if not search or any(params.get(key) for key in ('category', 'vendor', 'price_min', 'price_max')):
+            return None
+        from search.backends import get_search_backend
+        show_out_of_stock = params.get('show_out_of_stock', 'false').lower() == 'true'
+        return get_search_backend().estimate_count(search, in_stock_only=not show_out_of_stock)
+
     def get_permissions(self):
         """Allow read operations with master token, require authentication for others"""
         if self.action in ['list', 'retrieve']:
@@ -347,7 +439,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         return ProductSerializer
 
     def get_queryset(self):
-        queryset = VendorProduct.objects.select_related('vendor', 'category').all()
+        queryset = VendorProduct.objects.select_related('vendor', 'category', 'rating_summary').all()
         
         # Apply filters for list view
         if self.action == 'list':
@@ -361,49 +453,37 @@ class ProductViewSet(viewsets.ModelViewSet):
             # For detail view, prefetch frequently bought together products
             queryset = queryset.prefetch_related(
                 'frequently_bought_together__vendor',
-                'frequently_bought_together__category'
+                'frequently_bought_together__category',
+                'frequently_bought_together__rating_summary',
+                product_tags_prefetch('frequently_bought_together__ai_tags')
             )
-        return queryset.order_by('-created_at')
+        if self.action != 'list':
+            # tags_list of the product serializers
+            queryset = queryset.prefetch_related(product_tags_prefetch())
+        # Keep the ordering chosen by _apply_filters, default to newest first
+        if not queryset.query.order_by:
+            queryset = queryset.order_by('-created_at')
+        return queryset
 
     def _apply_filters(self, queryset):
         """Apply filters based on query parameters"""
         # Category filter - includes all descendant categories
         category = self.request.query_params.get('category')
         if category:
-            from categories.models import Category
-            # Support both category ID and category name
-            if category.isdigit():
-                try:
-                    category_obj = Category.objects.get(id=category)
-                    # Get all descendant category IDs (including self)
-                    descendant_ids = category_obj.get_descendants_and_self()
-                    queryset = queryset.filter(category__id__in=descendant_ids)
-                except Category.DoesNotExist:
-                    pass
-            else:
-                # Multiple categories separated by comma
-                category_identifiers = [item.strip() for item in category.split(',') if item.strip()]
-                if category_identifiers:
-                    all_descendant_ids = []
-                    
-                    for identifier in category_identifiers:
-                        if identifier.isdigit():
-                            # It's a category ID
-                            try:
-                                category_obj = Category.objects.get(id=identifier)
-                                all_descendant_ids.extend(category_obj.get_descendants_and_self())
-                            except Category.DoesNotExist:
-                                continue
-                        else:
-                            # It's a category name - find by name and include descendants
-                            categories = Category.objects.filter(name__icontains=identifier)
-                            for cat in categories:
-                                all_descendant_ids.extend(cat.get_descendants_and_self())
-                    
-                    if all_descendant_ids:
-                        # Remove duplicates
-                        all_descendant_ids = list(set(all_descendant_ids))
-                        queryset = queryset.filter(category__id__in=all_descendant_ids)
+            from categories.models import Category, CategoryClosure
+            # Support both category IDs and category names, separated by comma
+            category_identifiers = [item.strip() for item in category.split(',') if item.strip()]
+            matches = Q(pk__in=[])
+            for identifier in category_identifiers:
+                if identifier.isdigit():
+                    matches |= Q(id=identifier)
+                else:
+                    # A category name includes every category containing it
+                    matches |= Q(name__icontains=identifier)
+            ancestor_ids = list(Category.objects.filter(matches).values_list('id', flat=True))
+            if ancestor_ids:
+                # All descendant categories (including the matches) in one closure lookup
+                queryset = queryset.filter(category_id__in=CategoryClosure.descendants_of(ancestor_ids))
         
         # Vendor/Brand filter
         vendor = self.request.query_params.get('vendor')
@@ -436,21 +516,21 @@ class ProductViewSet(viewsets.ModelViewSet):
             except ValueError:
                 pass  # Ignore invalid price_max values
         
-        # Search query filter
-        search = self.request.query_params.get('search') or self.request.query_params.get('q')
-        if search:
-            search_words = [word.strip() for word in search.split() if len(word.strip()) > 2]
-            if search_words:
-                search_filter = Q()
-                for word in search_words:
-                    search_filter |= Q(name__icontains=word) | Q(description__icontains=word) | Q(tags__icontains=word) | Q(brand__icontains=word)
-                queryset = queryset.filter(search_filter)
-        
         # Stock filter (only show products with stock by default)
         show_out_of_stock = self.request.query_params.get('show_out_of_stock', 'false').lower() == 'true'
         if not show_out_of_stock:
             queryset = queryset.filter(stock__gt=0)
         
+        # Search query filter (after the other filters, so too few matches can be widened with fuzzy ones)
+        search = self.request.query_params.get('search') or self.request.query_params.get('q')
+        if search:
+            search_words = [word.strip() for word in search.split() if len(word.strip()) > 2]
+            if search_words:
+                # Match through the configured full-text search backend
+                from search.backends import get_search_backend
+                from search.fuzzy import widen_with_fuzzy_matches
+                queryset = widen_with_fuzzy_matches(queryset, get_search_backend().filter(queryset, search), search)
+        
         # Ordering
         ordering = self.request.query_params.get('ordering', '-created_at')
         valid_orderings = ['price', '-price', 'name', '-name', 'created_at', '-created_at', 'rating', '-rating']
@@ -493,3 +573,62 @@ class ProductViewSet(viewsets.ModelViewSet):
                 {"detail": "Vendor profile not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+
+    @action(detail=False, methods=['post'])
+    def bulk_import(self, request):
+        """
+        Create and update the vendor's products from CSV or JSON lines, sent
+        as the 'file' upload or as the request body. ?file_format=csv|jsonl
+        overrides the format guessed from the file name or content type, and
+        ?dry_run=true only validates. Returns the import report.
+        """
+        from .bulk import FORMATS, ProductImporter, detect_format, read_rows
+        try:
+            vendor = Vendor.objects.get(user=request.user)
+        except Vendor.DoesNotExist:
+            return Response(
+                {"detail": "Vendor profile not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+        stream = upload if upload is not None else request.stream
+        if stream is None:
+            return Response({"detail": "No file to import"}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = (
+            request.query_params.get('file_format')
+            or detect_format(getattr(upload, 'name', ''), upload.content_type if upload else request.content_type)
+            or 'csv'
+        )
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": f"Unsupported format, use one of: {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        report = ProductImporter(vendor=vendor, dry_run=dry_run).run(read_rows(stream, file_format))
+        return Response(report.as_dict())
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the vendor's products as CSV or JSON lines (?file_format=csv|jsonl), in the import columns"""
+        from django.http import StreamingHttpResponse
+        from .bulk import CONTENT_TYPES, FORMATS, export_products
+        try:
+            vendor = Vendor.objects.get(user=request.user)
+        except Vendor.DoesNotExist:
+            return Response(
+                {"detail": "Vendor profile not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": f"Unsupported format, use one of: {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        response = StreamingHttpResponse(export_products(vendor, file_format), content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="products-{vendor.pk}.{file_format}"'
+        return response